@@ -4,10 +4,25 @@ export const api = () => {
 
     let url = 'http://192.168.254.103:8080/api/'
 
-    const get_appointments = async (): Promise<any> => {  
-        const response = await fetch(url + 'appointment/get/all');
-        const data = await response.json();
-        return data;
+    // the listings come a page at a time; follow paging.next until the last one
+    const get_all = async (path: string, params: string = ''): Promise<any> => {
+        let data: any[] = [];
+        let after: string | null = null;
+        do {
+            const query: string = params + (after ? (params ? '&' : '') + 'after=' + encodeURIComponent(after) : '');
+            const response = await fetch(url + path + (query ? '?' + query : ''));
+            const result = await response.json();
+            if (!result.success) {
+                return result;
+            }
+            data = data.concat(result.data);
+            after = result.paging ? result.paging.next : null;
+        } while (after);
+        return { success: true, data };
+    }
+
+    const get_appointments = async (params: string = ''): Promise<any> => {  
+        return get_all('appointment/get/all', params);
     }
 
     return {
@@ -1,6 +1,7 @@
 import { IonPage, IonHeader, IonToolbar, IonTitle, IonContent, IonCard, IonCardHeader, IonCardTitle, IonCardContent, IonAvatar, IonItem, IonLabel, IonTabBar, IonIcon, IonTab, IonTabButton, IonTabs } from '@ionic/react';
 import { useEffect, useState } from 'react';
 import { Appointment } from './pages/interfaces/models';
+import api from '../hooks/api';
 import './Appointments.css';
 
 const url = 'http://192.168.254.103:8080'
@@ -9,8 +10,7 @@ const Appointments: React.FC = () => {
   const [appointments, setAppointments] = useState<Appointment[]>([]);
 
   useEffect(() => {
-    fetch(url + '/api/appointment/get/all')
-      .then(res => res.json())
+    api().get_appointments('sort=start_time&order=desc')
       .then(result => {
         // Ensure we always have an array
         const data = result.data
@@ -1,5 +1,6 @@
 # api.py
-from flask import Blueprint, current_app, jsonify, request
+import itertools
+from flask import Blueprint, current_app, jsonify, request, stream_with_context
 from datetime import datetime, date
 from typing import Any, Dict, List, Optional
 
@@ -7,6 +8,13 @@ from data.repo import *
 from data.seed.populate import Populate
 
 from data.services.appointment import Appointment
+from data.services.availability_cache import AvailabilityCache
+from data.services.booking_lock import BookingConflict
+from data.services.dispatch import Dispatcher
+from data.services.pagination import PaginationError, chunks, paginate
+from data.services.projection import Projection, ProjectionError
+from data.services.table_version import TableVersion
+from data.serializers import dumps, serializer
 
 api = Blueprint('api', __name__, url_prefix='/api')
 
@@ -58,243 +66,129 @@ def get_request_data() -> Dict[str, Any]:
     return {k: v for k, v in request.form.items()}
 
 
-def _iso(dt: Optional[datetime]) -> Optional[str]:
-    if dt is None:
-        return None
-    if isinstance(dt, date) and not isinstance(dt, datetime):
-        return dt.isoformat()
-    try:
-        return dt.isoformat()
-    except Exception:
-        return str(dt)
+def json_response(payload, status: int = 200):
+    """Like jsonify, encoded with data.serializers.dumps (orjson when installed)."""
+    return current_app.response_class(dumps(payload, sort_keys=current_app.config.get('JSON_SORT_KEYS', True)),
+                                      status=status, mimetype=current_app.config.get('JSONIFY_MIMETYPE', 'application/json'))
+
+
+STREAM_FORMATS = {'json': 'application/json', 'ndjson': 'application/x-ndjson'}
+
+
+def _stream_format() -> Optional[str]:
+    """?stream=json|ndjson, or an Accept header asking for NDJSON; None for a normal page."""
+    fmt = request.args.get('stream')
+    if fmt is None and request.accept_mimetypes.best == STREAM_FORMATS['ndjson']:
+        fmt = 'ndjson'
+    if fmt is not None and fmt not in STREAM_FORMATS:
+        raise PaginationError(f"'stream' must be one of {', '.join(STREAM_FORMATS)}")
+    return fmt
+
+
+def stream_response(rows, serialize, view: Projection, fmt: str):
+    """
+    Write the chunks from `rows` as they are read: {"success":true,"data":[...]} for
+    json, one row per line for ndjson. Only the chunk being written is held in memory.
+    """
+    sort_keys = current_app.config.get('JSON_SORT_KEYS', True)
+
+    def generate():
+        if fmt == 'json':
+            yield b'{"success":true,"data":['
+        first = True
+        try:
+            for chunk in rows:
+                if not chunk:
+                    continue
+                encoded = [dumps(serialize(x, view), sort_keys=sort_keys) for x in chunk]
+                if fmt == 'ndjson':
+                    yield b'\n'.join(encoded) + b'\n'
+                else:
+                    yield (b'' if first else b',') + b','.join(encoded)
+                first = False
+        except Exception:
+            # the status line is gone already; the client sees a truncated body
+            current_app.logger.exception("stream_response error")
+            raise
+        if fmt == 'json':
+            yield b']}'
+
+    return current_app.response_class(stream_with_context(generate()), mimetype=STREAM_FORMATS[fmt])
+
+
+def list_response(query, model, serialize, time_column: Optional[str] = None, filters=()):
+    """
+    One page of a /get/all listing (see data.services.pagination.paginate for the
+    query string). The rows are under 'data' as before; 'paging.next' is the
+    `after` value for the following page and is null on the last one.
+    ?fields= and ?expand= pick what each row carries (see Projection).
+    ?stream=json (or ndjson) returns every matching row instead, read and written
+    API_STREAM_CHUNK_SIZE at a time.
+    """
+    try:
+        view = Projection.from_args(model, request.args)
+        query = query.options(*view.options(model))
+        fmt = _stream_format()
+        if fmt:
+            rows = chunks(query, model, request.args, time_column=time_column, filters=filters)
+            first = next(rows, [])     # bad arguments fail here, while a 400 can still be sent
+            return stream_response(itertools.chain([first], rows), serialize, view, fmt)
+        page = paginate(query, model, request.args, time_column=time_column, filters=filters)
+    except (PaginationError, ProjectionError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return json_response({'success': True, 'data': [serialize(x, view) for x in page.items], 'paging': page.meta()})
+
+
+def conditional_response(models, build, *extra):
+    """
+    Serve a response that depends only on `models`, `extra` values (see
+    TableVersion.value) and the query string, with an ETag and Last-Modified from
+    their version stamps. A client holding the current version gets 304 Not
+    Modified before `build` runs, so a repeat poll costs no query while the
+    stamps are fresh (see TableVersion).
+    """
+    etag, last_modified = TableVersion.etag(models, request.query_string.decode(), *extra)
+    if request.if_none_match:
+        unchanged = request.if_none_match.contains(etag)
+    else:
+        unchanged = bool(request.if_modified_since and last_modified and last_modified <= request.if_modified_since)
+    response = current_app.response_class(status=304) if unchanged else build()
+    if not isinstance(response, current_app.response_class) or response.status_code not in (200, 304):
+        return response
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    max_age = current_app.config.get('REFERENCE_CACHE_MAX_AGE', 0)
+    response.headers['Cache-Control'] = f'public, max-age={max_age}' if max_age else 'no-cache'
+    return response
+
+
+def item_response(obj, model, serialize):
+    """A single row, serialized with the request's ?fields= and ?expand=."""
+    try:
+        view = Projection.from_args(model, request.args)
+    except ProjectionError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return json_response({'success': True, 'data': serialize(obj, view)})
 
 
 # -------------------------
-# Serializers for each model (based on your models.py)
+# Serializers for each model (shapes in data/serializers.py)
 # -------------------------
-def serialize_account(a) -> Dict[str, Any]:
-    if a is None:
-        return {}
-    return {
-        "id": getattr(a, "id", None),
-        "first_name": getattr(a, "first_name", None),
-        "middle_name": getattr(a, "middle_name", None),
-        "last_name": getattr(a, "last_name", None),
-        "gender": getattr(a, "gender", None),
-        "phone_1": getattr(a, "phone_1", None),
-        "phone_2": getattr(a, "phone_2", None),
-        "birth_date": _iso(getattr(a, "birth_date", None)),
-        "address": getattr(a, "address", None),
-        "image_profile": getattr(a, "image_profile", None),
-        "email": getattr(a, "email", None),
-        "is_active": getattr(a, "is_active", None),
-        "role_id": getattr(a, "role_id", None),
-        "login_date": _iso(getattr(a, "login_date", None)),
-        "created_at": _iso(getattr(a, "created_at", None)),
-        "updated_at": _iso(getattr(a, "updated_at", None)),
-    }
-
-
-def serialize_customer(c) -> Dict[str, Any]:
-    if c is None:
-        return {}
-    account = getattr(c, "account", None)
-    return {
-        "id": getattr(c, "id", None),
-        "account_id": getattr(c, "account_id", None),
-        "is_registered": getattr(c, "is_registered", False),
-        "is_pwd": getattr(c, "is_pwd", False),
-        "is_senior": getattr(c, "is_senior", False),
-        "created_at": _iso(getattr(c, "created_at", None)),
-        "updated_at": _iso(getattr(c, "updated_at", None)),
-        "account": serialize_account(account) if account else None,
-        "vehicles": [serialize_vehicle(v) for v in (getattr(c, "vehicles", []) or [])],
-    }
-
-
-def serialize_staff(s) -> Dict[str, Any]:
-    if s is None:
-        return {}
-    account = getattr(s, "account", None)
-    return {
-        "id": getattr(s, "id", None),
-        "account_id": getattr(s, "account_id", None),
-        "is_front_desk": getattr(s, "is_front_desk", False),
-        "is_on_shift": getattr(s, "is_on_shift", False),
-        "created_at": _iso(getattr(s, "created_at", None)),
-        "updated_at": _iso(getattr(s, "updated_at", None)),
-        "account": serialize_account(account) if account else None,
-        "schedules": [serialize_schedule(s) for s in (getattr(s, "schedules", []) or [])],
-    }
-
-
-def serialize_schedule(s) -> Dict[str, Any]:
-    if s is None:
-        return {}
-    staff = getattr(s, "staff", None)
-    return {
-        "id": getattr(s, "id", None),
-        "staff_id": getattr(s, "staff_id", None),
-        "day": getattr(s, "day", None),
-        "shift": getattr(s, "shift", None),
-        "shift_start": getattr(s, "shift_start").isoformat() if getattr(s, "shift_start", None) else None,
-        "shift_end": getattr(s, "shift_end").isoformat() if getattr(s, "shift_end", None) else None,
-        "created_at": _iso(getattr(s, "created_at", None)),
-        "updated_at": _iso(getattr(s, "updated_at", None)),
-        "staff": {
-            "id": getattr(staff, "id", None),
-            "account_id": getattr(staff, "account_id", None)
-        } if staff else None
-    }
-
-
-def serialize_service(svc) -> Dict[str, Any]:
-    if svc is None:
-        return {}
-    return {
-        "id": getattr(svc, "id", None),
-        "name": getattr(svc, "name", None),
-        "description": getattr(svc, "description", None),
-        "price": float(getattr(svc, "price", 0)) if getattr(svc, "price", None) is not None else None,
-        "duration": getattr(svc, "duration", None),
-        "washers_needed": getattr(svc, "washers_needed", None),
-        "type": getattr(svc, "type", None),
-        "created_at": _iso(getattr(svc, "created_at", None)),
-        "updated_at": _iso(getattr(svc, "updated_at", None)),
-    }
-
-
-def serialize_vehicle(v) -> Dict[str, Any]:
-    if v is None:
-        return {}
-    # owner = getattr(v, "owner", None)
-    return {
-        "id": getattr(v, "id", None),
-        "plate_number": getattr(v, "plate_number", None),
-        "model": getattr(v, "model", None),
-        "type": getattr(v, "type", None),
-        "customer_id": getattr(v, "customer_id", None),
-        "created_at": _iso(getattr(v, "created_at", None)),
-        "updated_at": _iso(getattr(v, "updated_at", None)),
-        # "owner": serialize_customer(owner) if owner else None
-    }
-
-
-def serialize_bay(b) -> Dict[str, Any]:
-    if b is None:
-        return {}
-    return {
-        "id": getattr(b, "id", None),
-        "bay": getattr(b, "bay", None),
-        "created_at": _iso(getattr(b, "created_at", None)),
-        "updated_at": _iso(getattr(b, "updated_at", None)),
-    }
-
-
-def serialize_role(r) -> Dict[str, Any]:
-    if r is None:
-        return {}
-    return {
-        "id": getattr(r, "id", None),
-        "role": getattr(r, "role", None),
-        "created_at": _iso(getattr(r, "created_at", None)),
-        "updated_at": _iso(getattr(r, "updated_at", None)),
-    }
-
-
-def serialize_status(s) -> Dict[str, Any]:
-    if s is None:
-        return {}
-    return {
-        "id": getattr(s, "id", None),
-        "status": getattr(s, "status", None),
-        "created_at": _iso(getattr(s, "created_at", None)),
-        "updated_at": _iso(getattr(s, "updated_at", None)),
-    }
-
-
-def serialize_payment(p) -> Dict[str, Any]:
-    if p is None:
-        return {}
-    return {
-        "id": getattr(p, "id", None),
-        "method": getattr(p, "method", None),
-        "transaction_no": getattr(p, "transaction_no", None),
-        "image_payment": getattr(p, "image_payment", None),
-        "amount": float(getattr(p, "amount", 0)) if getattr(p, "amount", None) is not None else None,
-        "appointment_id": getattr(p, "appointment_id", None),
-        "status_id": getattr(p, "status_id", None),
-        "created_at": _iso(getattr(p, "created_at", None)),
-        "updated_at": _iso(getattr(p, "updated_at", None)),
-    }
-
-
-def serialize_feedback(f) -> Dict[str, Any]:
-    if f is None:
-        return {}
-    return {
-        "id": getattr(f, "id", None),
-        "rating": getattr(f, "rating", None),
-        "comment": getattr(f, "comment", None),
-        "customer_id": getattr(f, "customer_id", None),
-        "appointment_id": getattr(f, "appointment_id", None),
-        "created_at": _iso(getattr(f, "created_at", None)),
-        "updated_at": _iso(getattr(f, "updated_at", None)),
-    }
-
-
-def serialize_notification(n) -> Dict[str, Any]:
-    if n is None:
-        return {}
-    return {
-        "id": getattr(n, "id", None),
-        "content": getattr(n, "content", None),
-        "notif_type": getattr(n, "notif_type", None),
-        "viewed": getattr(n, "viewed", False),
-        "account_id": getattr(n, "account_id", None),
-        "created_at": _iso(getattr(n, "created_at", None)),
-        "updated_at": _iso(getattr(n, "updated_at", None)),
-    }
-
-
-def serialize_loyalty(l) -> Dict[str, Any]:
-    if l is None:
-        return {}
-    return {
-        "id": getattr(l, "id", None),
-        "points": getattr(l, "points", None),
-        "note": getattr(l, "note", None),
-        "customer_id": getattr(l, "customer_id", None),
-        "created_at": _iso(getattr(l, "created_at", None)),
-        "updated_at": _iso(getattr(l, "updated_at", None)),
-    }
-
-
-def serialize_appointment(a) -> Dict[str, Any]:
-    if a is None:
-        return {}
-    # many-to-many staffs
-    staffs = getattr(a, "staffs", []) or []
-    return {
-        "id": getattr(a, "id", None),
-        "start_time": _iso(getattr(a, "start_time", None)),
-        "end_time": _iso(getattr(a, "end_time", None)),
-        "bay_id": getattr(a, "bay_id", None),
-        "customer_id": getattr(a, "customer_id", None),
-        "vehicle_id": getattr(a, "vehicle_id", None),
-        "service_id": getattr(a, "service_id", None),
-        "status_id": getattr(a, "status_id", None),
-        "created_at": _iso(getattr(a, "created_at", None)),
-        "updated_at": _iso(getattr(a, "updated_at", None)),
-        "bay": serialize_bay(getattr(a, "bay", None)),
-        "customer": serialize_customer(getattr(a, "customer", None)),
-        "vehicle": serialize_vehicle(getattr(a, "vehicle", None)),
-        "service": serialize_service(getattr(a, "service", None)),
-        "status": serialize_status(getattr(a, "status", None)),
-        "payments": [serialize_payment(p) for p in (getattr(a, "payments", []) or [])],
-        "feedbacks": [serialize_feedback(f) for f in (getattr(a, "feedbacks", []) or [])],
-        "staffs": [serialize_staff(s) for s in staffs]
-    }
+serialize_account = serializer(Accounts)
+serialize_customer = serializer(Customers)
+serialize_staff = serializer(Staffs)
+serialize_schedule = serializer(Schedules)
+serialize_service = serializer(Services)
+serialize_vehicle = serializer(Vehicles)
+serialize_bay = serializer(Bays)
+serialize_role = serializer(Roles)
+serialize_status = serializer(Status)
+serialize_payment = serializer(Payments)
+serialize_feedback = serializer(Feedbacks)
+serialize_notification = serializer(Notifications)
+serialize_loyalty = serializer(Loyalties)
+serialize_appointment = serializer(Appointments)
 
 
 # ----------------------------
@@ -327,7 +221,7 @@ def api_get_account(id):
         a = get_account(id)
         if not a:
             return jsonify({'success': False, 'message': 'Account not found'}), 404
-        return jsonify({'success': True, 'data': serialize_account(a)})
+        return item_response(a, Accounts, serialize_account)
     except Exception as e:
         current_app.logger.exception("api_get_account error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -336,8 +230,7 @@ def api_get_account(id):
 @api.route('/account/get/all', methods=['GET'])
 def api_get_all_accounts():
     try:
-        items = get_accounts()
-        return jsonify({'success': True, 'data': [serialize_account(x) for x in items]})
+        return list_response(Accounts.query, Accounts, serialize_account, filters=('role_id',))
     except Exception as e:
         current_app.logger.exception("api_get_all_accounts error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -387,7 +280,7 @@ def api_get_customer(id):
         c = get_customer(id)
         if not c:
             return jsonify({'success': False, 'message': 'Customer not found'}), 404
-        return jsonify({'success': True, 'data': serialize_customer(c)})
+        return item_response(c, Customers, serialize_customer)
     except Exception as e:
         current_app.logger.exception("api_get_customer error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -396,8 +289,7 @@ def api_get_customer(id):
 @api.route('/customer/get/all', methods=['GET'])
 def api_get_all_customers():
     try:
-        items = get_customers()
-        return jsonify({'success': True, 'data': [serialize_customer(x) for x in items]})
+        return list_response(Customers.query, Customers, serialize_customer, filters=('account_id',))
     except Exception as e:
         current_app.logger.exception("api_get_all_customers error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -442,7 +334,7 @@ def api_get_staff(id):
         s = get_staff(id)
         if not s:
             return jsonify({'success': False, 'message': 'Staff not found'}), 404
-        return jsonify({'success': True, 'data': serialize_staff(s)})
+        return item_response(s, Staffs, serialize_staff)
     except Exception as e:
         current_app.logger.exception("api_get_staff error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -451,8 +343,7 @@ def api_get_staff(id):
 @api.route('/staff/get/all', methods=['GET'])
 def api_get_all_staffs():
     try:
-        items = get_staffs()
-        return jsonify({'success': True, 'data': [serialize_staff(x) for x in items]})
+        return list_response(Staffs.query, Staffs, serialize_staff, filters=('account_id',))
     except Exception as e:
         current_app.logger.exception("api_get_all_staffs error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -521,8 +412,7 @@ def api_delete_staff():
 @api.route('/schedule/get/all', methods=['GET'])
 def api_get_all_schedules():
     try:
-        items = get_schedules()
-        return jsonify({'success': True, 'data': [serialize_schedule(x) for x in items]})
+        return list_response(Schedules.query, Schedules, serialize_schedule, filters=('staff_id',))
     except Exception as e:
         current_app.logger.exception("api_get_all_schedules error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -533,7 +423,7 @@ def api_get_schedule(id):
         s = get_schedule(id)
         if not s:
             return jsonify({'success': False, 'message': 'Schedule not found'}), 404
-        return jsonify({'success': True, 'data': serialize_schedule(s)})
+        return item_response(s, Schedules, serialize_schedule)
     except Exception as e:
         current_app.logger.exception("api_get_schedule error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -569,7 +459,7 @@ def api_get_vehicle(id):
         v = get_vehicle(id)
         if not v:
             return jsonify({'success': False, 'message': 'Vehicle not found'}), 404
-        return jsonify({'success': True, 'data': serialize_vehicle(v)})
+        return item_response(v, Vehicles, serialize_vehicle)
     except Exception as e:
         current_app.logger.exception("api_get_vehicle error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -578,13 +468,26 @@ def api_get_vehicle(id):
 @api.route('/vehicle/get/all', methods=['GET'])
 def api_get_all_vehicles():
     try:
-        items = get_vehicles()
-        return jsonify({'success': True, 'data': [serialize_vehicle(x) for x in items]})
+        return list_response(Vehicles.query, Vehicles, serialize_vehicle, filters=('customer_id',))
     except Exception as e:
         current_app.logger.exception("api_get_all_vehicles error")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# TableVersion.value key of the distinct vehicle types; bookings add vehicles, so the table has no counter
+VEHICLE_TYPES = 'vehicle_types'
+
+
+@api.route('/vehicle/types', methods=['GET'])
+def api_get_vehicle_types():
+    try:
+        types = TableVersion.value(VEHICLE_TYPES, get_vehicle_types)
+        return conditional_response([], lambda: json_response({'success': True, 'data': types}), types)
+    except Exception as e:
+        current_app.logger.exception("api_get_vehicle_types error")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @api.route('/vehicle/upsert', methods=['POST'])
 def api_upsert_vehicle():
     data = get_request_data()
@@ -624,7 +527,7 @@ def api_get_service(id):
         s = get_service(id)
         if not s:
             return jsonify({'success': False, 'message': 'Service not found'}), 404
-        return jsonify({'success': True, 'data': serialize_service(s)})
+        return item_response(s, Services, serialize_service)
     except Exception as e:
         current_app.logger.exception("api_get_service error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -633,8 +536,7 @@ def api_get_service(id):
 @api.route('/service/get/all', methods=['GET'])
 def api_get_all_services():
     try:
-        items = get_services()
-        return jsonify({'success': True, 'data': [serialize_service(x) for x in items]})
+        return conditional_response([Services], lambda: list_response(Services.query, Services, serialize_service))
     except Exception as e:
         current_app.logger.exception("api_get_all_services error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -674,7 +576,7 @@ def api_get_bay(id):
         b = get_bay(id)
         if not b:
             return jsonify({'success': False, 'message': 'Bay not found'}), 404
-        return jsonify({'success': True, 'data': serialize_bay(b)})
+        return item_response(b, Bays, serialize_bay)
     except Exception as e:
         current_app.logger.exception("api_get_bay error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -683,8 +585,7 @@ def api_get_bay(id):
 @api.route('/bay/get/all', methods=['GET'])
 def api_get_all_bays():
     try:
-        items = get_bays()
-        return jsonify({'success': True, 'data': [serialize_bay(x) for x in items]})
+        return conditional_response([Bays], lambda: list_response(Bays.query, Bays, serialize_bay))
     except Exception as e:
         current_app.logger.exception("api_get_all_bays error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -720,10 +621,13 @@ def api_delete_bay():
 @api.route('/appointment/get/<int:id>', methods=['GET'])
 def api_get_appointment(id):
     try:
-        a = get_appointment(id)
+        view = Projection.from_args(Appointments, request.args)
+        a = get_appointment(id, view.options(Appointments))
         if not a:
             return jsonify({'success': False, 'message': 'Appointment not found'}), 404
-        return jsonify({'success': True, 'data': serialize_appointment(a)})
+        return jsonify({'success': True, 'data': serialize_appointment(a, view)})
+    except ProjectionError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         current_app.logger.exception("api_get_appointment error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -745,8 +649,9 @@ def api_set_appointment_status():
 @api.route('/appointment/get/all', methods=['GET'])
 def api_get_all_appointments():
     try:
-        items = get_appointments()
-        return jsonify({'success': True, 'data': [serialize_appointment(x) for x in items]})
+        return list_response(Appointments.query, Appointments,
+                             serialize_appointment, time_column='start_time',
+                             filters=('status_id', 'customer_id', 'bay_id', 'vehicle_id', 'service_id'))
     except Exception as e:
         current_app.logger.exception("api_get_all_appointments error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -781,6 +686,45 @@ def api_book_appointment():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@api.route('/appointment/book/bulk', methods=['POST'])
+def api_book_bulk():
+    data = get_request_data()
+    try:
+        items = data.get('vehicles') or []
+        if not isinstance(items, list) or not items:
+            return jsonify({'success': False, 'message': 'vehicles list required'}), 400
+        partial = data.get('partial', True)
+        if isinstance(partial, str):
+            partial = partial.lower() not in ('0', 'false', 'no')
+        res = book_bulk(data.get('customer_id'), items, data.get('window_start'), data.get('window_end'), partial)
+        if 'error' in res:
+            return jsonify({'success': False, 'message': res['error'], 'unassigned': res.get('unassigned', [])}), 400
+        return jsonify({'success': True, 'data': res})
+    except Exception as e:
+        current_app.logger.exception("api_book_bulk error")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/appointment/reoptimize', methods=['POST'])
+def api_reoptimize_day():
+    data = get_request_data()
+    try:
+        bay_ids = data.get('bay_ids') or []
+        staff_ids = data.get('staff_ids') or []
+        if not bay_ids and not staff_ids:
+            return jsonify({'success': False, 'message': 'bay_ids or staff_ids required'}), 400
+        mark_off_shift = data.get('mark_off_shift', True)
+        if isinstance(mark_off_shift, str):
+            mark_off_shift = mark_off_shift.lower() not in ('0', 'false', 'no')
+        res = reoptimize_day(bay_ids, staff_ids, data.get('day'), data.get('from_time'), mark_off_shift)
+        if 'error' in res:
+            return jsonify({'success': False, 'message': res['error']}), 400
+        return jsonify({'success': True, 'data': res})
+    except Exception as e:
+        current_app.logger.exception("api_reoptimize_day error")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @api.route('/appointment/delete', methods=['POST'])
 def api_delete_appointment():
     data = get_request_data()
@@ -794,6 +738,54 @@ def api_delete_appointment():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# QUEUE
+@api.route('/queue', methods=['GET'])
+def api_get_queue():
+    try:
+        limit = request.args.get('limit', 50, type=int)
+        view = Projection.from_args(Appointments, request.args)
+        entries = Dispatcher.queue(limit)
+        appointments = {a.id: a for a in Appointments.query
+                        .options(*view.options(Appointments))
+                        .filter(Appointments.id.in_([e['appointment_id'] for e in entries]))
+                        .all()} if entries else {}
+        return jsonify({'success': True, 'data': [
+            {**e, 'appointment': serialize_appointment(appointments.get(e['appointment_id']), view)} for e in entries
+        ]})
+    except ProjectionError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        current_app.logger.exception("api_get_queue error")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/queue/next', methods=['GET'])
+def api_get_queue_next():
+    try:
+        a = Dispatcher.peek()
+        if not a:
+            return jsonify({'success': False, 'message': 'Queue is empty'}), 404
+        return item_response(a, Appointments, serialize_appointment)
+    except Exception as e:
+        current_app.logger.exception("api_get_queue_next error")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/queue/serve', methods=['POST'])
+def api_serve_queue():
+    data = get_request_data()
+    try:
+        a = Dispatcher.serve(data.get('bay_id'))
+        if not a:
+            return jsonify({'success': False, 'message': 'Queue is empty'}), 404
+        return jsonify({'success': True, 'data': serialize_appointment(a)})
+    except BookingConflict as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+    except Exception as e:
+        current_app.logger.exception("api_serve_queue error")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # PAYMENTS
 @api.route('/payment/get/<int:id>', methods=['GET'])
 def api_get_payment(id):
@@ -801,7 +793,7 @@ def api_get_payment(id):
         p = get_payment(id)
         if not p:
             return jsonify({'success': False, 'message': 'Payment not found'}), 404
-        return jsonify({'success': True, 'data': serialize_payment(p)})
+        return item_response(p, Payments, serialize_payment)
     except Exception as e:
         current_app.logger.exception("api_get_payment error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -810,8 +802,7 @@ def api_get_payment(id):
 @api.route('/payment/get/all', methods=['GET'])
 def api_get_all_payments():
     try:
-        items = get_payments()
-        return jsonify({'success': True, 'data': [serialize_payment(x) for x in items]})
+        return list_response(Payments.query, Payments, serialize_payment, filters=('appointment_id', 'status_id'))
     except Exception as e:
         current_app.logger.exception("api_get_all_payments error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -843,6 +834,23 @@ def api_delete_payment():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# REPORTS
+@api.route('/reports/revenue', methods=['GET'])
+def api_revenue_report():
+    try:
+        bucket = request.args.get('bucket', 'day')
+        if bucket not in REVENUE_BUCKETS:
+            return jsonify({'success': False, 'message': f"bucket must be one of {', '.join(REVENUE_BUCKETS)}"}), 400
+        try:
+            report = get_revenue_report(bucket, request.args.get('from'), request.args.get('to'))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        return jsonify({'success': True, 'data': report})
+    except Exception as e:
+        current_app.logger.exception("api_revenue_report error")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # FEEDBACKS
 @api.route('/feedback/get/<int:id>', methods=['GET'])
 def api_get_feedback(id):
@@ -850,7 +858,7 @@ def api_get_feedback(id):
         f = get_feedback(id)
         if not f:
             return jsonify({'success': False, 'message': 'Feedback not found'}), 404
-        return jsonify({'success': True, 'data': serialize_feedback(f)})
+        return item_response(f, Feedbacks, serialize_feedback)
     except Exception as e:
         current_app.logger.exception("api_get_feedback error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -859,8 +867,7 @@ def api_get_feedback(id):
 @api.route('/feedback/get/all', methods=['GET'])
 def api_get_all_feedbacks():
     try:
-        items = get_feedbacks()
-        return jsonify({'success': True, 'data': [serialize_feedback(x) for x in items]})
+        return list_response(Feedbacks.query, Feedbacks, serialize_feedback, filters=('customer_id', 'appointment_id'))
     except Exception as e:
         current_app.logger.exception("api_get_all_feedbacks error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -896,8 +903,8 @@ def api_delete_feedback():
 @api.route('/notifications/get/all', methods=['GET'])
 def api_get_all_notifications():
     try:
-        items = get_all_notifications()
-        return jsonify({'success': True, 'data': [serialize_notification(x) for x in items]})
+        return list_response(Notifications.query, Notifications, serialize_notification,
+                             filters=('recipient_id', 'sender_id'))
     except Exception as e:
         current_app.logger.exception("api_get_all_notifications error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -919,7 +926,7 @@ def api_get_notification(id):
         n = get_notification(id)
         if not n:
             return jsonify({'success': False, 'message': 'Notification not found'}), 404
-        return jsonify({'success': True, 'data': serialize_notification(n)})
+        return item_response(n, Notifications, serialize_notification)
     except Exception as e:
         current_app.logger.exception("api_get_notification error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -971,7 +978,7 @@ def api_get_role(id):
         r = get_role(id)
         if not r:
             return jsonify({'success': False, 'message': 'Role not found'}), 404
-        return jsonify({'success': True, 'data': serialize_role(r)})
+        return item_response(r, Roles, serialize_role)
     except Exception as e:
         current_app.logger.exception("api_get_role error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -980,8 +987,7 @@ def api_get_role(id):
 @api.route('/role/get/all', methods=['GET'])
 def api_get_all_roles():
     try:
-        items = get_roles()
-        return jsonify({'success': True, 'data': [serialize_role(x) for x in items]})
+        return conditional_response([Roles], lambda: list_response(Roles.query, Roles, serialize_role))
     except Exception as e:
         current_app.logger.exception("api_get_all_roles error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1020,7 +1026,7 @@ def api_get_status(id):
         s = get_status(id)
         if not s:
             return jsonify({'success': False, 'message': 'Status not found'}), 404
-        return jsonify({'success': True, 'data': serialize_status(s)})
+        return item_response(s, Status, serialize_status)
     except Exception as e:
         current_app.logger.exception("api_get_status error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1029,8 +1035,7 @@ def api_get_status(id):
 @api.route('/status/get/all', methods=['GET'])
 def api_get_all_status():
     try:
-        items = get_all_statuses()
-        return jsonify({'success': True, 'data': [serialize_status(x) for x in items]})
+        return conditional_response([Status], lambda: list_response(Status.query, Status, serialize_status))
     except Exception as e:
         current_app.logger.exception("api_get_all_status error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1069,7 +1074,7 @@ def api_get_loyalty(id):
         l = get_loyalty(id)
         if not l:
             return jsonify({'success': False, 'message': 'Loyalty not found'}), 404
-        return jsonify({'success': True, 'data': serialize_loyalty(l)})
+        return item_response(l, Loyalties, serialize_loyalty)
     except Exception as e:
         current_app.logger.exception("api_get_loyalty error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1078,8 +1083,7 @@ def api_get_loyalty(id):
 @api.route('/loyalty/get/all', methods=['GET'])
 def api_get_all_loyalties():
     try:
-        items = get_loyalties()
-        return jsonify({'success': True, 'data': [serialize_loyalty(x) for x in items]})
+        return list_response(Loyalties.query, Loyalties, serialize_loyalty, filters=('customer_id',))
     except Exception as e:
         current_app.logger.exception("api_get_all_loyalties error")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1148,11 +1152,35 @@ def api_check_or_suggest_appointment():
         # Extract data from request
         service_id = data.get('service_id')
         appointment_date = data.get('appointment_date')
+        step = data.get('step', 30)                 # minutes between probes
+        count = data.get('suggestions', 1)          # suggestions per side
 
         if 'check_or_suggest_appointment' in globals() and callable(check_or_suggest_appointment):
-            response = check_or_suggest_appointment(service_id, appointment_date)
+            response = check_or_suggest_appointment(service_id, appointment_date, step, count)
             return jsonify({'success': True, 'message': response})
         return jsonify({'success': False, 'message': 'No check_or_suggest_appointment function found'}), 500
     except Exception as e:
         current_app.logger.exception("api_check_or_suggest_appointment error")
         return jsonify({'success': False, 'error': str(e)}), 500
+
+@api.route('/availability/calendar', methods=['GET'])
+def api_availability_calendar():
+    try:
+        service_id = request.args.get('service_id', type=int)
+        if not service_id:
+            return jsonify({'success': False, 'message': 'service_id required'}), 400
+        response = get_availability_calendar(service_id, request.args.get('from'), request.args.get('to'))
+        if 'error' in response:
+            return jsonify({'success': False, 'message': response['error']}), 400
+        return jsonify({'success': True, 'data': response})
+    except Exception as e:
+        current_app.logger.exception("api_availability_calendar error")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api.route('/availability/cache', methods=['GET'])
+def api_availability_cache():
+    try:
+        return jsonify({'success': True, 'data': AvailabilityCache.get_stats()})
+    except Exception as e:
+        current_app.logger.exception("api_availability_cache error")
+        return jsonify({'success': False, 'error': str(e)}), 500
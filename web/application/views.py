@@ -145,17 +145,18 @@ def admin_dashboard():
     # On-duty Staff / Staff on Shift
     # Average Rating (from Feedbacks)
 
+    summary = get_dashboard_summary()
     data = {
-        'total_appointments_today':     get_current_appointments(),
-        'total_appointments_this_week': get_current_week_appointments(),
-        'total_revenue_today':          get_total_revenue_today(),
-        'total_revenue_this_month':     get_total_revenue_this_month(),
+        'total_appointments_today':     get_current_appointments('list'),
+        'total_appointments_this_week': summary['week']['appointments'] - summary['week']['pending'],
+        'total_revenue_today':          summary['today']['revenue'],
+        'total_revenue_this_month':     summary['month']['revenue'],
         'registered_customers':         get_registered_customers(),
         'active_customers':             get_most_active_customers(),
         'available_bays':               get_available_bays(),
         'on_duty_staff':                Staff.get_staffs_on_duty(),
         'average_rating':               get_average_feedback_rating(),
-        'upcoming':                     get_upcoming_appointments(),
+        'upcoming':                     get_upcoming_appointments('list'),
     }
     return render_template('admin/dashboard.html', data=data)
 
@@ -183,7 +184,7 @@ def admin_customer_details(id):
 @login_required
 @admin_required
 def admin_appointments():
-    appointments = get_appointments()
+    appointments = get_appointments('list')
     return render_template('admin/appointments.html', appointments=appointments)
 
 
@@ -192,7 +193,7 @@ def admin_appointments():
 @admin_required
 def admin_search_appointments():
     start_date = request.form.get('start_date')
-    appointments = get_appointments_by_date(start_date)
+    appointments = get_appointments_by_date(start_date, 'list')
     return render_template('admin/appointments.html', appointments=appointments)
 
 
@@ -262,7 +263,7 @@ def admin_settings():
 @staff_required
 def staff_appointments():
     data = {
-        'upcoming': get_upcoming_appointments(),
+        'upcoming': get_upcoming_appointments('list'),
         'customers': get_customers(),
         'staffs': Staff.get_staffs_on_duty(),
         'services': [ data.to_json() for data in get_services() ],
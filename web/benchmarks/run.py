@@ -0,0 +1,321 @@
+"""
+Benchmarks for the booking engine and the admin dashboard queries.
+
+    cd web
+    python manage.py benchmark --sizes small,medium --output bench.json
+    python manage.py benchmark --sizes small --compare bench.json
+
+Each size is a database built by the synthetic generator (data.seed.generate)
+and kept under --data-dir, keyed on size and seed, so later runs reuse it.
+Each run works on a fresh copy of it, so the booking cases never change the
+kept dataset and two runs see the same data. Every case is timed over
+--repeat calls on a fresh session. The results give p50/p95 latency and the
+number of SQL statements per call, and are written as JSON so two runs can be
+compared.
+"""
+import argparse, json, logging, os, platform, random, shutil, subprocess, sys, time as clock
+
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+from data import app, db, serializers
+from data.models import Appointments, Customers, Services, Vehicles
+from data.seed.generate import Generate
+from data.services.availability_cache import AvailabilityCache
+from data.services.projection import EVERYTHING
+from data.services.staff import Staff
+import data.repo as repo
+
+logger = logging.getLogger(__name__)
+
+# generator parameters per dataset size
+SIZES = {
+    'small':  dict(customers=2000,   months=2,  per_day=80,  bays=5,  washers_count=12),
+    'medium': dict(customers=20000,  months=6,  per_day=250, bays=10, washers_count=30),
+    'large':  dict(customers=150000, months=24, per_day=400, bays=20, washers_count=60),
+}
+
+# appointments per serialization payload, like an unpaginated /api/appointment/get/all
+PAYLOAD_SIZE = 10000
+
+# the calls admin_dashboard makes to build its page
+DASHBOARD = [
+    'get_current_appointments', 'get_current_week_appointments', 'get_total_revenue_today',
+    'get_total_revenue_this_month', 'get_registered_customers', 'get_most_active_customers',
+    'get_available_bays', 'get_average_feedback_rating', 'get_upcoming_appointments',
+]
+
+
+class _StatementCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    k = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(k, len(ordered) - 1)]
+
+
+def _getattr_serialize(obj, model, shape: str = 'api'):
+    """
+    The registry's fields read one at a time with getattr defaults and helper calls,
+    the way the hand-written serializers did; the baseline for the compiled ones.
+    """
+    if obj is None:
+        return {}
+    data = {}
+    for field, target in serializers.fields(model, shape):
+        value = getattr(obj, field.source, None) if field.kind != 'const' else field.arg
+        if target is not None:
+            if field.kind == 'one':
+                data[field.key] = _getattr_serialize(value, target, field.arg) if value is not None else field.missing
+            else:
+                items = [getattr(item, field.each) for item in (value or [])] if field.each else (value or [])
+                data[field.key] = [_getattr_serialize(item, target, field.arg) for item in items]
+        elif field.kind == 'iso':
+            data[field.key] = value.isoformat() if value is not None else None
+        elif field.kind == 'number':
+            data[field.key] = float(value) if value is not None else field.arg
+        else:
+            data[field.key] = value
+    return data
+
+
+def _failed(result) -> bool:
+    return result is False or (isinstance(result, dict) and 'error' in result)
+
+
+def _cases(rng: random.Random) -> List[Dict]:
+    """
+    (name, call) pairs. Every call gets a fresh random start time in the week of
+    upcoming bookings the dataset was generated with; read-only cases come
+    first, since the booking cases add appointments.
+    """
+    services = Services.query.all()
+    # the generator books a week past the day it ran up to
+    last = db.session.query(db.func.max(Appointments.start_time)).scalar()
+    first_day = (last.date() if last else date.today() + timedelta(days=7)) - timedelta(days=6)
+    customer_ids = [c for c, in db.session.query(Customers.id).order_by(Customers.id).limit(5000)]
+    # suggest_appointments_for_customer only picks a service for bikes
+    bikes = (db.session.query(Vehicles.id, Vehicles.customer_id)
+             .filter(Vehicles.customer_id.in_(customer_ids), Vehicles.type.ilike('%bike%'))
+             .all())
+
+    def moment() -> datetime:
+        day = first_day + timedelta(days=rng.randint(0, 6))
+        return datetime.combine(day, datetime.min.time()) + timedelta(hours=rng.randint(8, 20), minutes=rng.choice((0, 15, 30, 45)))
+
+    def stamp() -> str:
+        return moment().strftime('%Y-%m-%d %H:%M')
+
+    # the cached case asks the same few questions over and over, like a busy booking form
+    repeated = [(moment(), rng.choice(services)) for _ in range(3)]
+
+    def slot(use_cache):
+        def call():
+            start_time, service = rng.choice(repeated) if use_cache else (moment(), rng.choice(services))
+            return repo.get_available_bay_and_staff(
+                start_time, timedelta(minutes=service.duration), service.washers_needed, use_cache=use_cache)
+        return call
+
+    def suggest():
+        vehicle_id, customer_id = rng.choice(bikes)
+        return repo.suggest_appointments_for_customer(customer_id, vehicle_id, stamp())
+
+    rows = []
+
+    def payload() -> List[Appointments]:
+        """PAYLOAD_SIZE fully loaded appointments (repeated if the dataset has fewer); loaded on first use."""
+        if not rows:
+            loaded = Appointments.query.options(*EVERYTHING.options(Appointments)).limit(PAYLOAD_SIZE).all()
+            rows.extend(loaded[n % len(loaded)] for n in range(PAYLOAD_SIZE))
+        return rows
+
+    serialize_appointment = serializers.serializer(Appointments)
+
+    cases = [
+        {'name': 'get_available_bay_and_staff', 'call': slot(False)},
+        {'name': 'get_available_bay_and_staff[cached]', 'call': slot(True)},
+        {'name': 'check_or_suggest_appointment',
+         'call': lambda: repo.check_or_suggest_appointment(rng.choice(services).id, stamp())},
+        {'name': 'Staff.get_bay_appointments', 'call': Staff.get_bay_appointments},
+        {'name': 'Staff.get_staffs_on_duty', 'call': Staff.get_staffs_on_duty},
+    ]
+    for name in DASHBOARD:
+        cases.append({'name': f'dashboard.{name}', 'call': getattr(repo, name)})
+    cases.append({'name': 'dashboard', 'call': lambda: [getattr(repo, name)() for name in DASHBOARD]})
+
+    # serialization and encoding only: the rows are loaded once, before the timed calls
+    size = f'{PAYLOAD_SIZE // 1000}k'
+    cases.append({'name': f'serialize.appointments[{size},getattr+json]',
+                  'call': lambda: serializers.dumps_stdlib([_getattr_serialize(a, Appointments) for a in payload()])})
+    cases.append({'name': f'serialize.appointments[{size},compiled+json]',
+                  'call': lambda: serializers.dumps_stdlib([serialize_appointment(a) for a in payload()])})
+    cases.append({'name': f'serialize.appointments[{size},compiled+dumps]',
+                  'call': lambda: serializers.dumps([serialize_appointment(a) for a in payload()])})
+
+    # these write
+    cases.append({'name': 'suggest_appointments_for_customer', 'call': suggest})
+    cases.append({'name': 'quick_book', 'call': lambda: repo.quick_book(rng.choice(services).id, appointment_date=stamp())})
+    return cases
+
+
+def _measure(case: Dict, repeat: int, warmup: int, counter: _StatementCounter) -> Dict:
+    timings, statements, errors = [], [], 0
+    for n in range(warmup + repeat):
+        db.session.remove()
+        counter.count = 0
+        started = clock.perf_counter()
+        result = case['call']()
+        elapsed = clock.perf_counter() - started
+        if n < warmup:
+            continue
+        timings.append(elapsed * 1000)
+        statements.append(counter.count)
+        errors += _failed(result)
+    return {
+        'n': repeat,
+        'errors': errors,
+        'p50_ms': round(_percentile(timings, 50), 3),
+        'p95_ms': round(_percentile(timings, 95), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'statements_p50': _percentile(statements, 50),
+        'statements_max': max(statements),
+    }
+
+
+def _dataset(size: str, data_dir: str, seed: int) -> str:
+    """Path of the generated dataset for `size`, generating it on first use."""
+    path = os.path.abspath(os.path.join(data_dir, f'bench-{size}-{seed}.sqlite'))
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        _use(f'sqlite:///{path}')
+        print(f"Generating the {size} dataset at {path}")
+        Generate.generate(seed=seed, reset=True, **SIZES[size])
+        _use('sqlite://')
+    return path
+
+
+def _working_copy(path: str) -> str:
+    """SQLite URI of a fresh copy of a dataset, for one run to write into."""
+    copy = path[:-len('.sqlite')] + '.run.sqlite'
+    shutil.copyfile(path, copy)
+    return f'sqlite:///{copy}'
+
+
+def _use(uri: str) -> None:
+    """Point the app's engine at another database."""
+    db.session.remove()
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    state = app.extensions['sqlalchemy']
+    for engine in state.connectors.values():
+        engine.get_engine().dispose()
+    state.connectors.clear()
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def run(sizes: List[str], repeat: int = 30, warmup: int = 3, seed: int = 42, data_dir: str = 'instance/bench',
+        database_uri: Optional[str] = None, only: Optional[List[str]] = None) -> Dict:
+    """
+    Run every case against each dataset size (or once against `database_uri`)
+    and return the results as a JSON-ready dict.
+    """
+    results = {
+        'meta': {
+            'revision': _git_revision(),
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'booking_engine': app.config.get('BOOKING_ENGINE', 'orm'),
+            'repeat': repeat,
+            'warmup': warmup,
+            'seed': seed,
+        },
+        'datasets': {},
+    }
+
+    targets = [('custom', database_uri)] if database_uri else [(size, None) for size in sizes]
+    for size, uri in targets:
+        uri = uri or _working_copy(_dataset(size, data_dir, seed))
+        _use(uri)
+        counter = _StatementCounter()
+        event.listen(db.engine, 'before_cursor_execute', counter)
+        try:
+            AvailabilityCache.invalidate()
+            rng = random.Random(seed)
+            dataset = {'dialect': db.engine.dialect.name, 'cases': {}}
+            for case in _cases(rng):
+                if only and not any(name in case['name'] for name in only):
+                    continue
+                dataset['cases'][case['name']] = stats = _measure(case, repeat, warmup, counter)
+                print(f"{size:>8}  {case['name']:<48} p50 {stats['p50_ms']:>9.2f} ms  p95 {stats['p95_ms']:>9.2f} ms"
+                      f"  {stats['statements_p50']:>5} stmts{'  ' + str(stats['errors']) + ' errors' if stats['errors'] else ''}")
+            results['datasets'][size] = dataset
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', counter)
+            db.session.remove()
+    return results
+
+
+def compare(baseline: Dict, current: Dict) -> None:
+    """Print the p50/p95 and statement count change of every case found in both runs."""
+    for size, dataset in current['datasets'].items():
+        before = baseline.get('datasets', {}).get(size, {}).get('cases', {})
+        for name, stats in dataset['cases'].items():
+            old = before.get(name)
+            if not old:
+                continue
+            change = lambda key: (stats[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            print(f"{size:>8}  {name:<48} p50 {change('p50_ms'):>+7.1f}%  p95 {change('p95_ms'):>+7.1f}%"
+                  f"  stmts {old['statements_p50']} -> {stats['statements_p50']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the booking engine and dashboard queries.')
+    parser.add_argument('--sizes', default='small', help=f"comma-separated dataset sizes: {', '.join(SIZES)} (default small)")
+    parser.add_argument('--repeat', type=int, default=30, help='timed calls per case (default 30)')
+    parser.add_argument('--warmup', type=int, default=3, help='untimed calls per case first (default 3)')
+    parser.add_argument('--seed', type=int, default=42, help='dataset and workload seed (default 42)')
+    parser.add_argument('--data-dir', default='instance/bench', help='where generated datasets are kept')
+    parser.add_argument('--database-uri', default=None,
+                        help='benchmark this existing database instead of generated ones; the booking cases write to it')
+    parser.add_argument('--only', default=None, help='comma-separated substrings of the case names to run')
+    parser.add_argument('--output', default=None, help='write the results to this JSON file')
+    parser.add_argument('--compare', default=None, help='print the change against an earlier results file')
+    args = parser.parse_args(argv)
+
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown size(s): {', '.join(unknown)}")
+
+    logging.disable(logging.INFO)
+    with app.app_context():
+        results = run(sizes, repeat=args.repeat, warmup=args.warmup, seed=args.seed, data_dir=args.data_dir,
+                      database_uri=args.database_uri, only=args.only.split(',') if args.only else None)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
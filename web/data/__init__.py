@@ -9,6 +9,27 @@ app.secret_key = 'prodigy_carwash_app'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql://root@localhost/db_prodigy'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = True
 
+# how far ahead the slot finder may push a booking when the requested time is taken
+app.config['SLOT_SEARCH_HORIZON_DAYS'] = 7
+# slot finder backend: 'orm' (interval indexes) or 'grid' (NumPy minute grid)
+app.config['BOOKING_ENGINE'] = 'orm'
+# slot finder result cache: max entries (0 disables it) and seconds an entry lives
+app.config['AVAILABILITY_CACHE_SIZE'] = 512
+app.config['AVAILABILITY_CACHE_TTL'] = 60
+# times a booking that lost a race for the same slot is retried before giving up
+app.config['BOOKING_RETRIES'] = 3
+# seconds between full rebuilds of the in-process priority queue (picks up other processes' changes)
+app.config['DISPATCH_REFRESH_SECONDS'] = 60
+# rows per page of the /api/*/get/all listings when no limit is given, and the most a client may ask for
+app.config['API_PAGE_SIZE'] = 100
+app.config['API_MAX_PAGE_SIZE'] = 500
+# rows per query when a listing is streamed whole (?stream=json or ?stream=ndjson)
+app.config['API_STREAM_CHUNK_SIZE'] = 500
+# seconds a reference table's version stamp (ETag) is trusted before it is read again
+app.config['REFERENCE_VERSION_TTL'] = 30
+# Cache-Control max-age for reference listings; 0 makes clients revalidate every time (a 304 when unchanged)
+app.config['REFERENCE_CACHE_MAX_AGE'] = 0
+
 db = SQLAlchemy(app)
 
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
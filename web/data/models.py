@@ -1,5 +1,7 @@
-from datetime import time
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional
 from data import db, login_manager
+from data.serializers import serialize
 from sqlalchemy.ext.hybrid import hybrid_property, hybrid_method
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -67,25 +69,7 @@ class Accounts(UserMixin, db.Model):
         return f'{self.first_name} {self.last_name}'
 
     def to_json(self):
-        return {
-            'id': self.id,
-            'first_name': self.first_name,
-            'middle_name': self.middle_name,
-            'last_name': self.last_name,
-            'full_name': self.full_name,
-            'gender': self.gender,
-            'phone_1': self.phone_1,
-            'phone_2': self.phone_2,
-            'birth_date': self.birth_date.strftime('%Y-%m-%d') if self.birth_date else None,
-            'email': self.email,
-            'address': self.address,
-            'image_profile': self.image_profile,
-            'is_active': self.is_active,
-            'role': self.role.role if self.role else None,
-            'role_id': self.role_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return serialize(self)
 
 # =============================================================
 # CUSTOMERS
@@ -113,16 +97,7 @@ class Customers(UserMixin, db.Model):
     loyalties = db.relationship('Loyalties', back_populates='customer', cascade="all, delete-orphan")
 
     def to_json(self):
-        return {
-            'id': self.id,
-            'is_registered': self.is_registered,
-            'is_pwd': self.is_pwd,
-            'is_senior': self.is_senior,
-            'account': self.account.to_json() if self.account else None,
-            'vehicles': [v.to_json() for v in self.vehicles],
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return serialize(self)
     
 # =============================================================
 # STAFFS
@@ -143,23 +118,34 @@ class Staffs(UserMixin, db.Model):
 
     # relationships
     account = db.relationship('Accounts', back_populates='staff')
-    appointments = db.relationship('Appointments', secondary=washers, back_populates='staffs', lazy='subquery')
+    # every job the washer ever had; use appointments_between / appointments_on for a window
+    appointments = db.relationship('Appointments', secondary=washers, back_populates='staffs', lazy='select')
     schedules = db.relationship('Schedules', back_populates='staff', cascade="all, delete-orphan")
     
     @hybrid_method
     def shift(self, day):
-        return next((s.shift for s in self.schedules if s.day.lower() == day.lower()), None)
+        from data.services.roster import Roster
+        return Roster.current().label(self.id, day)
+
+    def appointments_between(self, start: datetime, end: Optional[datetime] = None) -> List['Appointments']:
+        """
+        The washer's appointments starting in [start, end), earliest first. Runs as a
+        range scan on appointments.start_time with a primary key lookup into washers,
+        so the cost follows the window, not the washer's history.
+        """
+        query = (Appointments.query
+                 .join(washers, washers.c.appointment_id == Appointments.id)
+                 .filter(washers.c.staff_id == self.id, Appointments.start_time >= start))
+        if end is not None:
+            query = query.filter(Appointments.start_time < end)
+        return query.order_by(Appointments.start_time).all()
+
+    def appointments_on(self, day: date) -> List['Appointments']:
+        start = datetime.combine(day, time.min)
+        return self.appointments_between(start, start + timedelta(days=1))
 
     def to_json(self):
-        return {
-            'id': self.id,
-            'is_front_desk': self.is_front_desk,
-            'is_on_shift': self.is_on_shift,
-            'account': self.account.to_json() if self.account else None,
-            'schedules': [s.to_json() for s in self.schedules],
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return serialize(self)
 
 # =============================================================
 # STAFF SCHEDULES
@@ -187,22 +173,21 @@ class Schedules(UserMixin, db.Model):
         return f'{self.shift_start.strftime("%I:%M %p") } - {self.shift_end.strftime("%I:%M %p") }'
 
     def to_json(self):
-        return {
-            'id': self.id,
-            'day': self.day,
-            'shift_start': self.shift_start.strftime('%H:%M') if self.shift_start else None,
-            'shift_end': self.shift_end.strftime('%H:%M') if self.shift_end else None,
-            'shift': self.shift,
-            'staff_id': self.staff_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return serialize(self)
     
 # =============================================================
 # APPOINTMENTS
 # =============================================================
 class Appointments(db.Model):
     __tablename__ = 'appointments'
+    __table_args__ = (
+        # day and week listings: start_time range, then status
+        db.Index('ix_appointments_start_status', 'start_time', 'status_id'),
+        # bay overlap checks and the per-bay board
+        db.Index('ix_appointments_bay_start_end', 'bay_id', 'start_time', 'end_time'),
+        # a customer's history and bookings
+        db.Index('ix_appointments_customer_start', 'customer_id', 'start_time'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
@@ -229,20 +214,7 @@ class Appointments(db.Model):
     vehicle = db.relationship('Vehicles', back_populates='appointments')
 
     def to_json(self):
-        return {
-            'id': self.id,
-            'start_time': self.start_time.isoformat() if self.start_time else None,
-            'end_time': self.end_time.isoformat() if self.end_time else None,
-            'bay': self.bay.to_json() if self.bay else None,
-            'customer': self.customer.account.to_json() if self.customer and self.customer.account else None,
-            'vehicle': self.vehicle.to_json() if self.vehicle else None,
-            'service': self.service.to_json() if self.service else None,
-            'status': self.status.to_json() if self.status else None,
-            'staffs': [s.account.to_json() for s in self.staffs],
-            'payments': [p.to_json() for p in self.payments],
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return serialize(self)
     
 # =============================================================
 # PAYMENTS
@@ -256,8 +228,8 @@ class Payments(db.Model):
     image_payment = db.Column(db.String(128), default="img/txn/no-photo.jpg")
     amount = db.Column(db.Numeric(10, 2), nullable=False)
 
-    # timestamps
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    # timestamps (created_at is indexed for the revenue reports)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)
     updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
 
     # Foreign key
@@ -269,17 +241,7 @@ class Payments(db.Model):
     status = db.relationship('Status', back_populates='payments')
 
     def to_json(self):
-        return {
-            'id': self.id,
-            'method': self.method,
-            'transaction_no': self.transaction_no,
-            'image_payment': self.image_payment,
-            'amount': float(self.amount),
-            'status': self.status.to_json() if self.status else None,
-            'appointment_id': self.appointment_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return serialize(self)
     
 # =============================================================
 # SERVICES
@@ -301,17 +263,7 @@ class Services(db.Model):
     appointments = db.relationship('Appointments', back_populates='service', cascade="all, delete-orphan")
 
     def to_json(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'price': float(self.price),
-            'duration': self.duration,
-            'washers_needed': self.washers_needed,
-            'type': self.type,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return serialize(self)
     
 # =============================================================
 # VEHICLES
@@ -333,15 +285,7 @@ class Vehicles(db.Model):
     appointments = db.relationship("Appointments", back_populates="vehicle", cascade="all, delete-orphan")
 
     def to_json(self):
-        return {
-            'id': self.id,
-            'plate_number': self.plate_number,
-            'model': self.model,
-            'type': self.type,
-            'customer_id': self.customer_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return serialize(self)
     
 # =============================================================
 # BAYS
@@ -358,12 +302,7 @@ class Bays(db.Model):
     appointments = db.relationship("Appointments", back_populates="bay", cascade="all, delete-orphan")
 
     def to_json(self):
-        return {
-            'id': self.id,
-            'bay': self.bay,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return serialize(self)
     
 # =============================================================
 # ROLES
@@ -380,12 +319,7 @@ class Roles(db.Model):
     accounts = db.relationship('Accounts', backref='role', lazy='dynamic')
 
     def to_json(self):
-        return {
-            'id': self.id,
-            'role': self.role,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return serialize(self)
     
 # =============================================================
 # STATUS
@@ -402,12 +336,7 @@ class Status(db.Model):
     payments = db.relationship('Payments', back_populates='status', lazy='dynamic')
 
     def to_json(self):
-        return {
-            'id': self.id,
-            'status': self.status,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return serialize(self)
     
 # =============================================================
 # NOTIFICATIONS
@@ -430,18 +359,7 @@ class Notifications(db.Model):
     sender = db.relationship("Accounts", back_populates="sent", foreign_keys=[sender_id])
 
     def to_json(self):
-        return {
-            'id': self.id,
-            'content': self.content,
-            'notif_type': self.notif_type,
-            'viewed': self.viewed,
-            'recipient_id': self.recipient_id,
-            'recipient': self.recipient.to_json() if self.recipient else None,
-            'sender_id': self.sender_id,
-            'sender': self.sender.to_json() if self.sender else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return serialize(self)
     
 # =============================================================
 # FEEDBACKS
@@ -463,15 +381,7 @@ class Feedbacks(db.Model):
     appointment = db.relationship("Appointments", back_populates="feedbacks")
 
     def to_json(self):
-        return {
-            'id': self.id,
-            'rating': self.rating,
-            'comment': self.comment,
-            'customer_id': self.customer_id,
-            'appointment_id': self.appointment_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return serialize(self)
     
 # =============================================================
 # LOYALTIES
@@ -490,15 +400,101 @@ class Loyalties(db.Model):
     customer = db.relationship("Customers", back_populates="loyalties")
 
     def to_json(self):
-        return {
-            'id': self.id,
-            'points': self.points,
-            'note': self.note,
-            'customer_id': self.customer_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return serialize(self)
     
+# =============================================================
+# WORKLOADS
+# =============================================================
+class Workloads(db.Model):
+    __tablename__ = 'workloads'
+    __table_args__ = (db.UniqueConstraint('entity', 'entity_id', 'day', name='uq_workloads_entity_day'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(10), nullable=False)      # 'bay' or 'staff'
+    entity_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    appointments = db.Column(db.Integer, nullable=False, default=0)
+
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    def to_json(self):
+        return serialize(self)
+
+# =============================================================
+# BOOKING LOCKS
+# =============================================================
+class BookingLocks(db.Model):
+    __tablename__ = 'booking_locks'
+
+    day = db.Column(db.Date, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)   # bumped by every booking on the day
+
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    def to_json(self):
+        return serialize(self)
+
+# =============================================================
+# DAILY ROLLUPS
+# =============================================================
+class DailyRollups(db.Model):
+    __tablename__ = 'daily_rollups'
+
+    day = db.Column(db.Date, primary_key=True)
+
+    # appointments starting on the day, by status
+    appointments = db.Column(db.Integer, nullable=False, default=0)
+    pending = db.Column(db.Integer, nullable=False, default=0)
+    in_queue = db.Column(db.Integer, nullable=False, default=0)
+    now_serving = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    cancelled = db.Column(db.Integer, nullable=False, default=0)
+
+    # payments made on the day, by method
+    payments = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    revenue_cash = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    revenue_gcash = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    revenue_xendit = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+    # feedbacks left on the day; kept as sum and count so ranges can be averaged
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+
+    # minutes booked by appointments that were not cancelled
+    bay_minutes = db.Column(db.Integer, nullable=False, default=0)
+    washer_minutes = db.Column(db.Integer, nullable=False, default=0)
+
+    is_stale = db.Column(db.Boolean, nullable=False, default=False)   # set by commits touching the day
+    refreshed_at = db.Column(db.DateTime)
+
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else 0.0
+
+    def to_json(self):
+        return serialize(self)
+
+# =============================================================
+# TABLE VERSIONS
+# =============================================================
+class TableVersions(db.Model):
+    __tablename__ = 'table_versions'
+
+    name = db.Column(db.String(64), primary_key=True)             # the counted table's __tablename__
+    version = db.Column(db.Integer, nullable=False, default=0)   # bumped by every transaction writing to it
+
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    def to_json(self):
+        return serialize(self)
+
 # =============================================================
 # LOGIN MANAGER
 # =============================================================
@@ -1,4 +1,5 @@
 import logging, jwt
+from collections import Counter
 from flask_login import login_user
 from datetime import datetime, date, timedelta, time
 from typing import Optional, List, Union, Dict, Any
@@ -9,10 +10,19 @@ from data import db  # your SQLAlchemy instance
 from data.models import (
     Accounts, Customers, Staffs, Appointments, Payments, Services,
     Vehicles, Bays, Roles, Status, Notifications, Feedbacks, Loyalties,
-    Schedules
+    Schedules, washers
 )
 
 from data.utils import *
+from data.services.availability import Occupancy
+from data.services.availability_cache import AvailabilityCache
+from data.services.booking_lock import BookingConflict, BookingLock, retry_on_conflict
+from data.services.dispatch import Dispatcher
+from data.services.loading import appointment_options
+from data.services.workload import Workload
+from data.services.roster import Roster
+from data.services.rollup import Rollup
+from data.services.reference import CANCELLED, COMPLETED, IN_QUEUE, PENDING, ReferenceRegistry
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -30,6 +40,14 @@ def _parse_time(time_str: str) -> Optional[time]:
     except ValueError:
         return None
 
+def _day_range(first: date, last: Optional[date] = None):
+    """
+    [first 00:00, day after last 00:00) for filtering a DateTime column on whole days.
+    Comparing the bare column keeps the query sargable, unlike cast(column, Date).
+    """
+    start = datetime.combine(first, time.min)
+    return start, datetime.combine(last or first, time.min) + timedelta(days=1)
+
 def _parse_date_mmddyyyy(s: Optional[str]) -> Optional[datetime]:
     if not s:
         return None
@@ -228,7 +246,7 @@ def get_most_active_customers(limit: int = 5) -> List[Customers]:
             Appointments.customer_id,
             db.func.count(Appointments.id).label('appt_count')
         )
-        .filter(Appointments.status_id == 3)  # Completed status
+        .filter(Appointments.status_id.in_(ReferenceRegistry.current().status_ids(COMPLETED)))
         .group_by(Appointments.customer_id)
         .subquery()
     )
@@ -360,6 +378,8 @@ def set_staff_schedules(request: Dict[str, Any]) -> Union[Schedules, bool, None]
         db.session.rollback()
         logger.exception("set_staff_schedules failed")
         return False 
+    finally:
+        Roster.invalidate()
     
     return False not in response
 
@@ -427,6 +447,7 @@ def delete_staff(request: Dict[str, Any]) -> bool:
         # Many-to-many links are removed when staff is deleted by SQLAlchemy
         db.session.delete(staff.account)  # cascade delete staff
         db.session.commit()
+        Roster.invalidate()  # schedules went with the staff
         logger.debug("Deleted staff id=%s", request.get('id'))
         return True
     except Exception as e:
@@ -482,6 +503,7 @@ def upsert_schedule(request: Dict[str, Any]) -> Union[Schedules, bool, None]:
             sched.shift_end = shift_end or time(16, 0)
             sched.day = day or sched.day
             db.session.commit()
+            Roster.invalidate()
             logger.debug("Updated schedule id=%s", sched.id)
             return sched
         else:
@@ -493,6 +515,7 @@ def upsert_schedule(request: Dict[str, Any]) -> Union[Schedules, bool, None]:
             )
             db.session.add(sched)
             db.session.commit()
+            Roster.invalidate()
             logger.debug("Created schedule id=%s", sched.id)
             return sched
     except Exception as e:
@@ -509,6 +532,7 @@ def delete_schedule(request: Dict[str, Any]) -> bool:
             return False
         db.session.delete(sched)
         db.session.commit()
+        Roster.invalidate()
         logger.debug("Deleted schedule id=%s", request.get('id'))
         return True
     except Exception as e:
@@ -520,36 +544,56 @@ def delete_schedule(request: Dict[str, Any]) -> bool:
 # APPOINTMENTS
 # ==================================================================================
 
-def get_appointments() -> List[Appointments]:
-    return Appointments.query.all()
+# `profile` names a set of eager loads from data.services.loading ('list' or 'detail')
+# for callers that walk the appointments' relationships.
 
-def get_appointment(appointment_id: int) -> Optional[Appointments]:
-    return Appointments.query.filter_by(id=appointment_id).first()
+def get_appointments(profile: Optional[str] = None) -> List[Appointments]:
+    return Appointments.query.options(*appointment_options(profile)).all()
 
-def get_current_appointments() -> List[Appointments]:
-    return Appointments.query.filter(cast(Appointments.start_time, Date) == date.today(), Appointments.status_id > 1).order_by(Appointments.start_time, Appointments.status_id).all()
+def get_appointment(appointment_id: int, profile: Optional[str] = None) -> Optional[Appointments]:
+    return Appointments.query.options(*appointment_options(profile)).filter_by(id=appointment_id).first()
+
+def get_current_appointments(profile: Optional[str] = None) -> List[Appointments]:
+    start, end = _day_range(date.today())
+    return (Appointments.query
+            .options(*appointment_options(profile))
+            .filter(
+                Appointments.start_time >= start,
+                Appointments.start_time < end,
+                Appointments.status_id > 1
+            )
+            .order_by(Appointments.start_time, Appointments.status_id)
+            .all())
 
-def get_current_week_appointments() -> List[Appointments]: 
+def get_current_week_appointments(profile: Optional[str] = None) -> List[Appointments]: 
     today = date.today()
     start_of_week = today - timedelta(days=today.weekday())  # Monday
     end_of_week = start_of_week + timedelta(days=6)          # Sunday
+    start, end = _day_range(start_of_week, end_of_week)
     return (Appointments.query
+            .options(*appointment_options(profile))
             .filter(
-                cast(Appointments.start_time, Date) >= start_of_week,
-                cast(Appointments.start_time, Date) <= end_of_week,
+                Appointments.start_time >= start,
+                Appointments.start_time < end,
                 Appointments.status_id > 1
             )
             .order_by(Appointments.start_time, Appointments.status_id)
             .all())
 
 
-def get_appointment_requests() -> List[Appointments]:
-    return Appointments.query.filter(Appointments.status_id == 1).order_by(Appointments.start_time).all()
+def get_appointment_requests(profile: Optional[str] = None) -> List[Appointments]:
+    return Appointments.query.options(*appointment_options(profile)).filter(Appointments.status_id.in_(ReferenceRegistry.current().status_ids(PENDING))).order_by(Appointments.start_time).all()
 
-def get_upcoming_appointments() -> List[Appointments]:
-    return Appointments.query.filter(cast(Appointments.start_time, Date) > date.today(), Appointments.status_id > 1).order_by(Appointments.start_time, Appointments.status_id).all()
+def get_upcoming_appointments(profile: Optional[str] = None) -> List[Appointments]:
+    _, tomorrow = _day_range(date.today())
+    return (Appointments.query
+            .options(*appointment_options(profile))
+            .filter(Appointments.start_time >= tomorrow,
+                    Appointments.status_id.notin_(ReferenceRegistry.current().status_ids(PENDING)))
+            .order_by(Appointments.start_time, Appointments.status_id)
+            .all())
 
-def get_appointments_by_date(start_date: Union[str, date, None]) -> List[Appointments]:
+def get_appointments_by_date(start_date: Union[str, date, None], profile: Optional[str] = None) -> List[Appointments]:
     """
     Return appointments that occur on the provided date.
     Accepts 'YYYY-MM-DD' string or date object. If None -> today.
@@ -562,7 +606,12 @@ def get_appointments_by_date(start_date: Union[str, date, None]) -> List[Appoint
         except Exception:
             start_date = date.today()
 
-    return Appointments.query.filter(cast(Appointments.start_time, Date) == start_date).order_by(Appointments.start_time).all()
+    start, end = _day_range(start_date)
+    return (Appointments.query
+            .options(*appointment_options(profile))
+            .filter(Appointments.start_time >= start, Appointments.start_time < end)
+            .order_by(Appointments.start_time)
+            .all())
 
 
 def get_weekly_appointments() -> Dict[str, List[Appointments]]:
@@ -583,6 +632,7 @@ def get_weekly_appointments() -> Dict[str, List[Appointments]]:
     return week_days
 
 
+@retry_on_conflict(failed=False)
 def book_appointment(request: Dict[str, Any]) -> Union[Appointments, str, bool]:
     """
     Attempt to book an appointment into a free bay.
@@ -591,7 +641,8 @@ def book_appointment(request: Dict[str, Any]) -> Union[Appointments, str, bool]:
     Returns: created Appointments instance or string message or False on error.
     """
     try:
-        service = Services.query.filter_by(id=request.get('service_id')).first()
+        references = ReferenceRegistry.current()
+        service = references.service(request.get('service_id'))
         if not service:
             return "Service not found"
 
@@ -600,12 +651,12 @@ def book_appointment(request: Dict[str, Any]) -> Union[Appointments, str, bool]:
             return "Invalid start_time"
 
         end = start + timedelta(minutes=service.duration)
-        bays = Bays.query.all()
-        for bay in bays:
+        BookingLock.acquire({start.date(), end.date()})
+        for bay in references.bays:
             conflict = Appointments.query.filter(
                 Appointments.bay_id == bay.id,
                 ~((Appointments.end_time <= start) | (Appointments.start_time >= end))
-            ).first()
+            ).with_for_update(read=True).first()
             if not conflict:
                 appt = Appointments(
                     start_time=start,
@@ -614,7 +665,7 @@ def book_appointment(request: Dict[str, Any]) -> Union[Appointments, str, bool]:
                     vehicle_id=request.get('vehicle_id'),
                     service_id=request.get('service_id'),
                     bay_id=bay.id,
-                    status_id=request.get('status_id', 2)
+                    status_id=request.get('status_id') or references.status_id(IN_QUEUE)
                 )
                 db.session.add(appt)
                 db.session.flush()
@@ -630,6 +681,8 @@ def book_appointment(request: Dict[str, Any]) -> Union[Appointments, str, bool]:
                 logger.debug("Booked appointment id=%s bay_id=%s", appt.id, bay.id)
                 return appt
         return "No available bay at that time"
+    except BookingConflict:
+        raise
     except Exception as e:
         db.session.rollback()
         logger.exception("book_appointment failed")
@@ -648,6 +701,7 @@ def format_date(appointment_date):
     now = now.replace(second=0, microsecond=0) # truncate seconds
     return now
 
+@retry_on_conflict(failed=False)
 def upsert_appointment(request: Dict[str, Any]) -> Union[Appointments, bool, None]:
     """
     Create or update an appointment. Returns the appointment instance or False/None on failure/not found.
@@ -670,27 +724,31 @@ def upsert_appointment(request: Dict[str, Any]) -> Union[Appointments, bool, Non
             if format_date(appointment_date) != appointment.start_time or service_id != appointment.service_id:
                 
                 # Service lookup
-                service = Services.query.get(service_id)
+                references = ReferenceRegistry.current()
+                service = references.service(service_id)
                 if not service:
                     raise ValueError("Invalid service ID")
 
                 duration = timedelta(minutes=service.duration)
                 washers_needed = service.washers_needed
 
-                appointment.status_id = 5
+                appointment.status_id = references.status_id(CANCELLED)
                 db.session.flush()
 
                 # Get available slot
                 slot = get_available_bay_and_staff(format_date(appointment_date), duration, washers_needed)
                 if not slot:
                     raise ValueError("No available bay or staff found.")
+
+                # Lock the slot's days and re-check it against concurrent bookings
+                BookingLock.reserve(slot, exclude_id=appointment.id)
                 
                 # NEEDS AD HOC TEST
                 appointment.start_time  = slot["start_time"]
                 appointment.end_time    = slot["end_time"]
                 appointment.bay_id      = slot["bay"].id
                 appointment.staffs      = slot["staff"]
-                status_id               = 2
+                status_id               = references.status_id(IN_QUEUE)
 
             appointment.customer_id = customer_id or appointment.customer_id
             appointment.vehicle_id  = vehicle_id or appointment.vehicle_id
@@ -703,6 +761,8 @@ def upsert_appointment(request: Dict[str, Any]) -> Union[Appointments, bool, Non
         else:
             # create new
             return quick_book(service_id, customer_id, vehicle_id, appointment_date)
+    except BookingConflict:
+        raise
     except Exception as e:
         db.session.rollback()
         logger.exception("upsert_appointment failed")
@@ -746,16 +806,16 @@ def get_payments() -> List[Payments]:
     return Payments.query.all()
 
 
+def _total_revenue(start: datetime, end: datetime) -> float:
+    """Sum of payments made in [start, end), added up by the database."""
+    total = (db.session.query(db.func.sum(Payments.amount))
+             .filter(Payments.created_at >= start, Payments.created_at < end)
+             .scalar())
+    return float(total) if total else 0.0
+
+
 def get_total_revenue_today() -> float:
-    today = date.today()
-    payments = (Payments.query
-                .filter(
-                    cast(Payments.created_at, Date) == today
-                )
-                .order_by(Payments.created_at)
-                .all())
-    
-    return sum(p.amount for p in payments if p.amount) if payments else 0.0
+    return _total_revenue(*_day_range(date.today()))
 
 
 def get_total_revenue_this_month() -> float:
@@ -768,15 +828,126 @@ def get_total_revenue_this_month() -> float:
     else:
         end_of_month = date(today.year, today.month + 1, 1) - timedelta(days=1)
 
-    payments = (Payments.query
-                .filter(
-                    cast(Payments.created_at, Date) >= start_of_month,
-                    cast(Payments.created_at, Date) <= end_of_month
-                )
-                .order_by(Payments.created_at)
-                .all())
-    
-    return sum(p.amount for p in payments if p.amount) if payments else 0.0
+    return _total_revenue(*_day_range(start_of_month, end_of_month))
+
+
+def get_dashboard_summary() -> Dict[str, Dict]:
+    """Today's, this week's and this month's totals, read from the daily rollups."""
+    today = date.today()
+    start_of_week = today - timedelta(days=today.weekday())
+    start_of_month = date(today.year, today.month, 1)
+    return {
+        'today': Rollup.summary(today, today),
+        'week': Rollup.summary(start_of_week, start_of_week + timedelta(days=6)),
+        'month': Rollup.summary(start_of_month, today),
+    }
+
+
+def get_monthly_reports(month: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Daily rollups for a 'YYYY-MM' month (default the current one) plus the month's
+    totals: appointments by status, revenue by method, ratings and minutes booked.
+    """
+    try:
+        first = datetime.strptime(month, "%Y-%m").date() if month else date.today().replace(day=1)
+    except ValueError:
+        first = date.today().replace(day=1)
+    last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    rows = Rollup.get(first, last)
+    return {
+        'month': first.strftime("%Y-%m"),
+        'days': [row.to_json() for row in rows],
+        'totals': Rollup.totals(rows),
+    }
+
+
+REVENUE_BUCKETS = ('hour', 'day', 'week', 'month')
+
+# how bucket keys are written in the report; weeks are keyed by their Monday
+_BUCKET_FORMATS = {'hour': '%Y-%m-%d %H:00', 'day': '%Y-%m-%d', 'week': '%Y-%m-%d', 'month': '%Y-%m'}
+
+
+def _time_bucket(column, bucket: str):
+    """SQL expression truncating a DateTime column to the start of its bucket, per dialect."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        if bucket == 'week':
+            return db.func.date(column, '-6 days', 'weekday 1')
+        return db.func.strftime(_BUCKET_FORMATS[bucket], column)
+    if dialect == 'mysql':
+        if bucket == 'week':
+            return db.func.subdate(db.func.date(column), db.func.weekday(column))
+        return db.func.date_format(column, _BUCKET_FORMATS[bucket])
+    return db.func.date_trunc(bucket, column)
+
+
+def get_revenue_report(bucket: str = 'day', date_from: Union[str, date, None] = None,
+                       date_to: Union[str, date, None] = None) -> Dict[str, Any]:
+    """
+    Revenue per time bucket, with each bucket split by payment method and by service,
+    for payments made from `date_from` through `date_to` (whole days, inclusive;
+    defaults to this month so far). One GROUP BY query over the created_at index
+    does the adding up; the rows are only folded into buckets here.
+    """
+    if bucket not in REVENUE_BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(REVENUE_BUCKETS)}")
+
+    def as_date(value, default):
+        if not value:
+            return default
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        return datetime.strptime(value[:10], "%Y-%m-%d").date()
+
+    today = date.today()
+    first = as_date(date_from, date(today.year, today.month, 1))
+    last = as_date(date_to, today)
+    if last < first:
+        raise ValueError("'to' must not be before 'from'")
+    start, end = _day_range(first, last)
+
+    key = _time_bucket(Payments.created_at, bucket).label('bucket')
+    rows = (db.session.query(
+                key, Payments.method, Services.id, Services.name, Services.type,
+                db.func.sum(Payments.amount), db.func.count(Payments.id))
+            .join(Appointments, Appointments.id == Payments.appointment_id)
+            .join(Services, Services.id == Appointments.service_id)
+            .filter(Payments.created_at >= start, Payments.created_at < end)
+            .group_by(key, Payments.method, Services.id, Services.name, Services.type)
+            .order_by(key)
+            .all())
+
+    buckets: Dict[str, Dict[str, Any]] = {}
+    for label, method, service_id, service_name, service_type, amount, count in rows:
+        if isinstance(label, (datetime, date)):
+            label = label.strftime(_BUCKET_FORMATS[bucket])
+        amount = float(amount or 0)
+        entry = buckets.setdefault(str(label), {"bucket": str(label), "total": 0.0, "payments": 0,
+                                                "by_method": {}, "by_service": {}})
+        entry["total"] += amount
+        entry["payments"] += count
+        entry["by_method"][method or "unknown"] = entry["by_method"].get(method or "unknown", 0.0) + amount
+        service = entry["by_service"].setdefault(service_id, {"service_id": service_id, "name": service_name,
+                                                              "type": service_type, "total": 0.0, "payments": 0})
+        service["total"] += amount
+        service["payments"] += count
+
+    series = []
+    for entry in buckets.values():
+        entry["total"] = round(entry["total"], 2)
+        entry["by_method"] = {m: round(v, 2) for m, v in entry["by_method"].items()}
+        entry["by_service"] = sorted(entry["by_service"].values(), key=lambda s: -s["total"])
+        series.append(entry)
+
+    return {
+        "bucket": bucket,
+        "from": first.isoformat(),
+        "to": last.isoformat(),
+        "total": round(sum(e["total"] for e in series), 2),
+        "buckets": series,
+    }
 
 
 def get_payment(payment_id: int) -> Optional[Payments]:
@@ -1129,8 +1300,8 @@ def get_feedback(feedback_id: int) -> Optional[Feedbacks]:
 
 
 def get_average_feedback_rating() -> float:
-    feedbacks = Feedbacks.query.all()
-    return sum(feedback.rating for feedback in feedbacks) / len(feedbacks) if feedbacks else 0.0
+    average = db.session.query(db.func.avg(Feedbacks.rating)).scalar()
+    return float(average) if average is not None else 0.0
 
 
 def upsert_feedback(request: Dict[str, Any]) -> Union[Feedbacks, bool]:
@@ -1319,127 +1490,67 @@ def delete_loyalty(request: Dict[str, Any]) -> bool:
     
 # =============================================================================================
 
-def get_available_bay_and_staff(start_time, duration, washers_needed, recursion_depth=0):
+def load_availability(window_start: datetime, window_end: datetime):
+    """
+    Load bays, washers and bookings for a window into the engine selected by
+    the BOOKING_ENGINE config flag: 'orm' (interval indexes) or 'grid' (NumPy).
+    Both answer slot_at() and earliest_slot() with the same slot dicts.
+    """
+    occupancy = Occupancy.load(window_start, window_end)
+    if app.config.get('BOOKING_ENGINE') == 'grid':
+        from data.services.occupancy_grid import OccupancyGrid
+        return OccupancyGrid(occupancy)
+    return occupancy
+
+
+def get_available_bay_and_staff(start_time, duration, washers_needed, use_cache=True):
     """
     Finds an available bay and the required number of staff for a given time slot.
     Utilizes all bays first before stacking appointments, and balances staff assignments
     so that workloads are distributed fairly among on-shift washers.
+    When the requested time is taken, the earliest feasible slot is found by sweeping
+    the bay and washer free intervals of a single snapshot loaded up front, looking
+    up to SLOT_SEARCH_HORIZON_DAYS ahead. Returns None if nothing fits.
+    Answers are cached until a commit touches the days they cover; pass
+    use_cache=False to always read the database.
     """
 
     logging.basicConfig(level=logging.INFO)
     log = logging.getLogger("auto-booking")
 
+    # results computed on top of uncommitted changes must not outlive the transaction
+    use_cache = use_cache and AvailabilityCache.enabled() and not AvailabilityCache.pending(db.session)
+    if use_cache:
+        key = AvailabilityCache.key(start_time, duration, washers_needed)
+        hit, slot = AvailabilityCache.get(key)
+        if hit:
+            return slot
+        generation = AvailabilityCache.generation
+
     # # --- Skip past times ---
     # if start_time.replace(second=0, microsecond=0) < datetime.now().replace(second=0, microsecond=0):
     #     return None
 
-    now = start_time
-    end_time = start_time + duration
-  
-    if recursion_depth > 20:
-        log.error("Recursion depth exceeded: no available slot found.")
-        raise RuntimeError("No available bay or staff found after many attempts.")
+    horizon = timedelta(days=app.config.get('SLOT_SEARCH_HORIZON_DAYS', 7))
+    day_start = datetime.combine(start_time.date(), time.min)
+    engine = load_availability(day_start, start_time + horizon + duration)
 
-    log.info(f"\nChecking slot: {start_time} → {end_time} | Depth: {recursion_depth}")
+    log.info(f"Searching slot from {start_time} for {duration} with {washers_needed} washer(s) | "
+             f"{len(engine.bays)} bays, {len(engine.staffs)} on-shift staff")
 
-    # Step 1: Get all bays and on-shift staff
-    all_bays = Bays.query.all()
-    all_staff = Staffs.query.filter(Staffs.is_on_shift == True, Staffs.is_front_desk == False).all()
-
-    log.info(f"Found {len(all_bays)} total bays, {len(all_staff)} on-shift staff")
-
-    # Pre-compute each staff’s workload (number of appointments today)
-    for staff in all_staff:
-        staff.daily_appointments = sum(
-            1 for a in staff.appointments if a.start_time and a.start_time.date() == now.date() and a.status.id not in [4, 5] # Completed or Cancelled
-        )
-
-    # Pre-compute each bay’s workload (number of appointments today)
-    for bay in all_bays:
-        bay.daily_appointments = sum(
-            1 for a in bay.appointments if a.start_time and a.start_time.date() == now.date() and a.status.id not in [4, 5] # Completed or Cancelled
-        )
-
-    # Sort staff so those with fewer appointments are prioritized
-    all_staff.sort(key=lambda s: s.daily_appointments)
-    print(all_staff)
-
-    # Sort bay so those with fewer appointments are prioritized
-    all_bays.sort(key=lambda b: b.daily_appointments)
-    print(all_bays)
-
-    # Step 2: Iterate through all bays (to fully utilize them before stacking)
-    for bay in all_bays:
-
-        # Check if bay is busy during this time slot
-        bay_busy = any(
-            bay_appointment.start_time < end_time and bay_appointment.end_time > start_time and bay_appointment.status.id not in [4, 5] # Completed or Cancelled
-            for bay_appointment in bay.appointments
-        )
-        if bay_busy:
-            log.info(f"Bay '{bay.bay}' is busy during this slot.")
-            continue
-        else:
-            log.info(f"Bay '{bay.bay}' is free.")
-
-        # Step 3: Check staff availability based on schedule and overlaps
-        available_staff = []
-        for staff in all_staff:
-            schedule_today = next(
-                (s for s in staff.schedules if s.day.lower() == now.strftime("%A").lower()),
-                None
-            )
-            if not schedule_today:
-                continue
-
-            # Check if staff is within shift hours
-            if not (schedule_today.shift_start <= now.time() <= schedule_today.shift_end):
-                continue
-
-            # Check overlapping appointments
-            overlapping = any(
-                staff_appointment.start_time <= end_time and staff_appointment.end_time >= start_time and staff_appointment.status.id not in [4, 5] # Completed or Cancelled
-                for staff_appointment in staff.appointments
-            )
-            if not overlapping:
-                available_staff.append(staff)
-
-        log.info(f"🧍Available staff for this slot: {len(available_staff)}")
-
-        # Pick staff with lowest workloads first
-        available_staff.sort(key=lambda s: s.daily_appointments)
-
-        if len(available_staff) >= washers_needed:
-            chosen_staff = available_staff[:washers_needed]
-            staff_names = [f"{s.account.first_name} {s.account.last_name}" for s in chosen_staff]
-            log.info(f"Found slot → Bay: {bay.bay}, Staff: {staff_names}")
-            return {
-                "bay": bay,
-                "staff": chosen_staff,
-                "start_time": start_time,
-                "end_time": end_time
-            }
-
-    # Step 4: If no bay/staff combo available, try next slot
-    next_bay_free = (
-        Appointments.query
-        .order_by(Appointments.end_time.asc())
-        .filter(Appointments.end_time > now)
-        .first()
-    )
-
-    if next_bay_free:
-        new_start = next_bay_free.end_time + timedelta(minutes=1)
-        log.info(f"All bays busy. Trying again after {next_bay_free.end_time}.")
-    else:
-        new_start = now + timedelta(minutes=1)
-        log.info("No existing appointments found. Trying next minute.")
-
-    new_end = new_start + duration
+    slot = engine.earliest_slot(start_time, duration, washers_needed)
+    if use_cache:
+        AvailabilityCache.put(key, slot, engine.window_end, generation)
+    if not slot:
+        log.error(f"No available bay or staff found within {horizon.days} days of {start_time}.")
+        return None
 
-    return get_available_bay_and_staff(new_start, duration, washers_needed, recursion_depth + 1)
+    staff_names = [f"{s.account.first_name} {s.account.last_name}" for s in slot["staff"]]
+    log.info(f"Found slot → {slot['start_time']} Bay: {slot['bay'].bay}, Staff: {staff_names}")
+    return slot
 
 
+@retry_on_conflict()
 def quick_book(service_id, customer_id=None, vehicle_id=None, appointment_date=None, appointment_id=None):
     """
     Quickly books a appointment.
@@ -1447,7 +1558,8 @@ def quick_book(service_id, customer_id=None, vehicle_id=None, appointment_date=N
     """
     try:
         # Service lookup
-        service = Services.query.get(service_id)
+        references = ReferenceRegistry.current()
+        service = references.service(service_id)
         if not service:
             raise ValueError("Invalid service ID")
 
@@ -1473,6 +1585,9 @@ def quick_book(service_id, customer_id=None, vehicle_id=None, appointment_date=N
         if not slot:
             raise ValueError("No available bay or staff found.")
 
+        # Lock the slot's days and re-check it against concurrent bookings
+        BookingLock.reserve(slot)
+
         # Customer lookup
         customer = Customers.query.get(customer_id)
 
@@ -1507,7 +1622,7 @@ def quick_book(service_id, customer_id=None, vehicle_id=None, appointment_date=N
             db.session.flush()
 
         # Status handling
-        status = Status.query.filter_by(status="In Queue").first()
+        status_id = references.status_id(IN_QUEUE)
 
         # Create appointment
         appointment = Appointments(
@@ -1517,7 +1632,7 @@ def quick_book(service_id, customer_id=None, vehicle_id=None, appointment_date=N
             customer_id=customer.id,
             vehicle_id=vehicle.id,
             service_id=service.id,
-            status_id=status.id
+            status_id=status_id
         )
         appointment.staffs.extend(slot["staff"])
 
@@ -1534,16 +1649,31 @@ def quick_book(service_id, customer_id=None, vehicle_id=None, appointment_date=N
             "vehicle_type": vehicle.type
         }
 
+    except BookingConflict:
+        raise
     except Exception as e:
         db.session.rollback()
         return {"error": str(e)}
 
 
-def check_or_suggest_appointment(service_id, appointment_date):
+def _suggestion(slot):
+    return {
+        "start_time": slot["start_time"].strftime("%Y-%m-%d %I:%M %p"),
+        "end_time": slot["end_time"].strftime("%Y-%m-%d %I:%M %p"),
+        "schedule": f"{slot['start_time'].strftime('%a %b %d, %Y %I:%M %p')} - {slot['end_time'].strftime('%I:%M %p')}",
+        "bay": slot["bay"].bay,
+        "staff": [s.account.full_name for s in slot["staff"]],
+    }
+
+
+def check_or_suggest_appointment(service_id, appointment_date, step=30, count=1, max_attempts=40):
     """
     Checks if the requested appointment datetime for a given service is available.
     - If an exact slot match exists, return it as available.
-    - Otherwise, return nearest suggested times.
+    - Otherwise, return up to `count` nearest suggested times on each side of the
+      requested time, probing every `step` minutes up to `max_attempts` steps away.
+    Occupancy for the whole probe range is loaded once, so the cost does not grow
+    with the number of probes.
     """
 
     try:
@@ -1560,93 +1690,130 @@ def check_or_suggest_appointment(service_id, appointment_date):
         #     raise ValueError("Invalid appointment date")
 
         # --- Fetch service ---
-        service = Services.query.get(service_id)
+        service = ReferenceRegistry.current().service(service_id)
         if not service:
             raise ValueError("Invalid service ID")
 
         duration = timedelta(minutes=service.duration)
         washers_needed = service.washers_needed
+        search_step = timedelta(minutes=int(step))
+        count = max(int(count), 1)
+        max_attempts = int(max_attempts)
+
+        # --- Load the whole probe range once ---
+        reach = search_step * max_attempts
+        engine = load_availability(appointment_date - reach, appointment_date + reach + duration)
 
         # --- Check exact slot availability ---
-        slot = get_available_bay_and_staff(appointment_date, duration, washers_needed)
+        slot = engine.slot_at(appointment_date, duration, washers_needed)
         if slot:
-            if slot['start_time'] == appointment_date:
-                return {
-                    "available": True,
-                    "message": "The selected appointment time is available!",
-                    "service": service.name,
-                    "slot": {
-                        "start_time": slot["start_time"].strftime("%Y-%m-%d %I:%M %p"),
-                        "end_time": slot["end_time"].strftime("%Y-%m-%d %I:%M %p"),
-                        "schedule": f"{slot['start_time'].strftime('%a %b %d, %Y %I:%M %p')} - {slot['end_time'].strftime('%I:%M %p')}",
-                        "bay": slot["bay"].bay,
-                        "staff": [s.account.full_name for s in slot["staff"]],
-                    }
-                }                
-
-        # --- If no exact slot, generate nearest suggestions ---
-        slots = 1
-        suggestions = []
-        search_step = timedelta(minutes=30)   # step between search intervals
-        max_attempts = 40                     # up to 40 half-hour checks (20 forward + 20 backward)
-        attempts = 0
-        checked_times = set()
+            return {
+                "available": True,
+                "message": "The selected appointment time is available!",
+                "service": service.name,
+                "slot": _suggestion(slot)
+            }
 
-        # %a %b %d, %Y %I:%M %p
-        # append the slot returned after finding exact slot
-        if slot:
-            suggestions.append({
-                "start_time": slot["start_time"].strftime("%Y-%m-%d %I:%M %p"),
-                "end_time": slot["end_time"].strftime("%Y-%m-%d %I:%M %p"),
-                "schedule": f"{slot['start_time'].strftime('%a %b %d, %Y %I:%M %p')} - {slot['end_time'].strftime('%I:%M %p')}",
-                "bay": slot["bay"].bay,
-                "staff": [s.account.full_name for s in slot["staff"]],
-            })
+        # --- If no exact slot, collect the nearest feasible times on both sides ---
+        not_before = datetime.now().replace(second=0, microsecond=0)
+        earlier, later = [], []
 
-        # if no slot returned, find another
-        while len(suggestions) < slots and attempts < max_attempts:
-            attempts += 1
+        # the earliest fit after the requested time is the nearest later suggestion
+        next_slot = engine.earliest_slot(appointment_date, duration, washers_needed)
+        if next_slot and next_slot["start_time"] <= appointment_date + reach:
+            later.append(next_slot)
 
-            # Alternate forward and backward checking
-            for direction in [1, -1]:
-                delta = search_step * attempts * direction
-                test_time = appointment_date + delta
-                test_time = test_time.replace(second=0, microsecond=0) # truncate seconds
+        for attempt in range(1, max_attempts + 1):
+            if len(earlier) >= count and len(later) >= count:
+                break
 
-                # Avoid duplicates
-                if test_time in checked_times:
-                    continue
-                checked_times.add(test_time)
+            delta = search_step * attempt
+            if len(later) < count:
+                test_time = (appointment_date + delta).replace(second=0, microsecond=0)
+                if not later or test_time > later[-1]["start_time"]:
+                    test_slot = engine.slot_at(test_time, duration, washers_needed)
+                    if test_slot:
+                        later.append(test_slot)
 
+            if len(earlier) < count:
+                test_time = (appointment_date - delta).replace(second=0, microsecond=0)
                 # --- Skip past times ---
-                if test_time < datetime.now().replace(second=0, microsecond=0):
-                    continue
-
-                test_slot = get_available_bay_and_staff(test_time, duration, washers_needed)
-                if test_slot:
-                    if test_slot['start_time'] == test_time:
-                        suggestions.append({
-                            "start_time": test_slot["start_time"].strftime("%Y-%m-%d %I:%M %p"),
-                            "end_time": test_slot["end_time"].strftime("%Y-%m-%d %I:%M %p"),
-                            "schedule": f"{slot['start_time'].strftime('%a %b %d, %Y %I:%M %p')} - {slot['end_time'].strftime('%I:%M %p')}",
-                            "bay": test_slot["bay"].bay,
-                            "staff": [s.account.full_name for s in test_slot["staff"]],
-                        })
-
-                if len(suggestions) >= slots:
-                    break
+                if test_time >= not_before:
+                    test_slot = engine.slot_at(test_time, duration, washers_needed)
+                    if test_slot:
+                        earlier.append(test_slot)
+
+        suggestions = sorted(earlier[:count] + later[:count], key=lambda s: s["start_time"])
 
         return {
             "available": False,
             "message": "The requested time is not available.",
             "service": service.name,
-            "suggestions": sorted(suggestions, key=lambda s: s["start_time"])[:slots],
+            "suggestions": [_suggestion(s) for s in suggestions],
         }
 
     except Exception as e:
         return {"error": str(e)}
 
 
+def get_availability_calendar(service_id, date_from=None, date_to=None, max_days=60):
+    """
+    Free capacity for a service per day and per hour bucket over [date_from, date_to].
+    Each hour reports how many bookings of the service could start at the top of
+    the hour; days add their hours up. Everything is computed from one occupancy
+    load covering the whole range.
+    """
+    try:
+        service = ReferenceRegistry.current().service(service_id)
+        if not service:
+            raise ValueError("Invalid service ID")
+
+        start_date = _parse_date_mmddyyyy(date_from)
+        start_date = start_date.date() if start_date else date.today()
+        end_date = _parse_date_mmddyyyy(date_to)
+        end_date = end_date.date() if end_date else start_date + timedelta(days=29)
+        if end_date < start_date:
+            raise ValueError("Invalid date range")
+        end_date = min(end_date, start_date + timedelta(days=max_days - 1))
+
+        duration = timedelta(minutes=service.duration)
+        washers_needed = service.washers_needed
+
+        window_start = datetime.combine(start_date, time.min)
+        window_end = datetime.combine(end_date + timedelta(days=1), time.min)
+        engine = load_availability(window_start, window_end + duration)
+
+        capacities = engine.hourly_capacity(start_date, end_date, duration, washers_needed)
+        not_before = datetime.now()
+        days = []
+        day = start_date
+        while day <= end_date:
+            hours = []
+            for hour in range(24):
+                bucket = datetime.combine(day, time(hour, 0))
+                free = 0 if bucket < not_before else capacities[(day - start_date).days * 24 + hour]
+                hours.append({"hour": bucket.strftime("%H:%M"), "free": free})
+            total = sum(h["free"] for h in hours)
+            days.append({
+                "date": day.isoformat(),
+                "free": total,
+                "available": total > 0,
+                "hours": hours,
+            })
+            day += timedelta(days=1)
+
+        return {
+            "service": service.name,
+            "from": start_date.isoformat(),
+            "to": end_date.isoformat(),
+            "days": days,
+        }
+
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@retry_on_conflict()
 def confirm_suggested_appointment(customer_id, vehicle_id, start_time):
     """
     Confirms and books one of the suggested appointment slots.
@@ -1679,11 +1846,9 @@ def confirm_suggested_appointment(customer_id, vehicle_id, start_time):
             start_time = datetime.strptime(start_time, "%Y-%m-%d %H:%M")
 
         # --- Auto-select service based on vehicle type ---
+        references = ReferenceRegistry.current()
         vehicle_type = (vehicle.type or "").lower()
-        if "motor" in vehicle_type or "bike" in vehicle_type:
-            service = Services.query.filter(Services.name.ilike("%bike%")).first()
-        else:
-            service = Services.query.filter(Services.name.ilike("%car%")).first()
+        service = references.service_for_vehicle(vehicle_type)
 
         if not service:
             raise ValueError(f"No matching service found for vehicle type '{vehicle_type}'")
@@ -1697,10 +1862,13 @@ def confirm_suggested_appointment(customer_id, vehicle_id, start_time):
         if not slot:
             raise ValueError("The selected time slot is no longer available. Please pick another one.")
 
+        # Lock the slot's days and re-check it against concurrent bookings
+        BookingLock.reserve(slot)
+
         # --- Confirm bay, staff, and status ---
-        status = Status.query.filter_by(status="In Queue").first()
+        status = references.status(IN_QUEUE)
         if not status:
-            status = Status(status="In Queue")
+            status = Status(status=IN_QUEUE)
             db.session.add(status)
             db.session.flush()
 
@@ -1762,11 +1930,14 @@ def confirm_suggested_appointment(customer_id, vehicle_id, start_time):
             "vehicle_type": vehicle.type
         }
 
+    except BookingConflict:
+        raise
     except Exception as e:
         db.session.rollback()
         return {"error": str(e)}
 
 
+@retry_on_conflict()
 def book_appointment_with_service(customer_id, service_id, appointment_date):
     """
     Books an appointment for an existing customer using the next available bay and staff.
@@ -1781,7 +1952,8 @@ def book_appointment_with_service(customer_id, service_id, appointment_date):
         if not customer:
             raise ValueError("Invalid customer ID")
 
-        service = Services.query.get(service_id)
+        references = ReferenceRegistry.current()
+        service = references.service(service_id)
         if not service:
             raise ValueError("Invalid service ID")
 
@@ -1796,6 +1968,9 @@ def book_appointment_with_service(customer_id, service_id, appointment_date):
         slot = get_available_bay_and_staff(appointment_date, duration, washers_needed)
         if not slot:
             raise ValueError("No available bay or staff found for this date.")
+
+        # Lock the slot's days and re-check it against concurrent bookings
+        BookingLock.reserve(slot)
         
         # if slot.start_time != appointment_date:
             
@@ -1810,9 +1985,7 @@ def book_appointment_with_service(customer_id, service_id, appointment_date):
         db.session.flush()
 
         # --- Step 5: Determine initial appointment status ---
-        status = Status.query.filter_by(status="In Queue").first()
-        if not status:
-            raise ValueError("Missing 'In Queue' status record in database.")
+        status_id = references.status_id(IN_QUEUE)
 
         # --- Step 6: Create appointment record ---
         appointment = Appointments(
@@ -1822,7 +1995,7 @@ def book_appointment_with_service(customer_id, service_id, appointment_date):
             customer_id=customer.id,
             vehicle_id=dummy_vehicle.id,
             service_id=service.id,
-            status_id=status.id
+            status_id=status_id
         )
         appointment.staffs.extend(slot["staff"])
 
@@ -1842,11 +2015,14 @@ def book_appointment_with_service(customer_id, service_id, appointment_date):
             "vehicle_type": dummy_vehicle.type
         }
 
+    except BookingConflict:
+        raise
     except Exception as e:
         db.session.rollback()
         return {"error": str(e)}
 
 
+@retry_on_conflict()
 def book_existing_customer(customer_id, vehicle_id, appointment_date):
     """
     Books an appointment for an existing customer.
@@ -1876,11 +2052,9 @@ def book_existing_customer(customer_id, vehicle_id, appointment_date):
             customer.account_id = dummy_account.id
 
         # Determine service based on vehicle type
+        references = ReferenceRegistry.current()
         vehicle_type = (vehicle.type or "").lower()
-        if "motor" in vehicle_type or "bike" in vehicle_type:
-            service = Services.query.filter(Services.name.ilike("%bike%")).first()
-        else:
-            service = Services.query.filter(Services.name.ilike("%car%")).first()
+        service = references.service_for_vehicle(vehicle_type)
 
         if not service:
             raise ValueError(f"No matching service found for vehicle type '{vehicle_type}'")
@@ -1897,10 +2071,13 @@ def book_existing_customer(customer_id, vehicle_id, appointment_date):
         if not slot:
             raise ValueError("No available bay or staff found for this time.")
 
+        # Lock the slot's days and re-check it against concurrent bookings
+        BookingLock.reserve(slot)
+
         # Get 'In Queue' or default status
-        status = Status.query.filter_by(status="In Queue").first()
+        status = references.status(IN_QUEUE)
         if not status:
-            status = Status(status="In Queue")
+            status = Status(status=IN_QUEUE)
             db.session.add(status)
             db.session.flush()
 
@@ -1931,6 +2108,258 @@ def book_existing_customer(customer_id, vehicle_id, appointment_date):
             "vehicle_type": vehicle.type
         }
 
+    except BookingConflict:
+        raise
+    except Exception as e:
+        db.session.rollback()
+        return {"error": str(e)}
+
+
+@retry_on_conflict()
+def book_bulk(customer_id, items, window_start=None, window_end=None, partial=True):
+    """
+    Books a fleet of vehicles in one pass.
+    `items` is a list of {"service_id", "vehicle_id" (optional)}; vehicles without an
+    id get a placeholder vehicle like quick_book does. Every vehicle is packed into
+    [window_start, window_end] against a single occupancy snapshot, largest jobs
+    first, with each placement booked into the snapshot before the next one.
+    The window's days stay locked while solving, and everything is inserted in one
+    transaction with bulk inserts. With partial=False nothing is booked unless every
+    vehicle fits.
+    """
+    try:
+        if not items:
+            raise ValueError("No vehicles to book")
+
+        if not isinstance(window_start, datetime):
+            window_start = format_date(window_start)
+        if window_end and not isinstance(window_end, datetime):
+            window_end = format_date(window_end)
+        window_end = window_end or window_start + timedelta(days=app.config.get('SLOT_SEARCH_HORIZON_DAYS', 7))
+        if window_end <= window_start:
+            raise ValueError("Invalid booking window")
+
+        # Services from the reference registry, vehicles in one query
+        service_ids = {int(item.get('service_id') or 0) for item in items}
+        references = ReferenceRegistry.current()
+        services = {service_id: references.service(service_id) for service_id in service_ids}
+        vehicle_ids = {int(item['vehicle_id']) for item in items if item.get('vehicle_id')}
+        vehicles = {v.id: v for v in Vehicles.query.filter(Vehicles.id.in_(vehicle_ids)).all()} if vehicle_ids else {}
+
+        customer = Customers.query.get(customer_id) if customer_id else None
+        if customer_id and not customer:
+            raise ValueError("Invalid customer ID")
+
+        unassigned = []
+        requests = []
+        for index, item in enumerate(items):
+            service = services.get(int(item.get('service_id') or 0))
+            vehicle_id = int(item['vehicle_id']) if item.get('vehicle_id') else None
+            if not service:
+                unassigned.append({"index": index, "vehicle_id": vehicle_id, "service_id": item.get('service_id'), "reason": "Invalid service ID"})
+            elif vehicle_id and vehicle_id not in vehicles:
+                unassigned.append({"index": index, "vehicle_id": vehicle_id, "service_id": service.id, "reason": "Invalid vehicle ID"})
+            else:
+                requests.append((index, vehicle_id, service))
+
+        # Lock every day of the window, then solve against fresh bookings
+        days = {window_start.date() + timedelta(days=n) for n in range((window_end.date() - window_start.date()).days + 1)}
+        BookingLock.acquire(days)
+        occupancy = Occupancy.load(datetime.combine(window_start.date(), time.min), window_end)
+
+        placed = []
+        # first-fit decreasing: the jobs needing the most washers and time go first
+        for index, vehicle_id, service in sorted(requests, key=lambda r: (-r[2].washers_needed, -r[2].duration, r[0])):
+            slot = occupancy.place(window_start, timedelta(minutes=service.duration), service.washers_needed)
+            if slot:
+                placed.append((index, vehicle_id, service, slot))
+            else:
+                unassigned.append({"index": index, "vehicle_id": vehicle_id, "service_id": service.id,
+                                   "reason": "No available bay or staff in the booking window"})
+
+        if unassigned and not partial:
+            db.session.rollback()
+            return {
+                "error": f"Only {len(placed)} of {len(items)} vehicles fit in the booking window.",
+                "unassigned": sorted(unassigned, key=lambda u: u["index"])
+            }
+        if not placed:
+            db.session.rollback()
+            return {"error": "No vehicles could be booked.", "unassigned": sorted(unassigned, key=lambda u: u["index"])}
+
+        placed.sort(key=lambda p: p[0])
+
+        if not customer:
+            account = Accounts(first_name="Walk-in", last_name="Customer", email=None, phone_1=None, password_hash=None)
+            db.session.add(account)
+            db.session.flush()
+            customer = Customers(account_id=account.id, is_registered=False)
+            db.session.add(customer)
+            db.session.flush()
+
+        # Placeholder vehicles for items that came without one
+        new_vehicles = [
+            {"model": "Unknown", "type": service.type, "customer_id": customer.id}
+            for _, vehicle_id, service, _ in placed if not vehicle_id
+        ]
+        if new_vehicles:
+            db.session.bulk_insert_mappings(Vehicles, new_vehicles, return_defaults=True)
+        new_vehicle_ids = iter(v["id"] for v in new_vehicles)
+
+        status_id = references.status_id(IN_QUEUE)
+        rows = [
+            {
+                "start_time": slot["start_time"],
+                "end_time": slot["end_time"],
+                "bay_id": slot["bay"].id,
+                "customer_id": customer.id,
+                "vehicle_id": vehicle_id or next(new_vehicle_ids),
+                "service_id": service.id,
+                "status_id": status_id,
+            }
+            for _, vehicle_id, service, slot in placed
+        ]
+        db.session.bulk_insert_mappings(Appointments, rows, return_defaults=True)
+        db.session.execute(washers.insert(), [
+            {"appointment_id": row["id"], "staff_id": staff.id}
+            for row, (_, _, _, slot) in zip(rows, placed) for staff in slot["staff"]
+        ])
+
+        # Bulk inserts skip the flush hooks: keep the workload counters in step by hand
+        deltas = Counter()
+        for _, _, _, slot in placed:
+            day = slot["start_time"].date()
+            deltas[('bay', slot["bay"].id, day)] += 1
+            for staff in slot["staff"]:
+                deltas[('staff', staff.id, day)] += 1
+        Workload.apply(deltas)
+        # core inserts skip the flush hooks
+        Rollup.mark_stale({row["start_time"].date() for row in rows})
+
+        db.session.commit()
+        AvailabilityCache.invalidate({row["start_time"].date() for row in rows} | {row["end_time"].date() for row in rows})
+        Dispatcher.mark_stale([row["id"] for row in rows])
+
+        return {
+            "message": f"{len(placed)} of {len(items)} vehicles booked.",
+            "customer_id": customer.id,
+            "appointments": [
+                {
+                    "index": index,
+                    "appointment_id": row["id"],
+                    "vehicle_id": row["vehicle_id"],
+                    "service": service.name,
+                    "bay": slot["bay"].bay,
+                    "staff": [s.account.full_name for s in slot["staff"]],
+                    "start_time": slot["start_time"].strftime("%Y-%m-%d %H:%M"),
+                    "end_time": slot["end_time"].strftime("%Y-%m-%d %H:%M"),
+                }
+                for row, (index, _, service, slot) in zip(rows, placed)
+            ],
+            "unassigned": sorted(unassigned, key=lambda u: u["index"]),
+        }
+
+    except BookingConflict:
+        raise
+    except Exception as e:
+        db.session.rollback()
+        return {"error": str(e)}
+
+
+@retry_on_conflict()
+def reoptimize_day(bay_ids=(), staff_ids=(), day=None, from_time=None, mark_off_shift=True):
+    """
+    Repacks the rest of a day's queue after bays or washers drop out.
+    Pending and queued appointments from `from_time` (default: now) that sit on a
+    bay in `bay_ids` or have a washer in `staff_ids` are reassigned in one solver
+    run against the reduced resource set. Unaffected appointments stay put; the
+    affected ones are placed in their original start order at the earliest fit at
+    or after their original start, which keeps the drift minimal. Everything,
+    including taking the washers off shift, is committed at once.
+    """
+    try:
+        bay_ids = {int(i) for i in bay_ids or ()}
+        staff_ids = {int(i) for i in staff_ids or ()}
+        if not bay_ids and not staff_ids:
+            raise ValueError("No bay or washer to take out")
+
+        if from_time and not isinstance(from_time, datetime):
+            from_time = format_date(from_time)
+        if isinstance(day, str):
+            parsed = _parse_date_mmddyyyy(day)
+            if not parsed:
+                raise ValueError("Invalid day")
+            day = parsed.date()
+        day = day or (from_time.date() if from_time else date.today())
+        day_start = datetime.combine(day, time.min)
+        from_time = max(from_time or datetime.now().replace(second=0, microsecond=0), day_start)
+        day_end = day_start + timedelta(days=1)
+        window_end = day_end + timedelta(days=app.config.get('SLOT_SEARCH_HORIZON_DAYS', 7))
+
+        BookingLock.acquire({day + timedelta(days=n) for n in range((window_end.date() - day).days + 1)})
+
+        affected = (Appointments.query
+                    .filter(
+                        Appointments.start_time >= from_time,
+                        Appointments.start_time < day_end,
+                        Appointments.status_id.in_(ReferenceRegistry.current().status_ids(PENDING, IN_QUEUE)),
+                        or_(Appointments.bay_id.in_(bay_ids),
+                            Appointments.staffs.any(Staffs.id.in_(staff_ids))))
+                    .order_by(Appointments.start_time, Appointments.id)
+                    .all())
+
+        occupancy = (Occupancy
+                     .load(day_start, window_end, exclude_appointment_ids=[a.id for a in affected])
+                     .without(bay_ids, staff_ids))
+
+        moved, unplaced = [], []
+        for appointment in affected:
+            duration = appointment.end_time - appointment.start_time
+            washers_needed = len(appointment.staffs) or appointment.service.washers_needed
+            slot = occupancy.place(max(appointment.start_time, from_time), duration, washers_needed)
+            if not slot:
+                # it stays where it was: hold on to its remaining bay and washers
+                # so later placements in this pass cannot take them
+                if appointment.bay_id not in bay_ids:
+                    occupancy.book('bay', appointment.bay_id, appointment.start_time, appointment.end_time)
+                for staff in appointment.staffs:
+                    if staff.id not in staff_ids:
+                        occupancy.book('staff', staff.id, appointment.start_time, appointment.end_time)
+                unplaced.append(appointment.id)
+                continue
+            moved.append({
+                "appointment_id": appointment.id,
+                "from": {
+                    "bay": appointment.bay.bay if appointment.bay else None,
+                    "staff": [s.account.full_name for s in appointment.staffs],
+                    "start_time": appointment.start_time.strftime("%Y-%m-%d %H:%M"),
+                },
+                "to": {
+                    "bay": slot["bay"].bay,
+                    "staff": [s.account.full_name for s in slot["staff"]],
+                    "start_time": slot["start_time"].strftime("%Y-%m-%d %H:%M"),
+                },
+                "drift_minutes": int((slot["start_time"] - appointment.start_time).total_seconds() // 60),
+            })
+            appointment.start_time = slot["start_time"]
+            appointment.end_time = slot["end_time"]
+            appointment.bay_id = slot["bay"].id
+            appointment.staffs = slot["staff"]
+
+        if mark_off_shift and staff_ids:
+            for staff in Staffs.query.filter(Staffs.id.in_(staff_ids)).all():
+                staff.is_on_shift = False
+
+        db.session.commit()
+
+        return {
+            "message": f"{len(moved)} of {len(affected)} affected appointments reassigned.",
+            "moved": moved,
+            "unplaced": unplaced,
+        }
+
+    except BookingConflict:
+        raise
     except Exception as e:
         db.session.rollback()
         return {"error": str(e)}
@@ -1965,11 +2394,9 @@ def suggest_appointments_for_customer(customer_id, vehicle_id, appointment_date)
             customer.account_id = dummy_account.id
 
         # Determine service based on vehicle type
+        references = ReferenceRegistry.current()
         vehicle_type = (vehicle.type or "").lower()
-        if "motor" in vehicle_type or "bike" in vehicle_type:
-            service = Services.query.filter(Services.name.ilike("%bike%")).first()
-        else:
-            service = Services.query.filter(Services.name.ilike("%car%")).first()
+        service = references.service_for_vehicle(vehicle_type)
 
         if not service:
             raise ValueError(f"No matching service found for vehicle type '{vehicle_type}'")
@@ -2021,6 +2448,4 @@ def suggest_appointments_for_customer(customer_id, vehicle_id, appointment_date)
     except Exception as e:
         db.session.rollback()
         return {"error": str(e)}
-    
-    from datetime import datetime
 
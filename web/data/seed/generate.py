@@ -0,0 +1,359 @@
+"""
+Synthetic data generator for load and benchmark databases.
+
+    cd web
+    python manage.py generate --customers 20000 --months 12 --per-day 300 \
+        --bays 12 --washers 30 --seed 7 --reset --database-uri sqlite:////tmp/prodigy.db
+
+Rows are written with Core executemany inserts in batches and explicit primary
+keys, so nothing round-trips through the ORM unit of work. The same seed and
+--until date always produce the same database.
+"""
+import argparse, logging, random, time as clock
+
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta
+from itertools import accumulate
+from typing import Dict
+
+from data import app, db
+from data.models import (
+    Accounts, Customers, Staffs, Appointments, Payments, Services,
+    Vehicles, Bays, Status, Notifications, Feedbacks, Loyalties,
+    Schedules, washers
+)
+from data.seed.populate import Populate
+from data.seed.vehicles import vehicle_data
+from data.services.rollup import Rollup
+from data.services.roster import Roster
+from data.services.workload import Workload
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# vehicle_data types -> the vehicle type the services are priced for
+SERVICE_TYPES = {
+    'Small Bike': 'Motorcycle', 'Big Bike': 'Motorcycle', 'Underbone': 'Motorcycle',
+    'Scooter': 'Motorcycle', 'Standard': 'Motorcycle', 'Tricycle': 'Motorcycle',
+    'Sedan': 'Sedan', 'Hatchback': 'Sedan',
+    'SUV': 'SUV', 'Crossover': 'SUV', 'MPV': 'SUV', 'Pickup': 'SUV',
+}
+
+# relative demand per hour of day: quiet nights, a late-morning and an after-work peak
+HOUR_WEIGHTS = [
+    1, 1, 1, 1, 1, 2, 4, 8, 14, 18, 22, 20,
+    15, 14, 16, 20, 24, 22, 16, 10, 7, 4, 2, 1,
+]
+# Monday .. Sunday
+WEEKDAY_FACTORS = [0.85, 0.9, 0.9, 0.95, 1.05, 1.3, 1.25]
+
+FIRST_NAMES = ['Juan', 'Maria', 'Jose', 'Ana', 'Pedro', 'Rosa', 'Carlo', 'Liza', 'Mark', 'Grace', 'Paolo', 'Joy']
+LAST_NAMES = ['Dela Cruz', 'Santos', 'Reyes', 'Garcia', 'Mendoza', 'Bautista', 'Magbanua', 'Villanueva', 'Ramos', 'Torres']
+COMMENTS = ['Great job!', 'Very clean, thank you.', 'A bit slow today.', 'Friendly staff.', None, None]
+
+# generate_password_hash('admin1234') computed once: a fresh hash would carry a random salt
+PASSWORD_HASH = 'pbkdf2:sha256:150000$YdMZ391g$307230fde96959a246d6d57294334507f696823f4652046bb41bf33f851af633'
+# generated history runs up to this time of day on --until; later bookings are still open
+CUTOFF = time(12, 0)
+
+
+class _Writer:
+    """
+    Buffers rows per table and writes them with executemany, parents before
+    children, whenever any buffer reaches the batch size.
+    """
+
+    def __init__(self, tables, batch_size: int):
+        self.tables = tables
+        self.batch_size = batch_size
+        self.buffers = {table.name: [] for table in tables}
+        self.counts = {table.name: 0 for table in tables}
+
+    def add(self, table, row: Dict):
+        buffer = self.buffers[table.name]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for table in self.tables:
+            rows = self.buffers[table.name]
+            if rows:
+                db.session.execute(table.insert(), rows)
+                self.counts[table.name] += len(rows)
+                self.buffers[table.name] = []
+
+
+def _next_id(model) -> int:
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+
+class Generate:
+
+    def generate(customers: int = 1000, months: int = 3, per_day: int = 80, bays: int = 0, washers_count: int = 0,
+                 seed: int = 42, until: date = None, reset: bool = False, batch_size: int = 5000) -> Dict[str, int]:
+        """
+        Add `customers` customers with vehicles and `months` of appointment history
+        ending at `until` (default today) plus a week of upcoming bookings.
+        Appointments are packed into the bays and washers' shifts like the slot
+        finder would, so days past capacity simply come out full. `bays` and
+        `washers_count` grow the seeded resources to that many when given.
+        Returns the number of rows written per table.
+        """
+        started = clock.perf_counter()
+        rng = random.Random(seed)
+        until = until or date.today()
+
+        if reset:
+            Populate.populate()
+
+        Generate._grow_resources(bays, washers_count)
+        Roster.invalidate()
+
+        statuses = {s.status: s.id for s in Status.query.all()}
+        services = Services.query.all()
+        services_by_type = {}
+        for service in services:
+            services_by_type.setdefault(service.type, []).append(service)
+        bay_ids = [b.id for b in Bays.query.order_by(Bays.id).all()]
+        front_desk = Staffs.query.filter_by(is_front_desk=True).first()
+        sender_id = front_desk.account_id if front_desk else None
+
+        writer = _Writer([
+            Accounts.__table__, Customers.__table__, Vehicles.__table__, Appointments.__table__,
+            washers, Payments.__table__, Feedbacks.__table__, Loyalties.__table__, Notifications.__table__,
+        ], batch_size)
+
+        # ---------------------------------------------------------
+        # CUSTOMERS AND VEHICLES
+        # ---------------------------------------------------------
+        account_id, customer_id, vehicle_id = _next_id(Accounts), _next_id(Customers), _next_id(Vehicles)
+        people = []      # (customer_id, account_id, is_registered, [(vehicle_id, service type)])
+        for n in range(customers):
+            is_registered = rng.random() < 0.7
+            writer.add(Accounts.__table__, {
+                'id': account_id,
+                'first_name': rng.choice(FIRST_NAMES),
+                'last_name': rng.choice(LAST_NAMES),
+                'email': f'customer{account_id:07d}@example.com' if is_registered else None,
+                'password_hash': PASSWORD_HASH if is_registered else None,
+                'phone_1': f'+639{rng.randrange(10 ** 9):09d}',
+                'address': 'CDO',
+                'role_id': 3,
+                'is_active': True,
+            })
+            writer.add(Customers.__table__, {
+                'id': customer_id,
+                'account_id': account_id,
+                'is_registered': is_registered,
+                'is_senior': rng.random() < 0.08,
+                'is_pwd': rng.random() < 0.04,
+            })
+            fleet = []
+            for _ in range(rng.choice((1, 1, 1, 2, 2, 3))):
+                vehicle = rng.choice(vehicle_data)
+                service_type = SERVICE_TYPES.get(vehicle['type'], 'Van')
+                writer.add(Vehicles.__table__, {
+                    'id': vehicle_id,
+                    'plate_number': f'GEN{vehicle_id:07d}',
+                    'model': vehicle['model'],
+                    'type': vehicle['type'],
+                    'customer_id': customer_id,
+                })
+                fleet.append((vehicle_id, service_type))
+                vehicle_id += 1
+            people.append((customer_id, account_id, is_registered, fleet))
+            account_id += 1
+            customer_id += 1
+        writer.flush()
+        db.session.commit()
+
+        if not people:
+            return writer.counts
+
+        # ---------------------------------------------------------
+        # APPOINTMENTS AND EVERYTHING HANGING OFF THEM
+        # ---------------------------------------------------------
+        roster = Roster.compile()
+        washer_ids = [s.id for s in Staffs.query.filter_by(is_front_desk=False).order_by(Staffs.id).all()]
+        hour_weights = list(accumulate(HOUR_WEIGHTS))
+        appointment_id = _next_id(Appointments)
+        payment_id, feedback_id, loyalty_id, notification_id = (
+            _next_id(Payments), _next_id(Feedbacks), _next_id(Loyalties), _next_id(Notifications))
+
+        first_day = until - timedelta(days=30 * months)
+        last_day = until + timedelta(days=7)
+        now = datetime.combine(until, CUTOFF)
+        bay_free = {bay_id: datetime.min for bay_id in bay_ids}
+        washer_free = {staff_id: datetime.min for staff_id in washer_ids}
+
+        day = first_day
+        while day <= last_day:
+            volume = int(per_day * WEEKDAY_FACTORS[day.weekday()] * rng.uniform(0.85, 1.15))
+            starts = sorted(
+                datetime.combine(day, time(bisect_right(hour_weights, rng.random() * hour_weights[-1]), rng.randrange(0, 60, 5)))
+                for _ in range(volume)
+            )
+            for start in starts:
+                customer_id, account_id, is_registered, fleet = people[int(len(people) * rng.random() ** 2)]
+                vehicle_id, service_type = rng.choice(fleet)
+                service = rng.choice(services_by_type.get(service_type) or services)
+                end = start + timedelta(minutes=service.duration)
+
+                bay_id = next((b for b in bay_ids if bay_free[b] <= start), None)
+                crew = [w for w in washer_ids
+                        if washer_free[w] < start and roster.covers(w, start, service.duration)][:service.washers_needed or 1]
+                if bay_id is None or len(crew) < (service.washers_needed or 1):
+                    continue  # the shop is full at this time
+                bay_free[bay_id] = end
+                for w in crew:
+                    washer_free[w] = end
+                # rotate so the load spreads over bays and washers
+                bay_ids.append(bay_ids.pop(bay_ids.index(bay_id)))
+                for w in crew:
+                    washer_ids.append(washer_ids.pop(washer_ids.index(w)))
+
+                if end <= now:
+                    status = 'Cancelled' if rng.random() < 0.07 else 'Completed'
+                elif start <= now:
+                    status = 'Now Serving'
+                else:
+                    status = rng.choice(('Pending', 'In Queue', 'In Queue'))
+                booked_at = start - timedelta(hours=rng.randint(0, 72))
+
+                writer.add(Appointments.__table__, {
+                    'id': appointment_id,
+                    'start_time': start,
+                    'end_time': end,
+                    'bay_id': bay_id,
+                    'customer_id': customer_id,
+                    'vehicle_id': vehicle_id,
+                    'service_id': service.id,
+                    'status_id': statuses[status],
+                    'created_at': booked_at,
+                    'updated_at': end if end <= now else booked_at,
+                })
+                for w in crew:
+                    writer.add(washers, {'staff_id': w, 'appointment_id': appointment_id})
+
+                writer.add(Notifications.__table__, {
+                    'id': notification_id,
+                    'content': f"Your appointment on {start.strftime('%Y-%m-%d %I:%M %p')} is now {status}.",
+                    'notif_type': 'status_update',
+                    'viewed': end <= now,
+                    'recipient_id': account_id,
+                    'sender_id': sender_id,
+                    'created_at': min(end, now),
+                    'updated_at': min(end, now),
+                })
+                notification_id += 1
+
+                if status == 'Completed':
+                    writer.add(Payments.__table__, {
+                        'id': payment_id,
+                        'method': rng.choice(('cash', 'cash', 'gcash', 'xendit')),
+                        'transaction_no': f'TXN{payment_id:010d}',
+                        'amount': service.price,
+                        'appointment_id': appointment_id,
+                        'status_id': statuses['Paid'],
+                        'created_at': end,
+                        'updated_at': end,
+                    })
+                    payment_id += 1
+
+                    if rng.random() < 0.3:
+                        writer.add(Feedbacks.__table__, {
+                            'id': feedback_id,
+                            'rating': rng.choice((3, 4, 4, 5, 5, 5)),
+                            'comment': rng.choice(COMMENTS),
+                            'customer_id': customer_id,
+                            'appointment_id': appointment_id,
+                            'created_at': end,
+                            'updated_at': end,
+                        })
+                        feedback_id += 1
+
+                    if is_registered:
+                        writer.add(Loyalties.__table__, {
+                            'id': loyalty_id,
+                            'points': max(int(service.price) // 100, 1),
+                            'note': f'Appointment #{appointment_id}',
+                            'customer_id': customer_id,
+                            'created_at': end,
+                            'updated_at': end,
+                        })
+                        loyalty_id += 1
+
+                appointment_id += 1
+
+            if day.day == 1 or day == last_day:
+                writer.flush()
+                db.session.commit()
+                print(f"{day.isoformat()}: {writer.counts['appointments']} appointments so far "
+                      f"({clock.perf_counter() - started:.1f}s)")
+            day += timedelta(days=1)
+
+        writer.flush()
+        # rollups already computed for these days are out of date now
+        Rollup.mark_stale(first_day + timedelta(days=n) for n in range((last_day - first_day).days + 1))
+        db.session.commit()
+
+        # counters the slot finder balances on
+        counts = dict(writer.counts)
+        counts['workloads'] = Workload.rebuild()
+        print(f"Generated {sum(counts.values())} rows in {clock.perf_counter() - started:.1f}s: {counts}")
+        return counts
+
+    def _grow_resources(bays: int, washers_count: int) -> None:
+        """Add bays and rostered washers until there are `bays` and `washers_count` of them."""
+        existing = Bays.query.count()
+        for n in range(existing + 1, (bays or 0) + 1):
+            db.session.add(Bays(bay=f'Bay #{n}'))
+
+        current = Staffs.query.filter_by(is_front_desk=False).count()
+        shifts = [(time(8, 0), time(16, 0)), (time(8, 0), time(16, 0)), (time(16, 0), time(23, 59)), (time(0, 0), time(8, 0))]
+        day_names = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+        for n in range(current + 1, (washers_count or 0) + 1):
+            account = Accounts(
+                first_name='Washer', last_name=f'{n:03d}', email=f'washer{n:03d}@example.com',
+                password_hash=PASSWORD_HASH, role_id=2, address='CDO'
+            )
+            db.session.add(account)
+            db.session.flush()
+            staff = Staffs(account_id=account.id, is_front_desk=False, is_on_shift=True)
+            db.session.add(staff)
+            db.session.flush()
+            shift_start, shift_end = shifts[n % len(shifts)]
+            for day_name in day_names:
+                db.session.add(Schedules(staff_id=staff.id, day=day_name, shift_start=shift_start, shift_end=shift_end))
+        db.session.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic Prodigy Carwash database.')
+    parser.add_argument('--customers', type=int, default=1000, help='customers to add (default 1000)')
+    parser.add_argument('--months', type=int, default=3, help='months of appointment history (default 3)')
+    parser.add_argument('--per-day', type=int, default=80, help='average booking requests per day (default 80)')
+    parser.add_argument('--bays', type=int, default=0, help='grow the shop to this many bays')
+    parser.add_argument('--washers', type=int, default=0, help='grow the crew to this many rostered washers')
+    parser.add_argument('--seed', type=int, default=42, help='random seed (default 42)')
+    parser.add_argument('--until', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(), default=None,
+                        help='last day of history, YYYY-MM-DD (default today); it ends at noon')
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows per executemany (default 5000)')
+    parser.add_argument('--reset', action='store_true', help='drop and re-seed the database first')
+    parser.add_argument('--database-uri', default=None, help='override SQLALCHEMY_DATABASE_URI')
+    args = parser.parse_args(argv)
+
+    if args.database_uri:
+        app.config['SQLALCHEMY_DATABASE_URI'] = args.database_uri
+
+    with app.app_context():
+        Generate.generate(
+            customers=args.customers, months=args.months, per_day=args.per_day, bays=args.bays,
+            washers_count=args.washers, seed=args.seed, until=args.until, reset=args.reset,
+            batch_size=args.batch_size,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+import json
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import inspect
+
+try:
+    import orjson
+except ImportError:     # optional; the standard library encoder is used without it
+    orjson = None
+
+
+# =============================================================
+# FIELDS
+# =============================================================
+class Field(NamedTuple):
+    key: str
+    source: str                 # attribute, or a dotted path through many-to-one relationships
+    kind: str = 'value'         # value | const | iso | number | strftime | one | many
+    arg: object = None          # const: the value, number: value for None, strftime: format, one/many: shape
+    each: Optional[str] = None  # many: attribute of every item to serialize instead of the item
+    missing: object = None      # one: the value for a missing row, a literal
+
+
+def iso(source: str, key: Optional[str] = None) -> Field:
+    return Field(key or source, source, 'iso')
+
+
+def number(source: str, missing=None) -> Field:
+    """float(), for Numeric columns; `missing` stands in for NULL."""
+    return Field(source, source, 'number', missing)
+
+
+def strftime(source: str, fmt: str) -> Field:
+    return Field(source, source, 'strftime', fmt)
+
+
+def path(key: str, source: str) -> Field:
+    return Field(key, source)
+
+
+def const(key: str, value=None) -> Field:
+    return Field(key, '', 'const', value)
+
+
+def one(key: str, shape: str, source: Optional[str] = None, missing=None) -> Field:
+    return Field(key, source or key, 'one', shape, missing=missing)
+
+
+def many(key: str, shape: str, each: Optional[str] = None) -> Field:
+    return Field(key, key, 'many', shape, each)
+
+
+STAMPS = (iso('created_at'), iso('updated_at'))
+
+
+# =============================================================
+# SHAPES
+# =============================================================
+# model name -> fields, per shape:
+#   model  what the models' to_json return (pages and templates)
+#   api    what the /api endpoints return; ?fields= and ?expand= prune it
+#   ref    a bare reference to a row
+SHAPES = {
+    'model': {
+        'Accounts': ('id', 'first_name', 'middle_name', 'last_name', 'full_name', 'gender', 'phone_1', 'phone_2',
+                     strftime('birth_date', '%Y-%m-%d'), 'email', 'address', 'image_profile', 'is_active',
+                     path('role', 'role.role'), 'role_id') + STAMPS,
+        'Customers': ('id', 'is_registered', 'is_pwd', 'is_senior',
+                      one('account', 'model'), many('vehicles', 'model')) + STAMPS,
+        'Staffs': ('id', 'is_front_desk', 'is_on_shift', one('account', 'model'), many('schedules', 'model')) + STAMPS,
+        'Schedules': ('id', 'day', strftime('shift_start', '%H:%M'), strftime('shift_end', '%H:%M'), 'shift',
+                      'staff_id') + STAMPS,
+        'Appointments': ('id', iso('start_time'), iso('end_time'), one('bay', 'model'),
+                         one('customer', 'model', 'customer.account'), one('vehicle', 'model'),
+                         one('service', 'model'), one('status', 'model'), many('staffs', 'model', each='account'),
+                         many('payments', 'model')) + STAMPS,
+        'Payments': ('id', 'method', 'transaction_no', 'image_payment', number('amount'), one('status', 'model'),
+                     'appointment_id') + STAMPS,
+        'Services': ('id', 'name', 'description', number('price'), 'duration', 'washers_needed', 'type') + STAMPS,
+        'Vehicles': ('id', 'plate_number', 'model', 'type', 'customer_id') + STAMPS,
+        'Bays': ('id', 'bay') + STAMPS,
+        'Roles': ('id', 'role') + STAMPS,
+        'Status': ('id', 'status') + STAMPS,
+        'Notifications': ('id', 'content', 'notif_type', 'viewed', 'recipient_id', one('recipient', 'model'),
+                          'sender_id', one('sender', 'model')) + STAMPS,
+        'Feedbacks': ('id', 'rating', 'comment', 'customer_id', 'appointment_id') + STAMPS,
+        'Loyalties': ('id', 'points', 'note', 'customer_id') + STAMPS,
+        'Workloads': ('id', 'entity', 'entity_id', iso('day'), 'appointments') + STAMPS,
+        'BookingLocks': (iso('day'), 'version') + STAMPS,
+        'TableVersions': ('name', 'version') + STAMPS,
+        'DailyRollups': (iso('day'), 'appointments', 'pending', 'in_queue', 'now_serving', 'completed', 'cancelled',
+                         'payments', number('revenue', 0.0), number('revenue_cash', 0.0),
+                         number('revenue_gcash', 0.0), number('revenue_xendit', 0.0), 'rating_count',
+                         'average_rating', 'bay_minutes', 'washer_minutes', iso('refreshed_at')),
+    },
+    'api': {
+        'Accounts': ('id', 'first_name', 'middle_name', 'last_name', 'gender', 'phone_1', 'phone_2',
+                     iso('birth_date'), 'address', 'image_profile', 'email', 'is_active', 'role_id',
+                     iso('login_date')) + STAMPS,
+        'Customers': ('id', 'account_id', 'is_registered', 'is_pwd', 'is_senior') + STAMPS
+                     + (one('account', 'api'), many('vehicles', 'api')),
+        'Staffs': ('id', 'account_id', 'is_front_desk', 'is_on_shift') + STAMPS
+                  + (one('account', 'api'), many('schedules', 'api')),
+        'Schedules': ('id', 'staff_id', 'day', 'shift', iso('shift_start'), iso('shift_end')) + STAMPS
+                     + (one('staff', 'ref'),),
+        'Services': ('id', 'name', 'description', number('price'), 'duration', 'washers_needed', 'type') + STAMPS,
+        'Vehicles': ('id', 'plate_number', 'model', 'type', 'customer_id') + STAMPS,
+        'Bays': ('id', 'bay') + STAMPS,
+        'Roles': ('id', 'role') + STAMPS,
+        'Status': ('id', 'status') + STAMPS,
+        'Payments': ('id', 'method', 'transaction_no', 'image_payment', number('amount'), 'appointment_id',
+                     'status_id') + STAMPS,
+        'Feedbacks': ('id', 'rating', 'comment', 'customer_id', 'appointment_id') + STAMPS,
+        # the notifications table has no account_id; kept as null for existing clients
+        'Notifications': ('id', 'content', 'notif_type', 'viewed', const('account_id')) + STAMPS,
+        'Loyalties': ('id', 'points', 'note', 'customer_id') + STAMPS,
+        'Appointments': ('id', iso('start_time'), iso('end_time'), 'bay_id', 'customer_id', 'vehicle_id',
+                         'service_id', 'status_id') + STAMPS
+                        # a missing row has always been sent as {} here, and clients dereference it
+                        + (one('bay', 'api', missing={}), one('customer', 'api', missing={}),
+                           one('vehicle', 'api', missing={}), one('service', 'api', missing={}),
+                           one('status', 'api', missing={}), many('payments', 'api'), many('feedbacks', 'api'),
+                           many('staffs', 'api')),
+    },
+    'ref': {
+        'Staffs': ('id', 'account_id'),
+    },
+}
+
+
+def _fields(model, shape: str) -> Tuple[Field, ...]:
+    try:
+        fields = SHAPES[shape][model.__name__]
+    except KeyError:
+        raise ValueError(f"No '{shape}' serializer for {model.__name__}")
+    return tuple(Field(f, f) if isinstance(f, str) else f for f in fields)
+
+
+def _target(model, source: str):
+    """The model at the end of a dotted relationship path."""
+    for name in source.split('.'):
+        model = inspect(model).relationships[name].mapper.class_
+    return model
+
+
+def fields(model, shape: str = 'api') -> Tuple[Tuple[Field, Optional[type]], ...]:
+    """A shape's fields, each with the model a one/many field serializes (None for the others)."""
+    pairs = []
+    for field in _fields(model, shape):
+        target = None
+        if field.kind in ('one', 'many'):
+            target = _target(model, field.source)
+            if field.each:
+                target = _target(target, field.each)
+        pairs.append((field, target))
+    return tuple(pairs)
+
+
+def relation_paths(model, shape: str = 'api', prefix: str = '') -> Tuple[str, ...]:
+    """Dotted paths of every relationship a shape embeds, nested ones included."""
+    paths = []
+    for field, target in fields(model, shape):
+        if target is not None:
+            paths.append(prefix + field.key)
+            paths.extend(relation_paths(target, field.arg, prefix + field.key + '.'))
+    return tuple(paths)
+
+
+# =============================================================
+# COMPILER
+# =============================================================
+def _read(var: str, source: str, lines: list) -> None:
+    """Lines that put obj.<source> in `var`, stopping at the first None on a dotted path."""
+    names = source.split('.')
+    if not all(name.isidentifier() for name in names):
+        raise ValueError(f"Invalid attribute path '{source}'")
+    lines.append(f'    {var} = o.{names[0]}')
+    for name in names[1:]:
+        lines.append(f'    {var} = {var}.{name} if {var} is not None else None')
+
+
+def _compile(model, shape: str, view) -> Callable[[object], Dict]:
+    """
+    Generate a function returning the dict for one row: plain attribute reads and
+    inline conversions, no getattr defaults or per-field calls, with the nested
+    rows' functions compiled the same way and bound in.
+    """
+    namespace, lines, items = {}, [], []
+    for n, field in enumerate(_fields(model, shape)):
+        if field.kind in ('one', 'many'):
+            if view is not None and not view.embeds(field.key):
+                continue
+        elif view is not None and not view.includes(field.key):
+            continue
+        var = f'v{n}'
+        if field.kind == 'const':
+            namespace[var] = field.arg
+            items.append(f'{field.key!r}: {var}')
+            continue
+        _read(var, field.source, lines)
+        if field.kind == 'value':
+            items.append(f'{field.key!r}: {var}')
+        elif field.kind == 'iso':
+            items.append(f'{field.key!r}: {var}.isoformat() if {var} is not None else None')
+        elif field.kind == 'number':
+            namespace[f'm{n}'] = field.arg
+            items.append(f'{field.key!r}: float({var}) if {var} is not None else m{n}')
+        elif field.kind == 'strftime':
+            items.append(f'{field.key!r}: {var}.strftime({field.arg!r}) if {var} is not None else None')
+        else:
+            target = _target(model, field.source)
+            if field.each:
+                if not field.each.isidentifier():
+                    raise ValueError(f"Invalid attribute '{field.each}'")
+                target = _target(target, field.each)
+            namespace[f'c{n}'] = plan(target, field.arg, view.child(field.key) if view is not None else None)
+            if field.kind == 'one':
+                items.append(f'{field.key!r}: c{n}({var}) if {var} is not None else {field.missing!r}')
+            else:
+                item = f'x.{field.each}' if field.each else 'x'
+                items.append(f'{field.key!r}: [c{n}({item}) for x in ({var} or ())]')
+    source = 'def dump(o):\n' + '\n'.join(lines) + '\n    return {' + ', '.join(items) + '}\n'
+    exec(compile(source, f'<serializer {shape}:{model.__name__}>', 'exec'), namespace)
+    return namespace['dump']
+
+
+_PLANS: 'OrderedDict[tuple, Callable]' = OrderedDict()
+_MAX_PLANS = 512
+
+
+def plan(model, shape: str = 'api', view=None) -> Callable[[object], Dict]:
+    """The compiled function for a model, shape and projection, built on first use."""
+    key = (model, shape, view.key if view is not None else None)
+    dump = _PLANS.get(key)
+    if dump is None:
+        dump = _PLANS[key] = _compile(model, shape, view)
+        if len(_PLANS) > _MAX_PLANS:    # ?fields= can ask for any number of variants
+            _PLANS.popitem(last=False)
+    return dump
+
+
+def serialize(obj, shape: str = 'model', view=None) -> Dict:
+    """`obj` as a dict in the given shape ({} for None)."""
+    if obj is None:
+        return {}
+    return plan(type(obj), shape, view)(obj)
+
+
+def serializer(model, shape: str = 'api') -> Callable:
+    """A serialize_<model>(obj, view=None) function for one model."""
+    def serialize_model(obj, view=None) -> Dict:
+        if obj is None:
+            return {}
+        return plan(model, shape, view)(obj)
+    serialize_model.__name__ = f'serialize_{model.__name__.lower()}'
+    return serialize_model
+
+
+# =============================================================
+# ENCODING
+# =============================================================
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps_stdlib(payload, sort_keys: bool = True) -> bytes:
+    return json.dumps(payload, default=_default, sort_keys=sort_keys, separators=(',', ':')).encode()
+
+
+def dumps(payload, sort_keys: bool = True) -> bytes:
+    """JSON bytes, with orjson when it is installed."""
+    if orjson is None:
+        return dumps_stdlib(payload, sort_keys)
+    return orjson.dumps(payload, default=_default, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
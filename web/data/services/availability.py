@@ -0,0 +1,295 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from itertools import accumulate
+from math import ceil
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import joinedload
+
+from data import db
+from data.models import Appointments, Staffs, washers
+from data.services.reference import BayRow, ReferenceRegistry
+from data.services.roster import Roster
+from data.services.workload import INACTIVE_STATUS_IDS, Workload
+
+
+class IntervalIndex:
+    """
+    Sorted list of (start, end) intervals for a single bay or washer.
+
+    Starts are kept sorted next to a running maximum of the end times, so
+    "does anything overlap [start, end)" is a single bisect: every interval
+    that starts before `end` sits in a prefix of the list, and the prefix
+    overlaps when its largest end time is past `start`.
+    """
+
+    def __init__(self, intervals: Iterable[Tuple[datetime, datetime]] = ()):
+        self._intervals = sorted(intervals)
+        self._reindex()
+
+    def _reindex(self):
+        self._starts = [start for start, _ in self._intervals]
+        self._max_ends = list(accumulate((end for _, end in self._intervals), max))
+
+    def add(self, start: datetime, end: datetime):
+        k = bisect_right(self._intervals, (start, end))
+        self._intervals.insert(k, (start, end))
+        self._starts.insert(k, start)
+        self._max_ends.insert(k, max(self._max_ends[k - 1], end) if k else end)
+        # the running maximum only grows from the new interval on, up to the first end past it
+        for i in range(k + 1, len(self._max_ends)):
+            if self._max_ends[i] >= end:
+                break
+            self._max_ends[i] = end
+
+    def overlaps(self, start: datetime, end: datetime, inclusive: bool = False) -> bool:
+        """
+        True if any interval overlaps [start, end).
+        With inclusive=True, intervals that merely touch the edges count too.
+        """
+        if inclusive:
+            k = bisect_right(self._starts, end)
+            return k > 0 and self._max_ends[k - 1] >= start
+        k = bisect_left(self._starts, end)
+        return k > 0 and self._max_ends[k - 1] > start
+
+    def __iter__(self):
+        return iter(self._intervals)
+
+    def __len__(self):
+        return len(self._intervals)
+
+
+class Occupancy:
+    """
+    Snapshot of bays, on-shift washers and the appointments that hold them
+    inside a time window, loaded with a single date-windowed query. Daily
+    workloads come from the `workloads` counter table and shifts from the
+    compiled Roster.
+    """
+
+    def __init__(self, bays: List[BayRow], staffs: List[Staffs], window_start: datetime, window_end: datetime,
+                 roster: Roster):
+        self.bays = bays
+        self.staffs = staffs
+        self.window_start = window_start
+        self.window_end = window_end
+        self.bay_index: Dict[int, IntervalIndex] = defaultdict(IntervalIndex)
+        self.staff_index: Dict[int, IntervalIndex] = defaultdict(IntervalIndex)
+        self._workloads: Dict[Tuple[str, int], Dict] = defaultdict(lambda: defaultdict(int))
+        self.roster = roster
+
+    @classmethod
+    def load(cls, window_start: datetime, window_end: datetime, exclude_appointment_ids: Iterable[int] = ()) -> 'Occupancy':
+        """
+        Load the window. Appointments in `exclude_appointment_ids` are left out of the
+        indexes and the workloads, as if they had not been booked yet.
+        """
+        exclude_appointment_ids = set(exclude_appointment_ids)
+        bays = list(ReferenceRegistry.current().bays)
+        staffs = (Staffs.query
+                  .options(joinedload(Staffs.account))
+                  .filter(Staffs.is_on_shift == True, Staffs.is_front_desk == False)
+                  .all())
+
+        occupancy = cls(bays, staffs, window_start, window_end, Roster.current())
+        for key, days in Workload.get_counts(window_start.date(), window_end.date()).items():
+            occupancy._workloads[key].update(days)
+
+        rows = (db.session.query(
+                    Appointments.id, Appointments.bay_id, Appointments.start_time,
+                    Appointments.end_time, washers.c.staff_id)
+                .outerjoin(washers, washers.c.appointment_id == Appointments.id)
+                .filter(
+                    Appointments.start_time < window_end,
+                    Appointments.end_time > window_start,
+                    ~Appointments.status_id.in_(INACTIVE_STATUS_IDS))
+                .all())
+
+        bay_intervals = defaultdict(list)
+        staff_intervals = defaultdict(list)
+        seen = set()
+        for appointment_id, bay_id, start, end, staff_id in rows:
+            if appointment_id in exclude_appointment_ids:
+                if appointment_id not in seen:
+                    seen.add(appointment_id)
+                    occupancy._workloads[('bay', bay_id)][start.date()] -= 1
+                if staff_id is not None:
+                    occupancy._workloads[('staff', staff_id)][start.date()] -= 1
+                continue
+            if appointment_id not in seen:
+                seen.add(appointment_id)
+                bay_intervals[bay_id].append((start, end))
+            if staff_id is not None:
+                staff_intervals[staff_id].append((start, end))
+
+        for bay_id, intervals in bay_intervals.items():
+            occupancy._index('bay', bay_id, intervals)
+        for staff_id, intervals in staff_intervals.items():
+            occupancy._index('staff', staff_id, intervals)
+        return occupancy
+
+    def without(self, bay_ids: Iterable[int] = (), staff_ids: Iterable[int] = ()) -> 'Occupancy':
+        """Take bays and washers out of the snapshot, e.g. a bay that went down."""
+        bay_ids, staff_ids = set(bay_ids), set(staff_ids)
+        self.bays = [bay for bay in self.bays if bay.id not in bay_ids]
+        self.staffs = [staff for staff in self.staffs if staff.id not in staff_ids]
+        return self
+
+    def _index(self, kind: str, resource_id: int, intervals: List[Tuple[datetime, datetime]]):
+        index = self.bay_index if kind == 'bay' else self.staff_index
+        index[resource_id] = IntervalIndex(intervals)
+
+    def book(self, kind: str, resource_id: int, start: datetime, end: datetime):
+        """Record a booking made against this snapshot."""
+        index = self.bay_index if kind == 'bay' else self.staff_index
+        index[resource_id].add(start, end)
+        self._workloads[(kind, resource_id)][start.date()] += 1
+
+    def bay_busy(self, bay_id: int, start: datetime, end: datetime) -> bool:
+        index = self.bay_index.get(bay_id)
+        return bool(index) and index.overlaps(start, end)
+
+    def staff_busy(self, staff_id: int, start: datetime, end: datetime) -> bool:
+        # washers need a breather: touching appointments count as a clash
+        index = self.staff_index.get(staff_id)
+        return bool(index) and index.overlaps(start, end, inclusive=True)
+
+    def on_shift(self, staff: Staffs, start_time: datetime, duration: timedelta = timedelta()) -> bool:
+        """True if the washer's shift covers the whole job, not just its start."""
+        # the roster works in whole minutes: round the job outwards
+        floor = start_time.replace(second=0, microsecond=0)
+        minutes = int(ceil((start_time + duration - floor).total_seconds() / 60))
+        return self.roster.covers(staff.id, floor, minutes)
+
+    def bay_workload(self, bay_id: int, day) -> int:
+        return self._workloads[('bay', bay_id)].get(day, 0)
+
+    def staff_workload(self, staff_id: int, day) -> int:
+        return self._workloads[('staff', staff_id)].get(day, 0)
+
+    def slot_at(self, start_time: datetime, duration: timedelta, washers_needed: int) -> Optional[Dict]:
+        """
+        Try to place a booking starting exactly at `start_time`.
+        Bays and washers with the lightest workload that day are picked first.
+        """
+        end_time = start_time + duration
+        day = start_time.date()
+
+        staffs = sorted(self.staffs, key=lambda s: self.staff_workload(s.id, day))
+        available_staff = [
+            staff for staff in staffs
+            if self.on_shift(staff, start_time, duration) and not self.staff_busy(staff.id, start_time, end_time)
+        ]
+        if len(available_staff) < washers_needed:
+            return None
+
+        for bay in sorted(self.bays, key=lambda b: self.bay_workload(b.id, day)):
+            if not self.bay_busy(bay.id, start_time, end_time):
+                return {
+                    "bay": bay,
+                    "staff": available_staff[:washers_needed],
+                    "start_time": start_time,
+                    "end_time": end_time
+                }
+        return None
+
+    def capacity_at(self, start_time: datetime, duration: timedelta, washers_needed: int) -> int:
+        """How many bookings of this size could start at `start_time` side by side."""
+        end_time = start_time + duration
+        free_bays = sum(1 for bay in self.bays if not self.bay_busy(bay.id, start_time, end_time))
+        ready_staff = sum(
+            1 for staff in self.staffs
+            if self.on_shift(staff, start_time, duration) and not self.staff_busy(staff.id, start_time, end_time)
+        )
+        return min(free_bays, ready_staff // max(washers_needed, 1))
+
+    def hourly_capacity(self, first_day: date, last_day: date, duration: timedelta, washers_needed: int) -> List[int]:
+        """
+        capacity_at() for every top of the hour from `first_day` through `last_day`,
+        in order. Each bay's and washer's intervals and shifts are walked once,
+        marking the run of hours each one blocks or opens, instead of
+        looking every resource up again for every hour.
+        """
+        origin = datetime.combine(first_day, time.min)
+        hours = ((last_day - first_day).days + 1) * 24
+        hour = timedelta(hours=1)
+        # the roster works in whole minutes, like on_shift()
+        shift_span = timedelta(minutes=int(ceil(duration.total_seconds() / 60)))
+
+        def mark(row: List[int], lo: int, hi: int, value: int):
+            lo, hi = max(lo, 0), min(hi, hours - 1)
+            if lo <= hi:
+                row[lo:hi + 1] = [value] * (hi - lo + 1)
+
+        def floor_hour(moment: datetime) -> int:
+            return (moment - origin) // hour
+
+        def ceil_hour(moment: datetime) -> int:
+            return -((origin - moment) // hour)
+
+        free_bays = [0] * hours
+        for bay in self.bays:
+            free = [1] * hours
+            for start, end in self.bay_index.get(bay.id, ()):
+                # [h, h + duration) overlaps [start, end) when start - duration < h < end
+                mark(free, floor_hour(start - duration) + 1, ceil_hour(end) - 1, 0)
+            free_bays = [a + b for a, b in zip(free_bays, free)]
+
+        ready_staff = [0] * hours
+        for staff in self.staffs:
+            ready = [0] * hours
+            shifts = []
+            for begin, finish in self.roster.shift_minutes(staff.id, origin, origin + hours * hour + shift_span):
+                # pieces a minute apart are one shift, as in the compiled roster
+                if shifts and begin <= shifts[-1][1] + timedelta(minutes=1):
+                    shifts[-1] = (shifts[-1][0], max(shifts[-1][1], finish))
+                else:
+                    shifts.append((begin, finish))
+            for begin, finish in shifts:
+                mark(ready, ceil_hour(begin), floor_hour(finish - shift_span), 1)
+            for start, end in self.staff_index.get(staff.id, ()):
+                # touching jobs clash: start - duration <= h <= end
+                mark(ready, ceil_hour(start - duration), floor_hour(end), 0)
+            ready_staff = [a + b for a, b in zip(ready_staff, ready)]
+
+        return [min(bays, staff // max(washers_needed, 1)) for bays, staff in zip(free_bays, ready_staff)]
+
+    def candidate_starts(self, start_time: datetime, until: datetime) -> List[datetime]:
+        """
+        Every moment in [start_time, until) at which a slot can open up:
+        the requested time, the end of each booking and the start of each shift.
+        """
+        candidates = {start_time}
+        for index in self.bay_index.values():
+            candidates.update(end for _, end in index)
+        for index in self.staff_index.values():
+            candidates.update(end + timedelta(minutes=1) for _, end in index)
+
+        candidates.update(self.roster.shift_starts(start_time, until, [staff.id for staff in self.staffs]))
+
+        return sorted(c for c in candidates if start_time <= c < until)
+
+    def earliest_slot(self, start_time: datetime, duration: timedelta, washers_needed: int) -> Optional[Dict]:
+        """
+        Sweep the candidate start times in order and return the first feasible
+        slot at or after `start_time`, or None if nothing fits in the window.
+        """
+        for candidate in self.candidate_starts(start_time, self.window_end - duration + timedelta(minutes=1)):
+            slot = self.slot_at(candidate, duration, washers_needed)
+            if slot:
+                return slot
+        return None
+
+    def place(self, start_time: datetime, duration: timedelta, washers_needed: int) -> Optional[Dict]:
+        """
+        Book the earliest slot at or after `start_time` into this snapshot, so the
+        next placement sees it. Used to pack several bookings in one pass.
+        """
+        slot = self.earliest_slot(start_time, duration, washers_needed)
+        if slot:
+            self.book('bay', slot["bay"].id, slot["start_time"], slot["end_time"])
+            for staff in slot["staff"]:
+                self.book('staff', staff.id, slot["start_time"], slot["end_time"])
+        return slot
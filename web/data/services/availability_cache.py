@@ -0,0 +1,177 @@
+import threading
+import time as clock
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import attributes
+
+from data import app, db
+from data.models import Appointments, Bays, Schedules, Staffs
+from data.services.reference import ReferenceRegistry
+
+# session.info key for days touched by flushes not committed yet
+_PENDING = 'availability_cache_days'
+# marker for changes that affect every day (schedules, bays, washers going off shift)
+ALL_DAYS = 'all'
+
+
+class AvailabilityCache:
+    """
+    Bounded LRU cache with a TTL in front of the slot finder.
+
+    Entries are keyed by (start_time, duration, washers_needed) and hold only ids,
+    so a hit is rehydrated from the session's identity map. Every entry is filed
+    under the days between the requested start and the slot it found (or the whole
+    search horizon when nothing fitted): a committed change on one of those days is
+    the only thing that can make the answer stale, so only those entries are dropped.
+    """
+
+    _entries: 'OrderedDict[Tuple, Tuple[float, Optional[Tuple]]]' = OrderedDict()
+    _by_day: Dict[date, Set[Tuple]] = defaultdict(set)
+    _days: Dict[Tuple, Tuple[date, ...]] = {}
+    _lock = threading.Lock()
+    stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+    # bumped on every invalidation so results computed across a commit are not stored
+    generation = 0
+
+    def enabled() -> bool:
+        return app.config.get('AVAILABILITY_CACHE_SIZE', 0) > 0
+
+    def key(start_time: datetime, duration: timedelta, washers_needed: int) -> Tuple:
+        return start_time, duration, washers_needed, app.config.get('BOOKING_ENGINE', 'orm')
+
+    def pending(session) -> bool:
+        """True if the session has flushed availability changes that are not committed yet."""
+        return bool(session.info.get(_PENDING))
+
+    def get(key: Tuple):
+        """Returns (True, slot) on a hit and (False, None) on a miss."""
+        with AvailabilityCache._lock:
+            entry = AvailabilityCache._entries.get(key)
+            if entry and entry[0] > clock.monotonic():
+                AvailabilityCache._entries.move_to_end(key)
+                AvailabilityCache.stats['hits'] += 1
+                value = entry[1]
+            else:
+                if entry:
+                    AvailabilityCache._drop(key)
+                AvailabilityCache.stats['misses'] += 1
+                return False, None
+
+        if value is None:
+            return True, None
+        bay_id, staff_ids, start_time, end_time = value
+        bay = ReferenceRegistry.current().bay(bay_id)
+        staffs = [Staffs.query.get(staff_id) for staff_id in staff_ids]
+        if not bay or None in staffs:
+            AvailabilityCache.invalidate()
+            return False, None
+        return True, {"bay": bay, "staff": staffs, "start_time": start_time, "end_time": end_time}
+
+    def put(key: Tuple, slot: Optional[Dict], horizon_end: datetime, generation: int) -> None:
+        start_time = key[0]
+        last = slot["end_time"] if slot else horizon_end
+        days = tuple(start_time.date() + timedelta(days=n) for n in range((last.date() - start_time.date()).days + 1))
+        value = None
+        if slot:
+            value = (slot["bay"].id, tuple(s.id for s in slot["staff"]), slot["start_time"], slot["end_time"])
+
+        with AvailabilityCache._lock:
+            if generation != AvailabilityCache.generation:
+                return
+            if key in AvailabilityCache._entries:
+                AvailabilityCache._drop(key)
+            ttl = app.config.get('AVAILABILITY_CACHE_TTL', 60)
+            AvailabilityCache._entries[key] = (clock.monotonic() + ttl, value)
+            AvailabilityCache._days[key] = days
+            for day in days:
+                AvailabilityCache._by_day[day].add(key)
+            while len(AvailabilityCache._entries) > app.config.get('AVAILABILITY_CACHE_SIZE', 0):
+                AvailabilityCache._drop(next(iter(AvailabilityCache._entries)))
+                AvailabilityCache.stats['evictions'] += 1
+
+    def _drop(key: Tuple) -> None:
+        AvailabilityCache._entries.pop(key, None)
+        for day in AvailabilityCache._days.pop(key, ()):
+            keys = AvailabilityCache._by_day.get(day)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del AvailabilityCache._by_day[day]
+
+    def invalidate(days=ALL_DAYS) -> None:
+        """Drop entries filed under any of `days`, or everything."""
+        with AvailabilityCache._lock:
+            if days == ALL_DAYS:
+                AvailabilityCache._entries.clear()
+                AvailabilityCache._by_day.clear()
+                AvailabilityCache._days.clear()
+            else:
+                for day in days:
+                    for key in list(AvailabilityCache._by_day.get(day, ())):
+                        AvailabilityCache._drop(key)
+            AvailabilityCache.generation += 1
+            AvailabilityCache.stats['invalidations'] += 1
+
+    def get_stats() -> Dict:
+        with AvailabilityCache._lock:
+            lookups = AvailabilityCache.stats['hits'] + AvailabilityCache.stats['misses']
+            return {
+                **AvailabilityCache.stats,
+                'size': len(AvailabilityCache._entries),
+                'max_size': app.config.get('AVAILABILITY_CACHE_SIZE', 0),
+                'ttl': app.config.get('AVAILABILITY_CACHE_TTL', 60),
+                'hit_rate': round(AvailabilityCache.stats['hits'] / lookups, 4) if lookups else None
+            }
+
+
+def _appointment_days(appointment: Appointments) -> Set[date]:
+    """Days covered by the appointment before and after the pending flush."""
+
+    def value(key, previous):
+        history = attributes.get_history(appointment, key)
+        values = history.unchanged or (history.deleted if previous else history.added)
+        return values[0] if values else None
+
+    days = set()
+    for previous in (True, False):
+        start, end = value('start_time', previous), value('end_time', previous)
+        if not isinstance(start, datetime):
+            continue
+        last = end.date() if isinstance(end, datetime) and end > start else start.date()
+        days.update(start.date() + timedelta(days=n) for n in range((last - start.date()).days + 1))
+    return days
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_availability_changes(session, flush_context, instances):
+    pending = session.info.setdefault(_PENDING, set())
+    if ALL_DAYS in pending:
+        return
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Appointments):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            pending.update(_appointment_days(obj))
+        elif isinstance(obj, (Schedules, Bays)):
+            pending.add(ALL_DAYS)
+        elif isinstance(obj, Staffs):
+            if obj in session.dirty and not attributes.get_history(obj, 'is_on_shift').has_changes():
+                continue
+            pending.add(ALL_DAYS)
+        if ALL_DAYS in pending:
+            return
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_availability_changes(session):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        AvailabilityCache.invalidate(ALL_DAYS if ALL_DAYS in pending else pending)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_availability_changes(session, previous_transaction):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,138 @@
+import logging
+import random
+import time as clock
+from datetime import date, datetime, timedelta
+from functools import wraps
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import true
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from data import app, db
+from data.models import Appointments, BookingLocks, washers
+from data.services.availability_cache import AvailabilityCache
+from data.services.workload import INACTIVE_STATUS_IDS
+
+logger = logging.getLogger(__name__)
+
+
+class BookingConflict(Exception):
+    """The slot was taken, or the day lock was contended, by a concurrent booking."""
+
+    def __init__(self, message: str, days: Iterable[date] = ()):
+        super().__init__(message)
+        self.days = sorted(set(days))
+
+
+def _days(start_time: datetime, end_time: datetime) -> List[date]:
+    first, last = start_time.date(), max(end_time, start_time).date()
+    return [first + timedelta(days=n) for n in range((last - first).days + 1)]
+
+
+class BookingLock:
+    """
+    Serialises bookings per day through one row per day in `booking_locks`.
+
+    A booking bumps the version of every day its appointment covers before it
+    re-checks the slot and inserts. On MySQL the UPDATE holds an exclusive row
+    lock until commit, so two clerks booking the same day queue up behind each
+    other; on SQLite the first write takes the database-wide RESERVED lock, which
+    serialises writers the same way. Days are locked in ascending order so two
+    bookings spanning midnight cannot deadlock.
+    """
+
+    def acquire(days: Iterable[date]) -> None:
+        table = BookingLocks.__table__
+        days = sorted(set(days))
+        try:
+            for day in days:
+                result = db.session.execute(
+                    table.update()
+                    .where(table.c.day == day)
+                    .values(version=table.c.version + 1, updated_at=datetime.now())
+                )
+                if not result.rowcount:
+                    db.session.execute(table.insert().values(day=day, version=1))
+        except (IntegrityError, OperationalError) as e:
+            # a concurrent first booking inserted the row, or the lock wait timed out / deadlocked
+            raise BookingConflict(f"Booking lock contended: {e.orig}", days)
+
+    def verify(slot: Dict, exclude_id: Optional[int] = None) -> None:
+        """
+        Re-check the slot against committed appointments with locking reads, which
+        see the latest committed rows instead of the transaction's snapshot.
+        Raises BookingConflict if the bay or a washer has been taken meanwhile.
+        """
+        start_time, end_time = slot["start_time"], slot["end_time"]
+        days = _days(start_time, end_time)
+        active = ~Appointments.status_id.in_(INACTIVE_STATUS_IDS)
+        others = Appointments.id != exclude_id if exclude_id else true()
+
+        bay_clash = (db.session.query(Appointments.id)
+                     .filter(
+                         Appointments.bay_id == slot["bay"].id,
+                         Appointments.start_time < end_time,
+                         Appointments.end_time > start_time,
+                         active, others)
+                     .with_for_update(read=True)
+                     .first())
+        if bay_clash:
+            raise BookingConflict(f"Bay {slot['bay'].bay} was just booked", days)
+
+        staff_ids = [staff.id for staff in slot["staff"]]
+        staff_clash = (db.session.query(washers.c.staff_id)
+                       .join(Appointments, Appointments.id == washers.c.appointment_id)
+                       .filter(
+                           washers.c.staff_id.in_(staff_ids),
+                           Appointments.start_time <= end_time,
+                           Appointments.end_time >= start_time,
+                           active, others)
+                       .with_for_update(read=True)
+                       .first()) if staff_ids else None
+        if staff_clash:
+            raise BookingConflict(f"Washer {staff_clash[0]} was just booked", days)
+
+    def reserve(slot: Dict, exclude_id: Optional[int] = None) -> None:
+        """Lock the days the slot covers, then make sure it is still free."""
+        BookingLock.acquire(_days(slot["start_time"], slot["end_time"]))
+        BookingLock.verify(slot, exclude_id)
+
+
+CONFLICT_ERROR = {"error": "The selected time slot was taken by another booking. Please try again."}
+
+
+def retry_on_conflict(failed=CONFLICT_ERROR):
+    """
+    Run a booking function again, in a fresh transaction, when it loses a race.
+    The retry takes the contended days' locks before it searches, so it sees every
+    committed booking on them and cannot lose to the same race twice; cached
+    availability for those days is dropped too. Returns `failed` once
+    BOOKING_RETRIES attempts lost.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            attempts = max(app.config.get('BOOKING_RETRIES', 3), 1)
+            contended = set()
+            for attempt in range(attempts):
+                try:
+                    if contended:
+                        BookingLock.acquire(contended)
+                    return func(*args, **kwargs)
+                except BookingConflict as e:
+                    db.session.rollback()
+                    contended.update(e.days)
+                    if e.days:
+                        AvailabilityCache.invalidate(e.days)
+                    else:
+                        AvailabilityCache.invalidate()
+                    logger.info("%s lost a booking race (%s), attempt %s of %s",
+                                func.__name__, e, attempt + 1, attempts)
+                    if attempt + 1 < attempts:
+                        clock.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+            return dict(failed) if isinstance(failed, dict) else failed
+
+        return wrapper
+
+    return decorator
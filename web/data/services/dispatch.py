@@ -0,0 +1,298 @@
+import heapq
+import threading
+import time as clock
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import attributes
+
+from data import app, db
+from data.models import Appointments, Customers, Loyalties, Services
+from data.services.availability import Occupancy
+from data.services.booking_lock import BookingConflict, BookingLock
+from data.services.reference import IN_QUEUE, NOW_SERVING, ReferenceRegistry
+
+# session.info keys for queue changes flushed but not committed yet
+_PENDING_APPOINTMENTS = 'dispatch_appointments'
+_PENDING_CUSTOMERS = 'dispatch_customers'
+
+# priority tiers from features.txt, highest first
+TIERS = {0: 'senior', 1: 'pwd', 2: 'loyalty', 3: 'registered', 4: 'guest'}
+
+
+def priority(is_senior: bool, is_pwd: bool, points: int, is_registered: bool, start_time: datetime,
+             appointment_id: int) -> Tuple:
+    """
+    Heap key for an appointment: senior > PWD > loyalty points > registered > guest.
+    Loyalty customers are ordered by their points, and every tier by booked start.
+    """
+    if is_senior:
+        tier = 0
+    elif is_pwd:
+        tier = 1
+    elif points > 0:
+        tier = 2
+    elif is_registered:
+        tier = 3
+    else:
+        tier = 4
+    return tier, -(points if tier == 2 else 0), start_time or datetime.max, appointment_id
+
+
+class Dispatcher:
+    """
+    In-process priority queue of today's In Queue appointments.
+
+    A binary heap of (priority, appointment_id) with lazy deletion: `_keys` holds
+    each queued appointment's current priority, and heap entries whose priority no
+    longer matches are stale and skipped when they reach the top. Commits that touch
+    appointments, customer flags or loyalty points mark what changed; those rows are
+    re-read on the next access, so serving the next customer costs O(log n) plus
+    the handful of rows that changed. A full rebuild every DISPATCH_REFRESH_SECONDS
+    picks up changes made by other processes.
+    """
+
+    _heap: List[Tuple[Tuple, int]] = []
+    _keys: Dict[int, Tuple] = {}
+    _stale_appointments: Set[int] = set()
+    _stale_customers: Set[int] = set()
+    _built_at: Optional[float] = None
+    _built_on = None
+    _lock = threading.RLock()
+
+    def _query():
+        points = (db.session.query(Loyalties.customer_id, db.func.sum(Loyalties.points).label('points'))
+                  .group_by(Loyalties.customer_id)
+                  .subquery())
+        return (db.session.query(
+                    Appointments.id, Appointments.start_time,
+                    Customers.is_senior, Customers.is_pwd, Customers.is_registered,
+                    db.func.coalesce(points.c.points, 0))
+                .join(Customers, Customers.id == Appointments.customer_id)
+                .outerjoin(points, points.c.customer_id == Customers.id)
+                .filter(
+                    Appointments.status_id == ReferenceRegistry.current().status_id(IN_QUEUE),
+                    Appointments.start_time >= datetime.combine(Dispatcher._built_on, time.min),
+                    Appointments.start_time < datetime.combine(Dispatcher._built_on + timedelta(days=1), time.min)))
+
+    def _key(row) -> Tuple:
+        appointment_id, start_time, is_senior, is_pwd, is_registered, points = row
+        return priority(bool(is_senior), bool(is_pwd), int(points or 0), bool(is_registered), start_time, appointment_id)
+
+    def rebuild() -> None:
+        with Dispatcher._lock:
+            Dispatcher._built_on = date.today()
+            keys = {row[0]: Dispatcher._key(row) for row in Dispatcher._query().all()}
+            Dispatcher._keys = keys
+            Dispatcher._heap = [(key, appointment_id) for appointment_id, key in keys.items()]
+            heapq.heapify(Dispatcher._heap)
+            Dispatcher._stale_appointments.clear()
+            Dispatcher._stale_customers.clear()
+            Dispatcher._built_at = clock.monotonic()
+
+    def mark_stale(appointment_ids: Iterable[int] = (), customer_ids: Iterable[int] = ()) -> None:
+        with Dispatcher._lock:
+            Dispatcher._stale_appointments.update(appointment_ids)
+            Dispatcher._stale_customers.update(customer_ids)
+
+    def _refresh() -> None:
+        """Bring the heap up to date before reading it."""
+        ttl = app.config.get('DISPATCH_REFRESH_SECONDS', 60)
+        if (Dispatcher._built_at is None or clock.monotonic() - Dispatcher._built_at > ttl
+                or Dispatcher._built_on != date.today()):
+            Dispatcher.rebuild()
+            return
+        if not Dispatcher._stale_appointments and not Dispatcher._stale_customers:
+            return
+
+        appointment_ids = set(Dispatcher._stale_appointments)
+        customer_ids = set(Dispatcher._stale_customers)
+        Dispatcher._stale_appointments.clear()
+        Dispatcher._stale_customers.clear()
+
+        if customer_ids:
+            appointment_ids.update(appointment_id for appointment_id, in
+                                   db.session.query(Appointments.id)
+                                   .filter(Appointments.customer_id.in_(customer_ids),
+                                           Appointments.status_id == ReferenceRegistry.current().status_id(IN_QUEUE)))
+        if not appointment_ids:
+            return
+
+        fresh = {row[0]: Dispatcher._key(row)
+                 for row in Dispatcher._query().filter(Appointments.id.in_(appointment_ids)).all()}
+        for appointment_id in appointment_ids:
+            key = fresh.get(appointment_id)
+            if key is None:
+                Dispatcher._keys.pop(appointment_id, None)  # left the queue; its heap entry goes stale
+            elif Dispatcher._keys.get(appointment_id) != key:
+                Dispatcher._keys[appointment_id] = key
+                heapq.heappush(Dispatcher._heap, (key, appointment_id))
+
+        # drop stale entries once they outnumber the live ones
+        if len(Dispatcher._heap) > 2 * len(Dispatcher._keys) + 32:
+            Dispatcher._heap = [(key, appointment_id) for appointment_id, key in Dispatcher._keys.items()]
+            heapq.heapify(Dispatcher._heap)
+
+    def _top() -> Optional[Tuple[Tuple, int]]:
+        heap = Dispatcher._heap
+        while heap and Dispatcher._keys.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def peek() -> Optional[Appointments]:
+        """The appointment to serve next, without taking it off the queue."""
+        with Dispatcher._lock:
+            Dispatcher._refresh()
+            top = Dispatcher._top()
+        return Appointments.query.get(top[1]) if top else None
+
+    def queue(limit: int = 50) -> List[Dict]:
+        """The queue in serving order as [{appointment_id, tier, points, position}]."""
+        with Dispatcher._lock:
+            Dispatcher._refresh()
+            entries = heapq.nsmallest(limit, ((key, appointment_id) for appointment_id, key in Dispatcher._keys.items()))
+        return [
+            {"position": n + 1, "appointment_id": appointment_id, "tier": TIERS[key[0]], "points": -key[1]}
+            for n, (key, appointment_id) in enumerate(entries)
+        ]
+
+    def serve(bay_id: Optional[int] = None, now: Optional[datetime] = None) -> Optional[Appointments]:
+        """
+        Take the highest-priority appointment off the queue and mark it Now Serving,
+        starting now. `bay_id` moves it to the bay that just freed up.
+
+        Moving the appointment to now is a booking like any other: the days are
+        locked and the new window is checked against the bay and washers' other
+        appointments. A taken `bay_id` falls back to the appointment's own bay, and
+        busy washers are swapped for free ones on shift. If nothing fits, the
+        appointment goes back on the queue and BookingConflict is raised.
+        """
+        now = (now or datetime.now()).replace(second=0, microsecond=0)
+        references = ReferenceRegistry.current()
+        while True:
+            with Dispatcher._lock:
+                Dispatcher._refresh()
+                top = Dispatcher._top()
+                if not top:
+                    return None
+                heapq.heappop(Dispatcher._heap)
+                Dispatcher._keys.pop(top[1], None)
+            # the days first, then the row, in the same order as every booking path
+            locked = {now.date(), (now + Dispatcher._duration(top[1])).date()}
+            BookingLock.acquire(locked)
+            # claim it with a row lock so a second front desk cannot serve it too
+            appointment = (Appointments.query
+                           .filter_by(id=top[1])
+                           .with_for_update()
+                           .populate_existing()
+                           .first())
+            if appointment and appointment.status_id == references.status_id(IN_QUEUE):
+                break
+
+        try:
+            duration = (appointment.end_time - appointment.start_time) if appointment.start_time and appointment.end_time \
+                else timedelta(minutes=appointment.service.duration)
+            if (now + duration).date() not in locked:
+                # its times changed between the look and the claim
+                BookingLock.acquire({(now + duration).date()})
+            slot = Dispatcher._slot(appointment, int(bay_id) if bay_id else None, now, duration)
+            if not slot:
+                raise BookingConflict("No free bay or washers to serve the appointment now",
+                                      {now.date(), (now + duration).date()})
+            BookingLock.verify(slot, exclude_id=appointment.id)
+
+            appointment.status_id = references.status_id(NOW_SERVING)
+            appointment.start_time = slot["start_time"]
+            appointment.end_time = slot["end_time"]
+            appointment.bay_id = slot["bay"].id
+            if set(slot["staff"]) != set(appointment.staffs):
+                appointment.staffs = slot["staff"]
+            db.session.commit()
+            return appointment
+        except Exception:
+            db.session.rollback()
+            Dispatcher.mark_stale([top[1]])  # put it back on the next read
+            raise
+
+    def _duration(appointment_id: int) -> timedelta:
+        """How long the appointment runs: its booked length, else its service's duration."""
+        start, end, minutes = (db.session.query(Appointments.start_time, Appointments.end_time, Services.duration)
+                               .outerjoin(Services, Services.id == Appointments.service_id)
+                               .filter(Appointments.id == appointment_id)
+                               .first()) or (None, None, None)
+        return end - start if start and end else timedelta(minutes=minutes or 0)
+
+    def _slot(appointment: Appointments, bay_id: Optional[int], now: datetime, duration: timedelta) -> Optional[Dict]:
+        """
+        Where the appointment can run from `now`: the requested bay, else its own, with
+        its own washers when they are free, else the least busy washers on shift.
+        The caller holds the day locks for [now, now + duration].
+        """
+        end = now + duration
+        # a minute either side, so washers finishing right at `now` count as busy like in BookingLock.verify
+        occupancy = Occupancy.load(now - timedelta(minutes=1), end + timedelta(minutes=1),
+                                   exclude_appointment_ids=[appointment.id])
+        references = ReferenceRegistry.current()
+        crew = list(appointment.staffs)
+        crew_free = all(not occupancy.staff_busy(staff.id, now, end) for staff in crew)
+
+        bays = [references.bay(b) for b in dict.fromkeys(b for b in (bay_id, appointment.bay_id) if b)]
+        for bay in bays:
+            if bay is None or occupancy.bay_busy(bay.id, now, end):
+                continue
+            if crew and crew_free:
+                return {"bay": bay, "staff": crew, "start_time": now, "end_time": end}
+            occupancy.bays = [bay]
+            slot = occupancy.slot_at(now, duration, len(crew) or appointment.service.washers_needed or 1)
+            if slot:
+                return slot
+        return None
+
+
+def _changed(obj, *keys) -> bool:
+    return any(attributes.get_history(obj, key).has_changes() for key in keys)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_queue_changes(session, flush_context, instances):
+    appointments = session.info.setdefault(_PENDING_APPOINTMENTS, set())
+    customers = session.info.setdefault(_PENDING_CUSTOMERS, set())
+    for obj in session.dirty:
+        if isinstance(obj, Appointments) and _changed(obj, 'status_id', 'customer_id', 'start_time'):
+            appointments.add(obj.id)
+        elif isinstance(obj, Customers) and _changed(obj, 'is_senior', 'is_pwd', 'is_registered'):
+            customers.add(obj.id)
+        elif isinstance(obj, Loyalties):
+            customers.update(c for c in attributes.get_history(obj, 'customer_id').sum() if c)
+    for obj in session.deleted:
+        if isinstance(obj, Appointments):
+            appointments.add(obj.id)
+        elif isinstance(obj, Loyalties):
+            customers.add(obj.customer_id)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_new_appointments(session, flush_context):
+    # new rows only have their ids after the flush
+    appointments = session.info.setdefault(_PENDING_APPOINTMENTS, set())
+    customers = session.info.setdefault(_PENDING_CUSTOMERS, set())
+    for obj in session.new:
+        if isinstance(obj, Appointments):
+            appointments.add(obj.id)
+        elif isinstance(obj, Loyalties):
+            customers.add(obj.customer_id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_queue_changes(session):
+    appointments = session.info.pop(_PENDING_APPOINTMENTS, None)
+    customers = session.info.pop(_PENDING_CUSTOMERS, None)
+    if appointments or customers:
+        Dispatcher.mark_stale({i for i in appointments or () if i}, {i for i in customers or () if i})
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_queue_changes(session, previous_transaction):
+    session.info.pop(_PENDING_APPOINTMENTS, None)
+    session.info.pop(_PENDING_CUSTOMERS, None)
@@ -0,0 +1,48 @@
+from typing import Tuple, Union
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from data.models import Appointments, Customers, Staffs
+
+
+# Many-to-one relations are joined into the main query and collections are fetched
+# with one SELECT ... IN per relation (per 500 parent rows), so walking a page of
+# appointments costs a fixed handful of statements instead of several per row.
+
+_LIST = (
+    joinedload(Appointments.bay),
+    joinedload(Appointments.service),
+    joinedload(Appointments.status),
+    joinedload(Appointments.vehicle),
+    joinedload(Appointments.customer).joinedload(Customers.account),
+    selectinload(Appointments.staffs).joinedload(Staffs.account),
+)
+
+_DETAIL = _LIST + (
+    joinedload(Appointments.customer).selectinload(Customers.vehicles),
+    selectinload(Appointments.payments),
+    selectinload(Appointments.feedbacks),
+    selectinload(Appointments.staffs).selectinload(Staffs.schedules),
+)
+
+APPOINTMENT_PROFILES = {
+    # what tables of appointments render: bay, service, status, vehicle, customer and washer names
+    'list': _LIST,
+    # everything serialize_appointment reads
+    'detail': _DETAIL,
+}
+
+
+def appointment_options(profile: Union[str, Tuple, None]) -> Tuple:
+    """
+    Loader options for an appointment query: a profile name, or a tuple of loader
+    options as given (e.g. Projection.options); no profile keeps the model's lazy loading.
+    """
+    if not profile:
+        return ()
+    if isinstance(profile, tuple):
+        return profile
+    try:
+        return APPOINTMENT_PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"Unknown appointment loading profile '{profile}'")
@@ -0,0 +1,152 @@
+from datetime import date, datetime, time, timedelta
+from math import ceil
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from data.services.availability import Occupancy
+
+
+class OccupancyGrid:
+    """
+    Minute-resolution view of an Occupancy snapshot.
+
+    Each bay and each washer is a row of a uint8 matrix over the minutes of the
+    window (1 = busy), and washers get a second matrix marking the minutes they
+    are off shift, so a job needs both to be clear for its whole span. Window
+    sums come from cumulative sums, so the feasibility of every start minute is
+    computed at once instead of looping over bays and washers in Python.
+    """
+
+    def __init__(self, occupancy: Occupancy):
+        self.occupancy = occupancy
+        self.bays = occupancy.bays
+        self.staffs = occupancy.staffs
+        self.origin = occupancy.window_start
+        self.window_end = occupancy.window_end
+        self.minutes = self._minute(occupancy.window_end, ceil) + 1
+
+        self.bay_busy = np.zeros((len(self.bays), self.minutes), dtype=np.uint8)
+        for row, bay in enumerate(self.bays):
+            for start, end in occupancy.bay_index.get(bay.id, ()):
+                # bays are held for [start, end)
+                self.bay_busy[row, self._clip(start, int):self._clip(end, ceil)] = 1
+
+        self.staff_busy = np.zeros((len(self.staffs), self.minutes), dtype=np.uint8)
+        self.staff_off = np.ones((len(self.staffs), self.minutes), dtype=np.uint8)
+        for row, staff in enumerate(self.staffs):
+            for start, end in occupancy.staff_index.get(staff.id, ()):
+                # washers are held for [start, end], touching jobs clash
+                self.staff_busy[row, self._clip(start, int):self._clip(end, ceil) + 1] = 1
+            self._mark_shifts(row, staff)
+
+        self._bay_sums = self._cumsum(self.bay_busy)
+        self._staff_sums = self._cumsum(self.staff_busy)
+        self._off_sums = self._cumsum(self.staff_off)
+        self._feasible = {}
+
+    def _minute(self, moment: datetime, rounding) -> int:
+        return int(rounding((moment - self.origin).total_seconds() / 60))
+
+    def _clip(self, moment: datetime, rounding) -> int:
+        return min(max(self._minute(moment, rounding), 0), self.minutes)
+
+    def _moment(self, minute: int) -> datetime:
+        return self.origin + timedelta(minutes=int(minute))
+
+    @staticmethod
+    def _cumsum(matrix: np.ndarray) -> np.ndarray:
+        sums = np.zeros((matrix.shape[0], matrix.shape[1] + 1), dtype=np.int32)
+        np.cumsum(matrix, axis=1, out=sums[:, 1:])
+        return sums
+
+    def _mark_shifts(self, row: int, staff):
+        roster = self.occupancy.roster
+        for start, end in roster.shift_minutes(staff.id, self.origin, self.window_end):
+            # shift ends are inclusive, as in Roster.covers
+            self.staff_off[row, self._clip(start, ceil):self._clip(end, int) + 1] = 0
+
+    def _feasibility(self, duration: timedelta, washers_needed: int):
+        """Free bays and ready washers for every start minute that leaves room for `duration`."""
+        span = int(ceil(duration.total_seconds() / 60))
+        if (span, washers_needed) not in self._feasible:
+            self._feasible[(span, washers_needed)] = self._compute_feasibility(span, washers_needed)
+        return self._feasible[(span, washers_needed)]
+
+    def _compute_feasibility(self, span: int, washers_needed: int):
+        starts = self.minutes - span - 1
+        if starts <= 0:
+            empty = np.zeros((0, 0), dtype=bool)
+            return empty, empty, np.zeros(0, dtype=bool)
+
+        bay_free = (self._bay_sums[:, span:span + starts] - self._bay_sums[:, :starts]) == 0
+        staff_free = (self._staff_sums[:, span + 1:span + 1 + starts] - self._staff_sums[:, :starts]) == 0
+        on_shift = (self._off_sums[:, span + 1:span + 1 + starts] - self._off_sums[:, :starts]) == 0
+        staff_ready = staff_free & on_shift
+
+        feasible = bay_free.any(axis=0) & (staff_ready.sum(axis=0) >= washers_needed)
+        return bay_free, staff_ready, feasible
+
+    def _slot(self, minute: int, bay_free, staff_ready, duration: timedelta, washers_needed: int) -> Dict:
+        start_time = self._moment(minute)
+        day = start_time.date()
+        occupancy = self.occupancy
+
+        staff = sorted(
+            (s for row, s in enumerate(self.staffs) if staff_ready[row, minute]),
+            key=lambda s: occupancy.staff_workload(s.id, day)
+        )
+        bay = min(
+            (b for row, b in enumerate(self.bays) if bay_free[row, minute]),
+            key=lambda b: occupancy.bay_workload(b.id, day)
+        )
+        return {
+            "bay": bay,
+            "staff": staff[:washers_needed],
+            "start_time": start_time,
+            "end_time": start_time + duration
+        }
+
+    def slot_at(self, start_time: datetime, duration: timedelta, washers_needed: int) -> Optional[Dict]:
+        minute = self._minute(start_time, int)
+        if self._moment(minute) != start_time:
+            return self.occupancy.slot_at(start_time, duration, washers_needed)
+
+        bay_free, staff_ready, feasible = self._feasibility(duration, washers_needed)
+        if not 0 <= minute < feasible.size or not feasible[minute]:
+            return None
+        return self._slot(minute, bay_free, staff_ready, duration, washers_needed)
+
+    def capacity_at(self, start_time: datetime, duration: timedelta, washers_needed: int) -> int:
+        minute = self._minute(start_time, int)
+        if self._moment(minute) != start_time:
+            return self.occupancy.capacity_at(start_time, duration, washers_needed)
+
+        bay_free, staff_ready, feasible = self._feasibility(duration, washers_needed)
+        if not 0 <= minute < feasible.size:
+            return 0
+        return min(int(bay_free[:, minute].sum()), int(staff_ready[:, minute].sum()) // max(washers_needed, 1))
+
+    def hourly_capacity(self, first_day: date, last_day: date, duration: timedelta, washers_needed: int) -> List[int]:
+        """capacity_at() for every top of the hour from `first_day` through `last_day`, read off the grid at once."""
+        first = self._minute(datetime.combine(first_day, time.min), int)
+        if self._moment(first) != datetime.combine(first_day, time.min):
+            return self.occupancy.hourly_capacity(first_day, last_day, duration, washers_needed)
+
+        bay_free, staff_ready, feasible = self._feasibility(duration, washers_needed)
+        minutes = first + 60 * np.arange(((last_day - first_day).days + 1) * 24)
+        inside = (minutes >= 0) & (minutes < feasible.size)
+        capacity = np.zeros(minutes.size, dtype=np.int64)
+        if inside.any():
+            picked = minutes[inside]
+            capacity[inside] = np.minimum(bay_free[:, picked].sum(axis=0),
+                                          staff_ready[:, picked].sum(axis=0) // max(washers_needed, 1))
+        return capacity.tolist()
+
+    def earliest_slot(self, start_time: datetime, duration: timedelta, washers_needed: int) -> Optional[Dict]:
+        bay_free, staff_ready, feasible = self._feasibility(duration, washers_needed)
+        first = max(self._minute(start_time, ceil), 0)
+        hits = np.flatnonzero(feasible[first:])
+        if not hits.size:
+            return None
+        return self._slot(first + int(hits[0]), bay_free, staff_ready, duration, washers_needed)
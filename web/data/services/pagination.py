@@ -0,0 +1,154 @@
+import base64
+import json
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional
+
+from sqlalchemy import and_, or_
+
+from data import app
+
+
+class PaginationError(ValueError):
+    """A bad limit, cursor, sort or filter value in a listing request."""
+
+
+class Page(NamedTuple):
+    items: List[Any]
+    limit: int
+    next: Optional[str]     # cursor for the following page, None on the last one
+
+    def meta(self) -> Dict:
+        return {'limit': self.limit, 'next': self.next, 'has_more': self.next is not None}
+
+
+def _encode(values: List) -> str:
+    raw = json.dumps(values, default=lambda v: v.isoformat(), separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode(cursor: str) -> List:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise PaginationError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != 4:
+        raise PaginationError("Invalid cursor")
+    if not isinstance(values[3], int) or isinstance(values[3], bool):
+        raise PaginationError("Invalid cursor")
+    return values
+
+
+def _moment(value: str, end: bool = False) -> datetime:
+    """'YYYY-MM-DD' or an ISO datetime; a bare date as an upper bound means the whole day."""
+    try:
+        if len(value) == 10:
+            day = datetime.combine(date.fromisoformat(value), time.min)
+            return day + timedelta(days=1) if end else day
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise PaginationError(f"Invalid date '{value}'")
+
+
+def _ids(name: str, value: str) -> List[int]:
+    try:
+        return [int(v) for v in value.split(',') if v.strip()]
+    except ValueError:
+        raise PaginationError(f"'{name}' must be an id or a comma-separated list of ids")
+
+
+def paginate(query, model, args: Mapping[str, str], time_column: Optional[str] = None,
+             filters: Iterable[str] = (), limit: Optional[int] = None) -> Page:
+    """
+    One page of `query` using keyset pagination.
+
+    `args` are the request's query string values:
+      limit      page size, capped at API_MAX_PAGE_SIZE (default API_PAGE_SIZE)
+      after      the `next` cursor from the previous page
+      sort       'id' (default), 'created_at' or `time_column`
+      order      'asc' (default) or 'desc'
+      from, to   date range on `time_column` (or created_at); bare dates are whole days
+      <filter>   exact match on any column named in `filters`; "2,3" matches either
+
+    Pages are fetched with WHERE (sort, id) > (last sort value, last id) instead of
+    OFFSET, so every page costs the same however deep the client reads.
+    An explicit `limit` overrides the one in `args` and is not capped.
+    """
+    if limit is None:
+        try:
+            limit = int(args.get('limit') or app.config.get('API_PAGE_SIZE', 100))
+        except ValueError:
+            raise PaginationError("'limit' must be a number")
+        limit = min(max(limit, 1), app.config.get('API_MAX_PAGE_SIZE', 500))
+
+    time_column = time_column or ('created_at' if hasattr(model, 'created_at') else None)
+    sortable = {'id'} | {name for name in (time_column, 'created_at') if name and hasattr(model, name)}
+    sort = args.get('sort') or 'id'
+    if sort not in sortable:
+        raise PaginationError(f"'sort' must be one of {', '.join(sorted(sortable))}")
+    order = (args.get('order') or 'asc').lower()
+    if order not in ('asc', 'desc'):
+        raise PaginationError("'order' must be asc or desc")
+
+    for name in filters:
+        if args.get(name):
+            query = query.filter(getattr(model, name).in_(_ids(name, args[name])))
+    if time_column and (args.get('from') or args.get('to')):
+        column = getattr(model, time_column)
+        if args.get('from'):
+            query = query.filter(column >= _moment(args['from']))
+        if args.get('to'):
+            query = query.filter(column < _moment(args['to'], end=True))
+
+    key, pk = getattr(model, sort), model.id
+    if sort != 'id':
+        query = query.filter(key != None)   # rows without a value have no place in the order
+
+    if args.get('after'):
+        cursor_sort, cursor_order, value, last_id = _decode(args['after'])
+        if (cursor_sort, cursor_order) != (sort, order):
+            raise PaginationError("The cursor belongs to a different sort order")
+        if sort == 'id':
+            query = query.filter(pk > last_id if order == 'asc' else pk < last_id)
+        else:
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise PaginationError("Invalid cursor")
+            if order == 'asc':
+                query = query.filter(or_(key > value, and_(key == value, pk > last_id)))
+            else:
+                query = query.filter(or_(key < value, and_(key == value, pk < last_id)))
+
+    columns = (pk,) if sort == 'id' else (key, pk)
+    query = query.order_by(None).order_by(*(column.asc() if order == 'asc' else column.desc() for column in columns))
+
+    rows = query.limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = _encode([sort, order, getattr(last, sort) if sort != 'id' else None, last.id])
+    return Page(items, limit, next_cursor)
+
+
+def chunks(query, model, args: Mapping[str, str], time_column: Optional[str] = None,
+           filters: Iterable[str] = (), size: Optional[int] = None) -> Iterator[List[Any]]:
+    """
+    Every row the listing matches (from `after` on, if given), `size` rows at a time.
+
+    Each chunk is a keyset page of its own, so only one chunk is in memory however
+    large the table is. Chunked queries rather than Query.yield_per: on MySQL that
+    streams through a server-side cursor, and the connection cannot run the
+    eager loads for each batch until the cursor is exhausted.
+    The first chunk is fetched on the first next(), which raises PaginationError for bad arguments.
+    """
+    size = size or app.config.get('API_STREAM_CHUNK_SIZE', 500)
+    args = dict(args.items())
+    while True:
+        page = paginate(query, model, args, time_column=time_column, filters=filters, limit=size)
+        if page.items:
+            yield page.items
+        if page.next is None:
+            return
+        args['after'] = page.next
@@ -0,0 +1,111 @@
+from functools import lru_cache
+from typing import Mapping, Optional, Set, Tuple
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from data.serializers import relation_paths
+
+
+@lru_cache(maxsize=None)
+def expandable(model) -> Tuple[str, ...]:
+    """Relationships the model's API serializer embeds, as dotted paths."""
+    return relation_paths(model, 'api')
+
+
+class ProjectionError(ValueError):
+    """An ?expand= path the endpoint cannot embed."""
+
+
+def _paths(value: Optional[str]) -> Optional[Set[str]]:
+    if value is None:
+        return None
+    return {path.strip() for path in value.split(',') if path.strip()}
+
+
+class Projection:
+    """
+    Which keys and embedded relationships a serialized response keeps.
+
+      fields=id,start_time,status.status   keys to keep; dotted paths reach into embedded
+                                           objects, naming an embedded object keeps all of it
+      expand=status,customer.account       relationships to embed (default: all of them)
+
+    The serializers (data.serializers) compile a variant per projection and the
+    query is built with options(), so a relationship that is not returned is
+    never loaded either.
+    """
+
+    def __init__(self, fields: Optional[Set[str]] = None, expand: Optional[Set[str]] = None, prefix: str = ''):
+        self.fields = fields
+        self.expand = expand        # None embeds everything the serializer embeds
+        self.prefix = prefix
+
+    @classmethod
+    def from_args(cls, model, args: Mapping[str, str]) -> 'Projection':
+        expand = _paths(args.get('expand'))
+        if expand is not None:
+            paths = set(expandable(model))
+            unknown = sorted(expand - paths)
+            if unknown:
+                raise ProjectionError(f"Cannot expand {', '.join(unknown)}"
+                                      + (f"; choose from {', '.join(sorted(paths))}" if paths else ''))
+            # naming customer.account embeds the customer too
+            expand = expand | {path.rsplit('.', 1)[0] for path in expand if '.' in path}
+        return cls(_paths(args.get('fields')), expand)
+
+    @property
+    def key(self) -> tuple:
+        """Hashable identity, for caching what is compiled from a projection."""
+        return (frozenset(self.fields) if self.fields is not None else None,
+                frozenset(self.expand) if self.expand is not None else None, self.prefix)
+
+    def _keys(self) -> Optional[Set[str]]:
+        """Keys kept at this level, None for all of them."""
+        if self.fields is None:
+            return None
+        if self.prefix:
+            parts = self.prefix.split('.')
+            if any('.'.join(parts[:n]) in self.fields for n in range(1, len(parts) + 1)):
+                return None
+            head = self.prefix + '.'
+            return {path[len(head):].split('.')[0] for path in self.fields if path.startswith(head)}
+        return {path.split('.')[0] for path in self.fields}
+
+    def _path(self, key: str) -> str:
+        return f'{self.prefix}.{key}' if self.prefix else key
+
+    def includes(self, key: str) -> bool:
+        keys = self._keys()
+        return keys is None or key in keys
+
+    def embeds(self, key: str) -> bool:
+        """Whether the `key` relationship is expanded and asked for."""
+        return self.includes(key) and (self.expand is None or self._path(key) in self.expand)
+
+    def child(self, key: str) -> 'Projection':
+        return Projection(self.fields, self.expand, self._path(key))
+
+    def options(self, model) -> Tuple:
+        """
+        Loader options for the relationships this projection returns: joined for
+        many-to-one, one SELECT ... IN per collection, nothing for the rest.
+        """
+        options = []
+        for path in sorted(expandable(model)):
+            if self.expand is not None and path not in self.expand:
+                continue
+            parts = path.split('.')
+            if not all(Projection(self.fields, None, '.'.join(parts[:n])).includes(part)
+                       for n, part in enumerate(parts)):
+                continue
+            loader, entity = None, model
+            for part in parts:
+                attribute = getattr(entity, part)
+                strategy = selectinload if attribute.property.uselist else joinedload
+                loader = strategy(attribute) if loader is None else getattr(loader, strategy.__name__)(attribute)
+                entity = attribute.property.mapper.class_
+            options.append(loader)
+        return tuple(options)
+
+
+EVERYTHING = Projection()
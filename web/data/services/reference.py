@@ -0,0 +1,157 @@
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from data import app, db
+from data.models import Bays, Roles, Services, Status
+from data.services.table_version import TableVersion
+
+# statuses the booking code moves appointments through, by Status.status
+PENDING = 'Pending'
+IN_QUEUE = 'In Queue'
+NOW_SERVING = 'Now Serving'
+COMPLETED = 'Completed'
+CANCELLED = 'Cancelled'
+
+
+class StatusRow(NamedTuple):
+    id: int
+    status: str
+
+
+class ServiceRow(NamedTuple):
+    id: int
+    name: str
+    description: str
+    price: Decimal
+    duration: int                   # minutes
+    washers_needed: int
+    type: Optional[str]             # the vehicle type the service is priced for
+
+
+class BayRow(NamedTuple):
+    id: int
+    bay: str
+
+
+class RoleRow(NamedTuple):
+    id: int
+    role: str
+
+
+class ReferenceRegistry:
+    """
+    Statuses, services, bays and roles held in memory as immutable rows, so the
+    booking code resolves "In Queue" or the service for a vehicle type without a query.
+
+    The registry is reloaded when the TableVersion stamp of one of its tables
+    changes: at once after a commit in this process, and within
+    REFERENCE_VERSION_TTL seconds of a commit made by another one.
+    """
+
+    _current: Optional['ReferenceRegistry'] = None
+    _stamp = None
+
+    MODELS = (Status, Services, Bays, Roles)
+
+    def __init__(self, statuses: List[StatusRow], services: List[ServiceRow], bays: List[BayRow],
+                 roles: List[RoleRow]):
+        self.statuses = tuple(sorted(statuses))
+        self.services = tuple(sorted(services))
+        self.bays = tuple(sorted(bays))
+        self.roles = tuple(sorted(roles))
+
+        self._status_ids: Dict[int, StatusRow] = {s.id: s for s in self.statuses}
+        self._services: Dict[int, ServiceRow] = {s.id: s for s in self.services}
+        self._bays: Dict[int, BayRow] = {b.id: b for b in self.bays}
+        # lowest id wins on duplicate names, like the .first() lookups did
+        self._status_names: Dict[str, StatusRow] = {}
+        for s in self.statuses:
+            self._status_names.setdefault((s.status or '').strip().lower(), s)
+        self._vehicle_services: Dict[str, ServiceRow] = {}
+        for s in self.services:
+            if s.type:
+                self._vehicle_services.setdefault(s.type.strip().lower(), s)
+
+    @classmethod
+    def load(cls) -> 'ReferenceRegistry':
+        return cls(
+            [StatusRow(*row) for row in db.session.query(Status.id, Status.status)],
+            [ServiceRow(*row) for row in db.session.query(
+                Services.id, Services.name, Services.description, Services.price, Services.duration,
+                db.func.coalesce(Services.washers_needed, 1), Services.type)],
+            [BayRow(*row) for row in db.session.query(Bays.id, Bays.bay)],
+            [RoleRow(*row) for row in db.session.query(Roles.id, Roles.role)],
+        )
+
+    @classmethod
+    def current(cls) -> 'ReferenceRegistry':
+        """The loaded registry, reloaded when one of its tables has changed."""
+        stamp = tuple(TableVersion.get(model)[0] for model in cls.MODELS)
+        if cls._current is None or cls._stamp != stamp:
+            cls._current = cls.load()
+            cls._stamp = stamp
+        return cls._current
+
+    @classmethod
+    def invalidate(cls):
+        cls._current = None
+        cls._stamp = None
+
+    # =============================================================
+    # STATUS
+    # =============================================================
+    def status(self, name: str) -> Optional[StatusRow]:
+        """The status called `name` (case-insensitive)."""
+        return self._status_names.get(name.strip().lower())
+
+    def status_id(self, name: str) -> int:
+        """Id of the status called `name`; LookupError when the table has no such row."""
+        status = self.status(name)
+        if status is None:
+            raise LookupError(f"Missing '{name}' status record in database.")
+        return status.id
+
+    def status_ids(self, *names: str) -> Tuple[int, ...]:
+        """Ids of the statuses that exist among `names`."""
+        return tuple(s.id for s in map(self.status, names) if s is not None)
+
+    def status_by_id(self, status_id: int) -> Optional[StatusRow]:
+        return self._status_ids.get(status_id)
+
+    # =============================================================
+    # SERVICES
+    # =============================================================
+    def service(self, service_id) -> Optional[ServiceRow]:
+        try:
+            return self._services.get(int(service_id))
+        except (TypeError, ValueError):
+            return None
+
+    def service_for_vehicle(self, vehicle_type: Optional[str]) -> Optional[ServiceRow]:
+        """
+        The default service for a vehicle type: the first service priced for that
+        type, else the first "bike" service for motorcycles and bikes and the
+        first "car" service for everything else.
+        """
+        vehicle_type = (vehicle_type or '').strip().lower()
+        service = self._vehicle_services.get(vehicle_type)
+        if service:
+            return service
+        keyword = 'bike' if 'motor' in vehicle_type or 'bike' in vehicle_type else 'car'
+        return next((s for s in self.services if keyword in (s.name or '').lower()), None)
+
+    # =============================================================
+    # BAYS
+    # =============================================================
+    def bay(self, bay_id: int) -> Optional[BayRow]:
+        return self._bays.get(bay_id)
+
+
+@app.before_first_request
+def _load_references():
+    try:
+        ReferenceRegistry.current()
+    except Exception:
+        # no tables yet (e.g. before `python manage.py generate`); loaded on first use instead
+        app.logger.exception("Could not load the reference registry")
+        db.session.rollback()
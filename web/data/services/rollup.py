@@ -0,0 +1,259 @@
+import argparse
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import attributes
+
+from data import app, db
+from data.models import Appointments, DailyRollups, Feedbacks, Payments, washers
+
+# appointment status id -> rollup column (ids as seeded in populate.py)
+STATUS_COLUMNS = {1: 'pending', 2: 'in_queue', 3: 'now_serving', 4: 'completed', 5: 'cancelled'}
+CANCELLED_STATUS_ID = 5
+METHOD_COLUMNS = {'cash': 'revenue_cash', 'gcash': 'revenue_gcash', 'xendit': 'revenue_xendit'}
+
+# session.info key for days this transaction has flagged stale
+_PENDING = 'rollup_stale_days'
+
+COUNTERS = (
+    'appointments', 'pending', 'in_queue', 'now_serving', 'completed', 'cancelled', 'payments',
+    'revenue', 'revenue_cash', 'revenue_gcash', 'revenue_xendit', 'rating_sum', 'rating_count',
+    'bay_minutes', 'washer_minutes',
+)
+
+
+def _bounds(first: date, last: date) -> Tuple[datetime, datetime]:
+    return datetime.combine(first, time.min), datetime.combine(last + timedelta(days=1), time.min)
+
+
+def _as_date(value) -> date:
+    """date() comes back as a string on SQLite and as a date on MySQL."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _runs(days: List[date]) -> List[Tuple[date, date]]:
+    """Sorted days as (first, last) runs of consecutive days."""
+    runs = []
+    for day in days:
+        if runs and day == runs[-1][1] + timedelta(days=1):
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+
+class Rollup:
+    """
+    One summary row per day in `daily_rollups`: appointments by status, revenue by
+    payment method, ratings and bay/washer minutes booked.
+
+    Commits that touch a day's appointments, payments or feedbacks flag its row
+    stale in the same transaction. Readers recompute stale and missing days before
+    answering, a few grouped queries for the whole batch, and write them back in a
+    session of their own, so a read never commits the caller's transaction.
+    Dashboards and monthly reports read one row per day instead of the
+    transactional tables. `python manage.py rollup` does the same ahead of time.
+    """
+
+    def compute(first: date, last: date, session=None) -> Dict[date, Dict[str, float]]:
+        """Aggregate the days in [first, last] from the transactional tables."""
+        session = session or db.session
+        start, end = _bounds(first, last)
+        days = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+
+        day = db.func.date(Appointments.start_time)
+        for key, status_id, count in (session.query(day, Appointments.status_id, db.func.count(Appointments.id))
+                                      .filter(Appointments.start_time >= start, Appointments.start_time < end)
+                                      .group_by(day, Appointments.status_id)):
+            row = days[_as_date(key)]
+            row['appointments'] += count
+            if status_id in STATUS_COLUMNS:
+                row[STATUS_COLUMNS[status_id]] += count
+
+        day = db.func.date(Payments.created_at)
+        for key, method, amount, count in (session.query(day, Payments.method, db.func.sum(Payments.amount), db.func.count(Payments.id))
+                                           .filter(Payments.created_at >= start, Payments.created_at < end)
+                                           .group_by(day, Payments.method)):
+            row = days[_as_date(key)]
+            row['payments'] += count
+            row['revenue'] += amount or 0
+            if method in METHOD_COLUMNS:
+                row[METHOD_COLUMNS[method]] += amount or 0
+
+        day = db.func.date(Feedbacks.created_at)
+        for key, rating_sum, rating_count in (session.query(day, db.func.sum(Feedbacks.rating), db.func.count(Feedbacks.rating))
+                                              .filter(Feedbacks.created_at >= start, Feedbacks.created_at < end)
+                                              .group_by(day)):
+            row = days[_as_date(key)]
+            row['rating_sum'] += int(rating_sum or 0)
+            row['rating_count'] += rating_count
+
+        # minutes go to the day the appointment starts on
+        seen = set()
+        for appointment_id, start_time, end_time, staff_id in (
+                session.query(Appointments.id, Appointments.start_time, Appointments.end_time, washers.c.staff_id)
+                .outerjoin(washers, washers.c.appointment_id == Appointments.id)
+                .filter(Appointments.start_time >= start, Appointments.start_time < end,
+                        Appointments.end_time != None, Appointments.status_id != CANCELLED_STATUS_ID)):
+            minutes = max(int((end_time - start_time).total_seconds() // 60), 0)
+            row = days[start_time.date()]
+            if appointment_id not in seen:
+                seen.add(appointment_id)
+                row['bay_minutes'] += minutes
+            if staff_id is not None:
+                row['washer_minutes'] += minutes
+
+        return days
+
+    def refresh(days: Iterable[date], session=None) -> Dict[date, DailyRollups]:
+        """Recompute and commit the rows for `days` in `session` (default db.session). Returns them by day."""
+        session = session or db.session
+        days = sorted(set(days))
+        if not days:
+            return {}
+        # lock the existing rows first, so a commit flagging one of them stale
+        # while we compute waits for us and flags it again afterwards
+        existing = {row.day: row for row in session.query(DailyRollups).filter(DailyRollups.day.in_(days)).with_for_update()}
+        values = {}
+        for first, last in _runs(days):
+            values.update(Rollup.compute(first, last, session))
+
+        now = datetime.now()
+        empty = dict.fromkeys(COUNTERS, 0)
+        for day in days:
+            row = existing.get(day)
+            if row is None:
+                row = existing[day] = DailyRollups(day=day)
+                session.add(row)
+            for column, value in values.get(day, empty).items():
+                setattr(row, column, value)
+            row.is_stale = False
+            row.refreshed_at = now
+        session.commit()
+        return existing
+
+    def mark_stale(days: Iterable[date], session=None) -> None:
+        """Flag the rows for `days` stale in the current transaction. Missing rows count as stale anyway."""
+        session = session or db.session
+        days = sorted(set(days))
+        if days:
+            table = DailyRollups.__table__
+            session.execute(table.update().where(table.c.day.in_(days)).values(is_stale=True))
+            session.info.setdefault(_PENDING, set()).update(days)
+
+    def get(first: date, last: date, refresh: bool = True) -> List[DailyRollups]:
+        """
+        Rows for every day in [first, last], recomputing stale and missing ones first.
+
+        The recomputed rows are committed in a separate session. Days the caller's
+        own transaction has flagged stale hold row locks that session would wait on,
+        so those are computed into unsaved rows for this answer instead.
+        """
+        rows = {row.day: row for row in
+                DailyRollups.query.filter(DailyRollups.day >= first, DailyRollups.day <= last).populate_existing()}
+        if refresh:
+            todo = [first + timedelta(days=n) for n in range((last - first).days + 1)]
+            todo = [day for day in todo if day not in rows or rows[day].is_stale]
+            pending = db.session.info.get(_PENDING, set())
+            mine = [day for day in todo if day in pending]
+            for first_day, last_day in _runs(mine):
+                values = Rollup.compute(first_day, last_day)
+                for n in range((last_day - first_day).days + 1):
+                    day = first_day + timedelta(days=n)
+                    rows[day] = DailyRollups(day=day, is_stale=True, **values.get(day, dict.fromkeys(COUNTERS, 0)))
+            todo = [day for day in todo if day not in pending]
+            if todo:
+                session = db.create_session({'expire_on_commit': False})()
+                try:
+                    rows.update(Rollup.refresh(todo, session))
+                finally:
+                    session.close()
+        return [rows[day] for day in sorted(rows)]
+
+    def totals(rows: Iterable[DailyRollups]) -> Dict:
+        """The rows added up, with the same keys as DailyRollups.to_json."""
+        totals = dict.fromkeys(COUNTERS, 0)
+        for row in rows:
+            for column in COUNTERS:
+                totals[column] += getattr(row, column) or 0
+        for column in ('revenue', 'revenue_cash', 'revenue_gcash', 'revenue_xendit'):
+            totals[column] = float(totals[column])
+        totals['average_rating'] = totals['rating_sum'] / totals['rating_count'] if totals['rating_count'] else 0.0
+        return totals
+
+    def summary(first: date, last: date) -> Dict:
+        """Totals over the days in [first, last]."""
+        return {'from': first.isoformat(), 'to': last.isoformat(), **Rollup.totals(Rollup.get(first, last))}
+
+
+def _start_day(obj, previous: bool) -> Optional[date]:
+    history = attributes.get_history(obj, 'start_time')
+    values = history.unchanged or (history.deleted if previous else history.added)
+    return values[0].date() if values and isinstance(values[0], datetime) else None
+
+
+@event.listens_for(db.session, 'before_flush')
+def _flag_stale_rollups(session, flush_context, instances):
+    days = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, (Appointments, Payments, Feedbacks)):
+            continue
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, Appointments):
+            days.update(day for day in (_start_day(obj, True), _start_day(obj, False)) if day)
+        else:
+            # created_at is filled in by the database on insert
+            days.add((obj.created_at or datetime.now()).date())
+    if days:
+        Rollup.mark_stale(days, session)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _forget_stale_rollups(session):
+    session.info.pop(_PENDING, None)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_stale_rollups(session, previous_transaction):
+    session.info.pop(_PENDING, None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Refresh the daily rollups.')
+    parser.add_argument('--from', dest='date_from', type=date.fromisoformat, default=None,
+                        help='first day, YYYY-MM-DD (default 35 days ago)')
+    parser.add_argument('--to', dest='date_to', type=date.fromisoformat, default=None,
+                        help='last day, YYYY-MM-DD (default a week from today)')
+    parser.add_argument('--all', action='store_true', help='start from the first appointment or payment on record')
+    parser.add_argument('--force', action='store_true', help='recompute every day in the range, not only stale ones')
+    parser.add_argument('--database-uri', default=None, help='override SQLALCHEMY_DATABASE_URI')
+    args = parser.parse_args(argv)
+
+    if args.database_uri:
+        app.config['SQLALCHEMY_DATABASE_URI'] = args.database_uri
+
+    with app.app_context():
+        today = date.today()
+        first = args.date_from or today - timedelta(days=35)
+        last = args.date_to or today + timedelta(days=7)
+        if args.all:
+            earliest = [value for value in (db.session.query(db.func.min(Appointments.start_time)).scalar(),
+                                            db.session.query(db.func.min(Payments.created_at)).scalar()) if value]
+            if earliest:
+                first = min(earliest).date()
+
+        days = [first + timedelta(days=n) for n in range((last - first).days + 1)]
+        if not args.force:
+            fresh = {day for day, in db.session.query(DailyRollups.day)
+                     .filter(DailyRollups.day >= first, DailyRollups.day <= last, DailyRollups.is_stale == False)}
+            days = [day for day in days if day not in fresh]
+        # a month per transaction keeps the row locks short
+        written = sum(len(Rollup.refresh(days[n:n + 31])) for n in range(0, len(days), 31))
+        print(f"Refreshed {written} daily rollups between {first} and {last}")
@@ -0,0 +1,168 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from data.models import Schedules
+from data.services.table_version import TableVersion
+
+DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+DAY_MINUTES = 24 * 60
+WEEK_MINUTES = 7 * DAY_MINUTES
+
+
+def _minute_of_week(moment: datetime) -> int:
+    return moment.weekday() * DAY_MINUTES + moment.hour * 60 + moment.minute
+
+
+def _week_start(moment: datetime) -> datetime:
+    return datetime.combine(moment.date() - timedelta(days=moment.weekday()), time.min)
+
+
+class Roster:
+    """
+    Weekly shift timeline compiled from Schedules.
+
+    Every schedule becomes an interval in minutes of the week (Monday 00:00 = 0).
+    Shifts that end before they start run past midnight, and a 23:59 end means
+    the end of the day, so the seed data's Evening shift runs straight into a
+    Night shift that starts at 00:00. Each staff member's intervals are merged
+    and sorted, so "is this washer on shift from T for the next D minutes" is a
+    single bisect.
+    """
+
+    _current: Optional['Roster'] = None
+    _stamp = None
+
+    def __init__(self, schedules: Iterable[Tuple[int, int, str, time, time, str]]):
+        # staff_id -> sorted [(start, end, label)] straight from the schedules
+        self._shifts: Dict[int, List[Tuple[int, int, str]]] = defaultdict(list)
+        # staff_id -> merged [(start, end)] and their starts, for coverage lookups
+        self._merged: Dict[int, List[Tuple[int, int]]] = {}
+        self._starts: Dict[int, List[int]] = {}
+        # (staff_id, 'monday') -> Schedules.shift label
+        self._labels: Dict[Tuple[int, str], str] = {}
+
+        for staff_id, day, shift_start, shift_end, label in schedules:
+            if not day or day.lower() not in DAYS or shift_start is None or shift_end is None:
+                continue
+            base = DAYS.index(day.lower()) * DAY_MINUTES
+            start = base + shift_start.hour * 60 + shift_start.minute
+            end = base + shift_end.hour * 60 + shift_end.minute
+            if shift_end >= time(23, 59):
+                end = base + DAY_MINUTES
+            elif end <= start:
+                end += DAY_MINUTES  # overnight shift
+            self._shifts[staff_id].append((start, end, label))
+            self._labels[(staff_id, day.lower())] = label
+
+        for staff_id, shifts in self._shifts.items():
+            shifts.sort()
+            merged = []
+            for start, end, _ in shifts:
+                # the Sunday night shift spills over into Monday morning
+                pieces = [(start, end)] if end <= WEEK_MINUTES else [(start, WEEK_MINUTES), (0, end - WEEK_MINUTES)]
+                for piece in pieces:
+                    merged.append(piece)
+            merged.sort()
+            compact = []
+            for start, end in merged:
+                if compact and start <= compact[-1][1] + 1:
+                    compact[-1] = (compact[-1][0], max(compact[-1][1], end))
+                else:
+                    compact.append((start, end))
+            self._merged[staff_id] = compact
+            self._starts[staff_id] = [start for start, _ in compact]
+
+    @classmethod
+    def compile(cls) -> 'Roster':
+        rows = Schedules.query.all()
+        return cls((s.staff_id, s.day, s.shift_start, s.shift_end, s.shift) for s in rows
+                   if s.shift_start is not None and s.shift_end is not None)
+
+    @classmethod
+    def current(cls) -> 'Roster':
+        """
+        The compiled roster, recompiled when the schedules' TableVersion stamp
+        changes: at once after a commit in this process, and within
+        REFERENCE_VERSION_TTL seconds of a commit made by another one.
+        """
+        stamp = TableVersion.get(Schedules)[0]
+        if cls._current is None or cls._stamp != stamp:
+            cls._current = cls.compile()
+            cls._stamp = stamp
+        return cls._current
+
+    @classmethod
+    def invalidate(cls):
+        cls._current = None
+        cls._stamp = None
+
+    def _covers(self, staff_id: int, start: int, end: int) -> bool:
+        starts = self._starts.get(staff_id)
+        if not starts:
+            return False
+        k = bisect_right(starts, start) - 1
+        if k < 0:
+            return False
+        shift_start, shift_end = self._merged[staff_id][k]
+        if end <= shift_end:
+            return True
+        # runs past Sunday midnight: continue in Monday's intervals
+        if shift_end == WEEK_MINUTES and end > WEEK_MINUTES:
+            return self._covers(staff_id, 0, end - WEEK_MINUTES)
+        return False
+
+    def covers(self, staff_id: int, start: datetime, minutes: int = 0) -> bool:
+        """True if the staff member is on shift from `start` through `start + minutes`."""
+        if minutes >= WEEK_MINUTES:
+            return False
+        t = _minute_of_week(start)
+        return self._covers(staff_id, t, t + minutes)
+
+    def on_shift(self, start: datetime, minutes: int = 0, staff_ids: Optional[Iterable[int]] = None) -> List[int]:
+        """Staff ids on shift from `start` through `start + minutes`."""
+        ids = self._merged.keys() if staff_ids is None else staff_ids
+        return [staff_id for staff_id in ids if self.covers(staff_id, start, minutes)]
+
+    def current_shift(self, staff_id: int, moment: datetime) -> Optional[Tuple[datetime, datetime, str]]:
+        """The (start, end, label) of the schedule the staff member is working at `moment`."""
+        t = _minute_of_week(moment)
+        week = _week_start(moment)
+        for offset in (0, WEEK_MINUTES):
+            for start, end, label in self._shifts.get(staff_id, ()):
+                if start - offset <= t <= end - offset:
+                    begin = week + timedelta(minutes=start - offset)
+                    return begin, week + timedelta(minutes=end - offset), label
+        return None
+
+    def shift_starts(self, window_start: datetime, window_end: datetime, staff_ids: Optional[Iterable[int]] = None) -> List[datetime]:
+        """Moments in [window_start, window_end) at which a staff member's continuous shift begins."""
+        ids = self._merged.keys() if staff_ids is None else staff_ids
+        moments = set()
+        week = _week_start(window_start)
+        while week < window_end:
+            for staff_id in ids:
+                for start, _ in self._merged.get(staff_id, ()):
+                    moment = week + timedelta(minutes=start)
+                    if window_start <= moment < window_end:
+                        moments.add(moment)
+            week += timedelta(days=7)
+        return sorted(moments)
+
+    def label(self, staff_id: int, day: str) -> Optional[str]:
+        """The shift label ('08:00 AM - 04:00 PM') for a staff member on a weekday name."""
+        return self._labels.get((staff_id, (day or '').lower()))
+
+    def shift_minutes(self, staff_id: int, window_start: datetime, window_end: datetime) -> List[Tuple[datetime, datetime]]:
+        """The staff member's merged on-shift intervals clipped to the window."""
+        intervals = []
+        week = _week_start(window_start)
+        while week < window_end:
+            for start, end in self._merged.get(staff_id, ()):
+                begin = max(week + timedelta(minutes=start), window_start)
+                finish = min(week + timedelta(minutes=end), window_end)
+                if begin < finish:
+                    intervals.append((begin, finish))
+            week += timedelta(days=7)
+        return intervals
@@ -1,12 +1,15 @@
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, time
+from typing import List, Optional
 from sqlalchemy import and_
+from sqlalchemy.orm import joinedload
 from data import db 
 from data.models import  (
     Accounts, Customers, Staffs, Appointments, Payments, Services,
     Vehicles, Bays, Roles, Status, Notifications, Feedbacks, Loyalties,
     Schedules
 )
+from data.services.reference import ReferenceRegistry
+from data.services.roster import Roster
 
 class Staff:
 
@@ -21,9 +24,14 @@ class Staff:
         schedules = Schedules.query.order_by(Schedules.day.asc(), Schedules.shift_start.asc()).all()
         return schedules
 
-    def get_staff_appointments(staff_id: int) -> Optional[Appointments]:
-        """Return staff appointments or None."""
-        return Staffs.query.filter_by(id=staff_id).first().appointments
+    def get_staff_appointments(staff_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Optional[List[Appointments]]:
+        """Return staff appointments (starting in [start, end) when given) or None."""
+        staff = Staffs.query.get(staff_id)
+        if not staff:
+            return None
+        if start is None and end is None:
+            return staff.appointments
+        return staff.appointments_between(start or datetime.min, end)
     
     
     def get_staffs_on_duty() -> list:
@@ -33,34 +41,29 @@ class Staff:
         """
 
         now = datetime.now()
-        current_day = now.strftime('%A')   # e.g., 'Monday'
-        current_time = now.time()
-
-        # Query all schedules for today whose time range includes the current time
-        active_schedules = (
-            Schedules.query
-            .join(Staffs)
-            .filter(
-                db.func.lower(Schedules.day) == current_day.lower(),
-                and_(
-                    Schedules.shift_start <= current_time,
-                    Schedules.shift_end >= current_time
-                )
-            )
-            .order_by(Schedules.shift_start.asc())  # Sort by earliest shift first
+        roster = Roster.current()
+
+        # Shifts that started yesterday evening and run past midnight count too
+        on_duty = {staff_id: roster.current_shift(staff_id, now) for staff_id in roster.on_shift(now)}
+        on_duty = {staff_id: shift for staff_id, shift in on_duty.items() if shift}
+        staffs = (
+            Staffs.query
+            .options(joinedload(Staffs.account))
+            .filter(Staffs.id.in_(on_duty))
             .all()
-        )
+        ) if on_duty else []
+        staffs.sort(key=lambda staff: on_duty[staff.id][0])  # Sort by earliest shift first
 
         # Return structured list of staff info
         staffs_on_duty = [
             {
-                "staff_id": sched.staff.id,
-                "full_name": sched.staff.account.full_name,
-                "shift": sched.shift,
-                "is_front_desk": "Yes" if sched.staff.is_front_desk else "No",
-                "is_on_shift": "Yes" if sched.staff.is_on_shift else "No",
+                "staff_id": staff.id,
+                "full_name": staff.account.full_name,
+                "shift": on_duty[staff.id][2],
+                "is_front_desk": "Yes" if staff.is_front_desk else "No",
+                "is_on_shift": "Yes" if staff.is_on_shift else "No",
             }
-            for sched in active_schedules
+            for staff in staffs
         ]
 
         return staffs_on_duty
@@ -81,7 +84,8 @@ class Staff:
         days_of_week = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
         table = []
 
-        staffs = Staffs.query.all()  # fetch all staff
+        roster = Roster.current()
+        staffs = Staffs.query.options(joinedload(Staffs.account)).all()  # fetch all staff
 
         for staff in staffs:
             row = {
@@ -89,8 +93,7 @@ class Staff:
                 'staff_name': staff.account.full_name
             }
             for day in days_of_week:
-                schedule = next((s for s in staff.schedules if s.day.lower() == day.lower()), None)
-                row[day] = schedule.shift if schedule else None
+                row[day] = roster.label(staff.id, day)
             table.append(row)
 
         return table
@@ -107,25 +110,18 @@ class Staff:
 
         # Get staff record
         staff = Staffs.query.get(staff_id)
-        print(staff.account.full_name)
         if not staff:
             return {"columns": [], "rows": []}
 
         # Get all bays
-        bays = Bays.query.all()
+        bays = ReferenceRegistry.current().bays
         bay_names = [bay.bay for bay in bays]
 
-        # Filter staff's appointments (today and upcoming only)
-        staff_appointments = [
-            appt for appt in staff.appointments
-            if appt.start_time and appt.start_time.day == now.day
-        ]
+        # Staff's appointments (today and upcoming only), already sorted by start time
+        staff_appointments = staff.appointments_between(datetime.combine(now.date(), time.min))
         if not staff_appointments:
             return {"columns": bay_names, "rows": []}
 
-        # Sort by start time
-        staff_appointments.sort(key=lambda a: a.start_time)
-
         # Group appointments by start_time
         grouped_by_time = {}
         for appt in staff_appointments:
@@ -162,18 +158,16 @@ class Staff:
         """
         now = datetime.now()
 
-        bays = Bays.query.all()
+        bays = ReferenceRegistry.current().bays
         bay_names = [bay.bay for bay in bays]
 
-        # Collect all appointments across all bays (today + upcoming)
-        all_appointments = []
-        for bay in bays:
-            for appt in bay.appointments:
-                if appt.start_time and appt.start_time.day == now.day:
-                    all_appointments.append(appt)
-
-        # Sort all appointments by start time
-        all_appointments.sort(key=lambda a: a.start_time)
+        # Collect all appointments across all bays (today + upcoming), sorted by start time
+        all_appointments = (
+            Appointments.query
+            .filter(Appointments.start_time >= datetime.combine(now.date(), time.min))
+            .order_by(Appointments.start_time)
+            .all()
+        )
 
         # Group appointments by their exact start time
         grouped_by_time = {}
@@ -244,4 +238,5 @@ class Staff:
                 shift_end=shift_end
             )
             db.session.add(new_schedule)
-        db.session.commit()
\ No newline at end of file
+        db.session.commit()
+        Roster.invalidate()
\ No newline at end of file
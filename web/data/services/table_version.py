@@ -0,0 +1,152 @@
+import hashlib
+import threading
+import time as clock
+from datetime import datetime
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+
+from data import app, db
+from data.models import Bays, Roles, Schedules, Services, Status, TableVersions
+
+# session.info key for tracked tables whose counter this transaction has bumped
+_PENDING = 'table_version_models'
+
+# reference tables whose listings are served with ETag / Last-Modified, or that in-memory caches are built from.
+# Only tables that bookings do not write: every bump updates one shared row per table.
+TRACKED = (Services, Bays, Roles, Status, Schedules)
+
+
+class TableVersion:
+    """
+    A version stamp per table for conditional GETs: a counter in `table_versions`
+    bumped by every transaction that inserts, updates or deletes rows of the
+    table, so it commits or rolls back with them and reads the same in every
+    worker process. (Row count and max(updated_at) missed a second edit within
+    the same second.)
+
+    Stamps are kept for REFERENCE_VERSION_TTL seconds, so repeat polls are answered
+    without touching the database. Commits in this process that touch the table
+    drop its stamp at once; commits made by other processes show up when it expires.
+
+    Data derived from busy tables, like the distinct vehicle types, is kept with
+    value() instead and versioned by its own content.
+    """
+
+    _stamps: Dict[type, Tuple[float, str, Optional[datetime]]] = {}
+    _values: Dict[Hashable, Tuple[float, object]] = {}
+    # bumped by every drop, so a stamp computed across a commit is not stored
+    _generations: Dict[Hashable, int] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get(model) -> Tuple[str, Optional[datetime]]:
+        """(version, last modified) for one table."""
+        with TableVersion._lock:
+            entry = TableVersion._stamps.get(model)
+            if entry and entry[0] > clock.monotonic():
+                return entry[1], entry[2]
+            generation = TableVersion._generations.get(model, 0)
+
+        row = (db.session.query(TableVersions.version, TableVersions.updated_at)
+               .filter(TableVersions.name == model.__tablename__)
+               .first())
+        counter, latest = row if row else (0, None)
+        version = str(counter)
+        latest = latest.replace(microsecond=0) if latest else None    # HTTP dates have whole seconds
+
+        with TableVersion._lock:
+            if generation == TableVersion._generations.get(model, 0):
+                ttl = app.config.get('REFERENCE_VERSION_TTL', 30)
+                TableVersion._stamps[model] = (clock.monotonic() + ttl, version, latest)
+        return version, latest
+
+    @staticmethod
+    def value(key: Hashable, compute: Callable[[], object]) -> object:
+        """
+        compute(), kept for REFERENCE_VERSION_TTL seconds under `key`. Pass the value
+        to etag() so the tag changes only when the value does, without a counter
+        every write to the tables behind it would have to bump.
+        """
+        with TableVersion._lock:
+            entry = TableVersion._values.get(key)
+            if entry and entry[0] > clock.monotonic():
+                return entry[1]
+            generation = TableVersion._generations.get(key, 0)
+
+        value = compute()
+
+        with TableVersion._lock:
+            if generation == TableVersion._generations.get(key, 0):
+                ttl = app.config.get('REFERENCE_VERSION_TTL', 30)
+                TableVersion._values[key] = (clock.monotonic() + ttl, value)
+        return value
+
+    @staticmethod
+    def etag(models: Iterable, *extra) -> Tuple[str, Optional[datetime]]:
+        """
+        An entity tag over several tables and anything else the response depends
+        on (e.g. the query string), and the latest of their modification times.
+        """
+        versions, modified = [], []
+        for model in models:
+            version, latest = TableVersion.get(model)
+            versions.append(f'{model.__tablename__}:{version}')
+            if latest:
+                modified.append(latest)
+        digest = hashlib.sha1('|'.join(versions + [str(value) for value in extra]).encode()).hexdigest()[:20]
+        return digest, max(modified) if modified else None
+
+    @staticmethod
+    def bump(models: Iterable, session=None) -> None:
+        """
+        Count a write to each table in the current transaction, once per transaction.
+        The flush hook calls this; bulk and Core inserts, which skip it, call it by hand.
+        """
+        session = session or db.session
+        bumped = session.info.setdefault(_PENDING, set())
+        table = TableVersions.__table__
+        # a fixed order, so two transactions bumping the same tables cannot deadlock
+        for model in sorted(set(models) - bumped, key=lambda m: m.__tablename__):
+            now = datetime.now()
+            result = session.execute(
+                table.update()
+                .where(table.c.name == model.__tablename__)
+                .values(version=table.c.version + 1, updated_at=now)
+            )
+            if not result.rowcount:
+                session.execute(table.insert().values(name=model.__tablename__, version=1, updated_at=now))
+            bumped.add(model)
+
+    @staticmethod
+    def invalidate(keys: Iterable[Hashable]) -> None:
+        """Drop the stamps of tracked tables and the values kept under other keys."""
+        with TableVersion._lock:
+            for key in keys:
+                TableVersion._generations[key] = TableVersion._generations.get(key, 0) + 1
+                TableVersion._stamps.pop(key, None)
+                TableVersion._values.pop(key, None)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _bump_table_versions(session, flush_context, instances):
+    touched = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, TRACKED):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            touched.add(type(obj))
+    if touched:
+        TableVersion.bump(touched, session)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_table_changes(session):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        TableVersion.invalidate(pending)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_table_changes(session, previous_transaction):
+    session.info.pop(_PENDING, None)
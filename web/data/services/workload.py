@@ -0,0 +1,130 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import attributes
+
+from data import db
+from data.models import Appointments, Workloads, washers
+
+# Appointments in these statuses no longer count towards a workload
+INACTIVE_STATUS_IDS = (4, 5)  # Completed or Cancelled
+
+
+def _state(appointment: Appointments, previous: bool) -> Tuple:
+    """(status_id, bay_id, start_time, staff_ids) before or after the pending flush."""
+
+    def scalar(key):
+        history = attributes.get_history(appointment, key)
+        if previous:
+            values = history.unchanged or history.deleted
+        else:
+            values = history.unchanged or history.added
+        return values[0] if values else None
+
+    def identifier(key):
+        # form and JSON paths assign ids as strings, e.g. status_id = '5'
+        value = scalar(key)
+        return int(value) if value not in (None, '') else None
+
+    history = attributes.get_history(appointment, 'staffs')
+    staffs = list(history.unchanged) + list(history.deleted if previous else history.added)
+    return identifier('status_id'), identifier('bay_id'), scalar('start_time'), [s.id for s in staffs if s.id]
+
+
+def _contributions(state: Tuple) -> Counter:
+    status_id, bay_id, start_time, staff_ids = state
+    counts = Counter()
+    if start_time is None or status_id in INACTIVE_STATUS_IDS:
+        return counts
+    day = start_time.date()
+    if bay_id:
+        counts[('bay', bay_id, day)] += 1
+    for staff_id in staff_ids:
+        counts[('staff', staff_id, day)] += 1
+    return counts
+
+
+class Workload:
+    """
+    Per-(bay or washer, day) appointment counters kept in the `workloads` table.
+
+    Counters are adjusted inside the same flush as the appointment change, so they
+    commit or roll back with it. Load balancing reads them instead of counting
+    appointment history.
+    """
+
+    def apply(deltas: Counter) -> None:
+        """Add `deltas` keyed by (entity, entity_id, day) to the counters."""
+        session = db.session
+        with session.no_autoflush:
+            for (entity, entity_id, day), delta in deltas.items():
+                if not delta:
+                    continue
+                row = Workloads.query.filter_by(entity=entity, entity_id=entity_id, day=day).first()
+                if row:
+                    row.appointments = Workloads.appointments + delta
+                else:
+                    session.add(Workloads(entity=entity, entity_id=entity_id, day=day, appointments=max(delta, 0)))
+
+    def get_counts(day_from: date, day_to: date) -> Dict[Tuple[str, int], Dict[date, int]]:
+        """Counters for days in [day_from, day_to] as {(entity, id): {day: count}}."""
+        counts = defaultdict(dict)
+        rows = (db.session.query(Workloads.entity, Workloads.entity_id, Workloads.day, Workloads.appointments)
+                .filter(Workloads.day >= day_from, Workloads.day <= day_to)
+                .all())
+        for entity, entity_id, day, appointments in rows:
+            counts[(entity, entity_id)][day] = appointments
+        return counts
+
+    def rebuild(day_from: Optional[date] = None, day_to: Optional[date] = None) -> int:
+        """
+        Recount the counters from the appointments table, e.g. after bulk inserts.
+        Without a range every day is rebuilt. Returns the number of counter rows written.
+        """
+        query = (db.session.query(Appointments.id, Appointments.bay_id, Appointments.start_time, washers.c.staff_id)
+                 .outerjoin(washers, washers.c.appointment_id == Appointments.id)
+                 .filter(Appointments.start_time != None, ~Appointments.status_id.in_(INACTIVE_STATUS_IDS)))
+        delete = Workloads.query
+        if day_from:
+            query = query.filter(Appointments.start_time >= datetime.combine(day_from, time.min))
+            delete = delete.filter(Workloads.day >= day_from)
+        if day_to:
+            query = query.filter(Appointments.start_time < datetime.combine(day_to + timedelta(days=1), time.min))
+            delete = delete.filter(Workloads.day <= day_to)
+
+        counts = Counter()
+        seen = set()
+        for appointment_id, bay_id, start_time, staff_id in query.all():
+            day = start_time.date()
+            if appointment_id not in seen:
+                seen.add(appointment_id)
+                counts[('bay', bay_id, day)] += 1
+            if staff_id is not None:
+                counts[('staff', staff_id, day)] += 1
+
+        delete.delete(synchronize_session=False)
+        db.session.bulk_insert_mappings(Workloads, [
+            {'entity': entity, 'entity_id': entity_id, 'day': day, 'appointments': count}
+            for (entity, entity_id, day), count in counts.items()
+        ])
+        db.session.commit()
+        return len(counts)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _track_workloads(session, flush_context, instances):
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Appointments):
+            deltas.update(_contributions(_state(obj, previous=False)))
+    for obj in session.dirty:
+        if isinstance(obj, Appointments) and session.is_modified(obj):
+            deltas.update(_contributions(_state(obj, previous=False)))
+            deltas.subtract(_contributions(_state(obj, previous=True)))
+    for obj in session.deleted:
+        if isinstance(obj, Appointments):
+            deltas.subtract(_contributions(_state(obj, previous=True)))
+    if any(deltas.values()):
+        Workload.apply(deltas)
@@ -0,0 +1,20 @@
+import sys
+
+from application import app
+from data import db
+
+COMMANDS = {
+    # python manage.py generate --help
+    'generate': 'data.seed.generate',
+    # python manage.py benchmark --help
+    'benchmark': 'benchmarks.run',
+    # python manage.py rollup --help
+    'rollup': 'data.services.rollup',
+}
+
+if __name__ == '__main__':
+    if sys.argv[1:2] and sys.argv[1] in COMMANDS:
+        from importlib import import_module
+        import_module(COMMANDS[sys.argv[1]]).main(sys.argv[2:])
+    else:
+        print(f"usage: python manage.py {{{','.join(COMMANDS)}}} [options]")
@@ -0,0 +1,46 @@
+"""
+Fixtures for the test suite: every test gets its own file-backed SQLite
+database seeded by Populate, and the in-process caches are emptied around it.
+
+    cd web
+    python -m pytest
+"""
+import logging
+
+import pytest
+
+from application import app
+from application.api import VEHICLE_TYPES
+from data import db
+from data.seed.populate import Populate
+from data.services.availability_cache import AvailabilityCache
+from data.services.dispatch import Dispatcher
+from data.services.reference import ReferenceRegistry
+from data.services.roster import Roster
+from data.services.table_version import TRACKED, TableVersion
+
+logging.disable(logging.WARNING)
+
+
+def reset_caches() -> None:
+    AvailabilityCache.invalidate()
+    TableVersion.invalidate(TRACKED + (VEHICLE_TYPES,))
+    ReferenceRegistry.invalidate()
+    Roster.invalidate()
+    Dispatcher._built_at = None
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A seeded SQLite database in a file, so several threads can share it."""
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'prodigy.sqlite'}"
+    try:
+        with app.app_context():
+            Populate.populate()
+            reset_caches()
+            yield db
+            db.session.remove()
+    finally:
+        reset_caches()
+        app.config['SQLALCHEMY_DATABASE_URI'] = uri
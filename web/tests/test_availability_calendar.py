@@ -0,0 +1,37 @@
+"""
+The calendar's one-pass hourly capacities agree with asking capacity_at()
+hour by hour, on both booking engines.
+"""
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from data.seed.generate import Generate
+from data.services.availability import Occupancy
+from data.services.occupancy_grid import OccupancyGrid
+from data.services.reference import ReferenceRegistry
+
+FIRST = date.today() - timedelta(days=3)
+LAST = FIRST + timedelta(days=9)
+
+
+@pytest.fixture
+def busy_shop(database):
+    Generate.generate(customers=150, months=1, per_day=100, bays=4, washers_count=10, seed=3)
+    ReferenceRegistry.invalidate()
+
+
+@pytest.mark.parametrize('engine', [Occupancy, OccupancyGrid])
+def test_hourly_capacity_matches_capacity_at(busy_shop, engine):
+    for service in ReferenceRegistry.current().services:
+        duration = timedelta(minutes=service.duration)
+        occupancy = Occupancy.load(datetime.combine(FIRST, time.min),
+                                   datetime.combine(LAST + timedelta(days=1), time.min) + duration)
+        view = occupancy if engine is Occupancy else OccupancyGrid(occupancy)
+
+        hourly = view.hourly_capacity(FIRST, LAST, duration, service.washers_needed)
+        one_by_one = [view.capacity_at(datetime.combine(FIRST, time.min) + timedelta(hours=h), duration,
+                                       service.washers_needed)
+                      for h in range(len(hourly))]
+        assert hourly == one_by_one
+        assert any(hourly) and not all(hourly)
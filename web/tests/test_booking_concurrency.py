@@ -0,0 +1,121 @@
+"""
+Many clerks booking the same slot at once: BookingLock and retry_on_conflict
+must leave every bay and washer with at most one appointment at a time, and
+the workload counters in step with the appointments.
+"""
+import threading
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from application import app
+from data import db, repo
+from data.models import Appointments, Workloads
+from data.seed.generate import Generate
+from data.services.reference import CANCELLED, COMPLETED, ReferenceRegistry
+from data.services.workload import Workload
+
+THREADS = 8
+
+
+@pytest.fixture
+def shop(database):
+    """The seeded shop grown to 4 bays and 12 washers, and a morning slot next week."""
+    Generate._grow_resources(4, 12)
+    ReferenceRegistry.invalidate()
+    day = date.today() + timedelta(days=7 - date.today().weekday() + 2)   # a Wednesday
+    return datetime.combine(day, time(9, 0))
+
+
+def _concurrently(target, calls):
+    """Run target(*args) for every args in `calls`, each in its own thread and session, released together."""
+    barrier = threading.Barrier(len(calls))
+    results, errors = [None] * len(calls), []
+
+    def worker(index, args):
+        with app.app_context():
+            try:
+                barrier.wait()
+                result = target(*args)
+                results[index] = result.id if isinstance(result, Appointments) else result
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(n, args)) for n, args in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=120)
+    assert not errors, errors
+    return results
+
+
+def _overlaps(intervals):
+    """Pairs of (start, end, id) intervals that overlap, per bay or washer."""
+    clashes = []
+    for owner, spans in intervals.items():
+        spans.sort()
+        for (start, end, first), (next_start, _, second) in zip(spans, spans[1:]):
+            if next_start < end:
+                clashes.append((owner, first, second))
+    return clashes
+
+
+def assert_no_double_booking():
+    db.session.remove()
+    inactive = ReferenceRegistry.current().status_ids(COMPLETED, CANCELLED)
+    bays, staff = defaultdict(list), defaultdict(list)
+    for appointment in Appointments.query.filter(~Appointments.status_id.in_(inactive)).all():
+        span = (appointment.start_time, appointment.end_time, appointment.id)
+        bays[appointment.bay_id].append(span)
+        for washer in appointment.staffs:
+            staff[washer.id].append(span)
+    assert _overlaps(bays) == []
+    assert _overlaps(staff) == []
+
+
+def assert_workloads_match_rebuild():
+    def counters():
+        db.session.remove()
+        return {(w.entity, w.entity_id, w.day): w.appointments
+                for w in Workloads.query.all() if w.appointments}
+
+    kept = counters()
+    Workload.rebuild()
+    assert kept == counters()
+
+
+def test_quick_book_same_slot(shop):
+    results = _concurrently(repo.quick_book, [(3, shop.isoformat())] * THREADS)
+
+    booked = [r for r in results if 'appointment_id' in r]
+    assert len(booked) == THREADS, results
+    assert len({r['appointment_id'] for r in booked}) == THREADS
+    assert_no_double_booking()
+    assert_workloads_match_rebuild()
+
+
+def test_book_appointment_same_slot(shop):
+    request = {'service_id': 1, 'start_time': shop.strftime('%Y-%m-%d %H:%M'), 'customer_id': 1, 'vehicle_id': 1}
+    results = _concurrently(repo.book_appointment, [(dict(request),)] * THREADS)
+
+    booked = [r for r in results if isinstance(r, int)]
+    bays = len(ReferenceRegistry.current().bays)
+    # one booking per bay; the rest are turned away, never stacked on a taken bay
+    assert len(booked) == min(THREADS, bays)
+    assert all(r == "No available bay at that time" for r in results if not isinstance(r, int))
+    assert_no_double_booking()
+    assert_workloads_match_rebuild()
+
+
+def test_mixed_booking_paths(shop):
+    calls = [(repo.quick_book, (4, shop.isoformat())) for _ in range(THREADS // 2)]
+    calls += [(repo.book_appointment_with_service, (1, 3, shop.strftime('%Y-%m-%d %H:%M'))) for _ in range(THREADS // 2)]
+    results = _concurrently(lambda target, args: target(*args), calls)
+
+    assert all('appointment_id' in r for r in results), results
+    assert_no_double_booking()
+    assert_workloads_match_rebuild()
@@ -0,0 +1,72 @@
+"""
+Serving from the queue moves an appointment to now: it must not land on a bay
+or washer that is busy then.
+"""
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from data import db
+from data.models import Appointments, Staffs
+from data.seed.generate import Generate
+from data.services.booking_lock import BookingConflict
+from data.services.dispatch import Dispatcher
+from data.services.reference import IN_QUEUE, NOW_SERVING, ReferenceRegistry
+
+NOW = datetime.combine(date.today(), time(10, 0))
+
+
+def _book(bay_id, staff, start, minutes, status):
+    appointment = Appointments(start_time=start, end_time=start + timedelta(minutes=minutes), bay_id=bay_id,
+                               customer_id=1, vehicle_id=1, service_id=3,
+                               status_id=ReferenceRegistry.current().status_id(status))
+    appointment.staffs = staff
+    db.session.add(appointment)
+    db.session.commit()
+    return appointment.id
+
+
+def _clashes(appointment):
+    """Other active appointments sharing the appointment's bay or a washer at the same time."""
+    inactive = ReferenceRegistry.current().status_ids('Completed', 'Cancelled')
+    others = (Appointments.query
+              .filter(Appointments.id != appointment.id, ~Appointments.status_id.in_(inactive),
+                      Appointments.start_time < appointment.end_time, Appointments.end_time > appointment.start_time)
+              .all())
+    crew = {s.id for s in appointment.staffs}
+    return [o.id for o in others if o.bay_id == appointment.bay_id or crew & {s.id for s in o.staffs}]
+
+
+@pytest.fixture
+def washer(database):
+    Generate._grow_resources(5, 12)
+    ReferenceRegistry.invalidate()
+    return Staffs.query.filter_by(is_front_desk=False).order_by(Staffs.id).first()
+
+
+def test_serve_avoids_busy_bay_and_washer(washer):
+    _book(1, [washer], NOW, 60, NOW_SERVING)
+    queued = _book(2, [washer], NOW + timedelta(hours=3), 45, IN_QUEUE)
+
+    served = Dispatcher.serve(bay_id=1, now=NOW)
+
+    assert served.id == queued
+    assert served.status_id == ReferenceRegistry.current().status_id(NOW_SERVING)
+    assert (served.start_time, served.end_time) == (NOW, NOW + timedelta(minutes=45))
+    assert served.bay_id == 2                            # bay 1 is taken: it stays on its own bay
+    assert washer not in served.staffs and len(served.staffs) == 1
+    assert _clashes(served) == []
+
+
+def test_serve_refuses_when_nothing_is_free(washer):
+    _book(1, [], NOW, 60, NOW_SERVING)
+    _book(2, [], NOW, 60, NOW_SERVING)
+    queued = _book(2, [washer], NOW + timedelta(hours=3), 45, IN_QUEUE)
+
+    with pytest.raises(BookingConflict):
+        Dispatcher.serve(bay_id=1, now=NOW)
+
+    appointment = Appointments.query.get(queued)
+    assert appointment.status_id == ReferenceRegistry.current().status_id(IN_QUEUE)
+    assert appointment.start_time == NOW + timedelta(hours=3)
+    assert [entry['appointment_id'] for entry in Dispatcher.queue()] == [queued]
@@ -0,0 +1,80 @@
+"""
+The hot appointment and payment queries are answered from the composite and
+created_at indexes: each query the code runs is fed to SQLite's EXPLAIN QUERY PLAN.
+"""
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from data import db, repo
+from data.models import Appointments
+from data.seed.generate import Generate
+from data.services.availability import Occupancy
+from data.services.booking_lock import BookingLock
+from data.services.pagination import paginate
+from data.services.reference import ReferenceRegistry
+
+
+@pytest.fixture
+def history(database):
+    Generate.generate(customers=200, months=2, per_day=40, seed=7, until=date.today())
+    db.session.execute('ANALYZE')
+    db.session.commit()
+    return datetime.combine(date.today() - timedelta(days=3), time(9, 0))
+
+
+def plans(call):
+    """EXPLAIN QUERY PLAN of every SELECT `call` runs, as one text block per statement."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    db.session.remove()
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        call()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        return ['\n'.join(row[-1] for row in cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters))
+                for statement, parameters in statements]
+    finally:
+        connection.close()
+
+
+def uses(index, call):
+    found = plans(call)
+    assert any(f'USING INDEX {index}' in plan or f'USING COVERING INDEX {index}' in plan for plan in found), found
+
+
+def test_availability_window(history):
+    uses('ix_appointments_start_status',
+         lambda: Occupancy.load(history, history + timedelta(days=1)))
+
+
+def test_bay_overlap_check(history):
+    bay = ReferenceRegistry.current().bays[0]
+    slot = {"bay": bay, "staff": [], "start_time": history, "end_time": history + timedelta(hours=1)}
+    uses('ix_appointments_bay_start_end', lambda: BookingLock.verify(slot))
+
+
+def test_day_listing(history):
+    uses('ix_appointments_start_status', lambda: repo.get_appointments_by_date(history.date()))
+
+
+def test_customer_history(history):
+    customer_id = Appointments.query.order_by(Appointments.id.desc()).first().customer_id
+    args = {'customer_id': str(customer_id), 'sort': 'start_time', 'order': 'desc'}
+    uses('ix_appointments_customer_start',
+         lambda: paginate(Appointments.query, Appointments, args, time_column='start_time', filters=('customer_id',)))
+
+
+def test_revenue(history):
+    uses('ix_payments_created_at', repo.get_total_revenue_this_month)
+    uses('ix_payments_created_at', lambda: repo.get_revenue_report('day'))
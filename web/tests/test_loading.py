@@ -0,0 +1,91 @@
+"""
+The appointment loading profiles cost a fixed number of statements, however
+many appointments the listing returns.
+"""
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from data import db, repo
+from data.models import Appointments
+from data.seed.generate import Generate
+from data.serializers import serializer
+
+serialize_appointment = serializer(Appointments)
+
+
+@contextmanager
+def statements():
+    """Counts the SQL statements run inside the block, on a fresh session."""
+    db.session.remove()
+    count = [0]
+
+    def count_statement(*args):
+        count[0] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', count_statement)
+    try:
+        yield count
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+
+def render_list(appointments):
+    """What the appointment tables read."""
+    return [(a.bay.bay, a.service.name, a.status.status, a.vehicle.type, a.customer.account.full_name,
+             [s.account.full_name for s in a.staffs]) for a in appointments]
+
+
+def render_detail(appointments):
+    return [serialize_appointment(a) for a in appointments]
+
+
+PROFILES = {'list': render_list, 'detail': render_detail}
+
+
+def listing_cost(profile):
+    with statements() as count:
+        rendered = PROFILES[profile](repo.get_appointments(profile))
+    return count[0], len(rendered)
+
+
+def detail_cost(appointment_id):
+    with statements() as count:
+        render_detail([repo.get_appointment(appointment_id, 'detail')])
+    return count[0]
+
+
+@pytest.fixture
+def one_then_many(database):
+    """Yields once with one appointment in the database and again with a few hundred."""
+    result = repo.quick_book(3, appointment_date=(date.today() + timedelta(days=1)).isoformat() + 'T09:00')
+    assert 'appointment_id' in result, result
+
+    def grow():
+        Generate.generate(customers=60, months=1, per_day=15, seed=7, until=date.today())
+        return Appointments.query.order_by(Appointments.id.desc()).first().id
+
+    return result['appointment_id'], grow
+
+
+@pytest.mark.parametrize('profile', sorted(PROFILES))
+def test_listing_statements_do_not_grow_with_rows(one_then_many, profile):
+    first_id, grow = one_then_many
+    few, rows = listing_cost(profile)
+    assert rows == 1
+
+    grow()
+    many, rows = listing_cost(profile)
+    assert rows > 100
+    assert many == few
+
+
+def test_detail_statements_do_not_grow_with_relations(one_then_many):
+    first_id, grow = one_then_many
+    few = detail_cost(first_id)
+
+    last_id = grow()
+    assert detail_cost(last_id) == few
+    assert detail_cost(first_id) == few
@@ -0,0 +1,20 @@
+"""
+A cursor that decodes but carries a bad value or id is rejected as invalid
+instead of failing inside the query.
+"""
+import pytest
+
+from data.models import Appointments
+from data.services.pagination import PaginationError, _encode, paginate
+
+
+@pytest.mark.parametrize('sort, values', [
+    ('start_time', ['start_time', 'asc', 'not a time', 1]),
+    ('start_time', ['start_time', 'asc', 12, 1]),
+    ('start_time', ['start_time', 'asc', '2024-01-01T10:00:00', 'x']),
+    ('id', ['id', 'asc', None, [1]]),
+])
+def test_malformed_cursor_is_invalid(database, sort, values):
+    args = {'sort': sort, 'order': 'asc', 'after': _encode(values)}
+    with pytest.raises(PaginationError, match="Invalid cursor"):
+        paginate(Appointments.query, Appointments, args, time_column='start_time')
@@ -0,0 +1,61 @@
+"""
+Repacking a day after a washer drops out: an appointment that cannot be placed
+keeps its bay and washers, and nothing else is moved onto them.
+"""
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+import data.repo as repo
+from data import db
+from data.models import Appointments, Staffs
+from data.seed.generate import Generate
+from data.services.reference import PENDING, ReferenceRegistry
+from data.services.roster import Roster
+
+DAY = date.today() + timedelta(days=1)
+TEN = datetime.combine(DAY, time(10, 0))
+
+
+def _book(bay_id, staff, minutes=60):
+    appointment = Appointments(start_time=TEN, end_time=TEN + timedelta(minutes=minutes), bay_id=bay_id,
+                               customer_id=1, vehicle_id=1, service_id=3,
+                               status_id=ReferenceRegistry.current().status_id(PENDING))
+    appointment.staffs = staff
+    db.session.add(appointment)
+    db.session.commit()
+    return appointment.id
+
+
+def _clashes(appointment):
+    others = (Appointments.query
+              .filter(Appointments.id != appointment.id,
+                      Appointments.start_time <= appointment.end_time, Appointments.end_time >= appointment.start_time)
+              .all())
+    crew = {s.id for s in appointment.staffs}
+    return [o.id for o in others
+            if (o.bay_id == appointment.bay_id and o.start_time < appointment.end_time
+                and o.end_time > appointment.start_time)
+            or crew & {s.id for s in o.staffs}]
+
+
+@pytest.fixture
+def crew(database):
+    Generate._grow_resources(4, 8)
+    ReferenceRegistry.invalidate()
+    return Staffs.query.filter_by(is_front_desk=False, is_on_shift=True).order_by(Staffs.id).all()
+
+
+def test_unplaced_appointment_keeps_its_bay_and_washers(crew):
+    gone = next(s for s in crew if Roster.current().covers(s.id, TEN, 60))
+    # needs every washer, so it cannot be placed once one of them leaves
+    stuck = _book(1, crew)
+    later = _book(2, [gone])
+
+    result = repo.reoptimize_day(staff_ids=[gone.id], day=DAY, from_time=datetime.combine(DAY, time.min))
+
+    assert result['unplaced'] == [stuck]
+    assert [m['appointment_id'] for m in result['moved']] == [later]
+    moved = Appointments.query.get(later)
+    assert gone not in moved.staffs
+    assert _clashes(moved) == []
@@ -0,0 +1,52 @@
+"""
+Reading the rollups writes recomputed days back in a session of its own: it
+never commits, or waits on, the caller's transaction.
+"""
+from datetime import date, datetime, time, timedelta
+
+from data import db
+from data.models import Appointments, DailyRollups, Services
+from data.services.reference import CANCELLED, PENDING, ReferenceRegistry
+from data.services.rollup import Rollup
+
+TODAY = date.today()
+
+
+def _book(status):
+    start = datetime.combine(TODAY, time(10, 0))
+    appointment = Appointments(start_time=start, end_time=start + timedelta(minutes=30), bay_id=1,
+                               customer_id=1, vehicle_id=1, service_id=3,
+                               status_id=ReferenceRegistry.current().status_id(status))
+    db.session.add(appointment)
+    db.session.commit()
+    return appointment
+
+
+def test_read_does_not_commit_the_callers_changes(database):
+    _book(PENDING)
+    service = Services.query.get(1)
+    name = service.name
+
+    with db.session.no_autoflush:
+        service.name = 'Never Saved'
+        rows = Rollup.get(TODAY, TODAY)
+    db.session.rollback()
+
+    assert Services.query.get(1).name == name
+    assert [row.pending for row in rows] == [1]
+    stored = DailyRollups.query.get(TODAY)
+    assert (stored.pending, stored.is_stale) == (1, False)
+
+
+def test_days_flagged_by_the_caller_are_computed_without_writing(database):
+    appointment = _book(PENDING)
+    Rollup.get(TODAY, TODAY)
+
+    appointment.status_id = ReferenceRegistry.current().status_id(CANCELLED)
+    db.session.flush()
+    [row] = Rollup.get(TODAY, TODAY)
+    assert (row.pending, row.cancelled) == (0, 1)
+    db.session.rollback()
+
+    stored = DailyRollups.query.get(TODAY)
+    assert (stored.pending, stored.cancelled, stored.is_stale) == (1, 0, False)
@@ -0,0 +1,37 @@
+"""
+The roster is reused without a query until a schedule edit is committed.
+"""
+from datetime import datetime, time
+
+from sqlalchemy import event
+
+from data import db
+from data.models import Schedules
+from data.services.roster import Roster
+
+
+def _statements(call) -> int:
+    count = []
+    listener = lambda *args: count.append(1)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        call()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return len(count)
+
+
+def test_current_roster_is_checked_without_queries(database):
+    roster = Roster.current()
+    assert _statements(lambda: [Roster.current() for _ in range(50)]) == 0
+    assert Roster.current() is roster
+
+
+def test_committed_schedule_edit_recompiles(database):
+    schedule = Schedules.query.filter_by(day='Monday').first()
+    monday = datetime(2024, 1, 1, 12, 0)    # a Monday
+    before = Roster.current().covers(schedule.staff_id, monday)
+
+    schedule.shift_start, schedule.shift_end = (time(0, 0), time(8, 0)) if before else (time(8, 0), time(16, 0))
+    db.session.commit()
+    assert Roster.current().covers(schedule.staff_id, monday) is not before
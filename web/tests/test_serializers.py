@@ -0,0 +1,95 @@
+"""
+The compiled 'api' serializer sends appointments exactly as the hand-written
+serialize_appointment did, including {} for a missing bay or vehicle.
+"""
+from datetime import date, datetime, time, timedelta
+
+from application.api import serialize_appointment
+from data import db
+from data.models import Appointments
+from data.services.reference import PENDING, ReferenceRegistry
+
+
+# the hand-written serializers the registry replaced, trimmed to what the appointment below has
+def _iso(dt):
+    return dt.isoformat() if dt is not None else None
+
+
+def _account(a):
+    if a is None:
+        return {}
+    return {
+        "id": a.id, "first_name": a.first_name, "middle_name": a.middle_name, "last_name": a.last_name,
+        "gender": a.gender, "phone_1": a.phone_1, "phone_2": a.phone_2, "birth_date": _iso(a.birth_date),
+        "address": a.address, "image_profile": a.image_profile, "email": a.email, "is_active": a.is_active,
+        "role_id": a.role_id, "login_date": _iso(a.login_date),
+        "created_at": _iso(a.created_at), "updated_at": _iso(a.updated_at),
+    }
+
+
+def _vehicle(v):
+    if v is None:
+        return {}
+    return {
+        "id": v.id, "plate_number": v.plate_number, "model": v.model, "type": v.type, "customer_id": v.customer_id,
+        "created_at": _iso(v.created_at), "updated_at": _iso(v.updated_at),
+    }
+
+
+def _customer(c):
+    if c is None:
+        return {}
+    return {
+        "id": c.id, "account_id": c.account_id, "is_registered": c.is_registered, "is_pwd": c.is_pwd,
+        "is_senior": c.is_senior, "created_at": _iso(c.created_at), "updated_at": _iso(c.updated_at),
+        "account": _account(c.account) if c.account else None,
+        "vehicles": [_vehicle(v) for v in c.vehicles],
+    }
+
+
+def _service(s):
+    if s is None:
+        return {}
+    return {
+        "id": s.id, "name": s.name, "description": s.description,
+        "price": float(s.price) if s.price is not None else None, "duration": s.duration,
+        "washers_needed": s.washers_needed, "type": s.type,
+        "created_at": _iso(s.created_at), "updated_at": _iso(s.updated_at),
+    }
+
+
+def _named(key):
+    def dump(row):
+        if row is None:
+            return {}
+        return {"id": row.id, key: getattr(row, key), "created_at": _iso(row.created_at),
+                "updated_at": _iso(row.updated_at)}
+    return dump
+
+
+def _legacy_appointment(a):
+    return {
+        "id": a.id, "start_time": _iso(a.start_time), "end_time": _iso(a.end_time), "bay_id": a.bay_id,
+        "customer_id": a.customer_id, "vehicle_id": a.vehicle_id, "service_id": a.service_id,
+        "status_id": a.status_id, "created_at": _iso(a.created_at), "updated_at": _iso(a.updated_at),
+        "bay": _named("bay")(a.bay),
+        "customer": _customer(a.customer),
+        "vehicle": _vehicle(a.vehicle),
+        "service": _service(a.service),
+        "status": _named("status")(a.status),
+        "payments": [], "feedbacks": [], "staffs": [],
+    }
+
+
+def test_appointment_without_bay_or_vehicle_matches_the_old_output(database):
+    start = datetime.combine(date.today() + timedelta(days=1), time(10, 0))
+    # a bay and a vehicle removed since (SQLite does not enforce the foreign keys)
+    appointment = Appointments(start_time=start, end_time=start + timedelta(minutes=30), bay_id=999,
+                               customer_id=1, vehicle_id=999, service_id=3,
+                               status_id=ReferenceRegistry.current().status_id(PENDING))
+    db.session.add(appointment)
+    db.session.commit()
+
+    new = serialize_appointment(appointment)
+    assert new == _legacy_appointment(appointment)
+    assert new["bay"] == {} and new["vehicle"] == {}
@@ -0,0 +1,75 @@
+"""
+ETags of the reference listings change with every committed write, however
+close together, and never for writes that were rolled back. Bookings leave
+the version counters alone.
+"""
+from datetime import date, datetime, time, timedelta
+
+import data.repo as repo
+from application import app
+from data import db
+from data.models import Services, TableVersions, Vehicles
+
+URL = '/api/service/get/all'
+
+
+def _rename(name):
+    service = Services.query.get(1)
+    service.name = name
+
+
+def test_every_commit_changes_the_etag(database):
+    client = app.test_client()
+    first = client.get(URL)
+    assert first.status_code == 200
+
+    # two edits within the same second, the row count unchanged
+    tags = [first.headers['ETag']]
+    for name in ('Small Bike Wash', 'Small Bike Detail'):
+        _rename(name)
+        db.session.commit()
+        response = client.get(URL, headers={'If-None-Match': tags[-1]})
+        assert response.status_code == 200
+        tags.append(response.headers['ETag'])
+    assert len(set(tags)) == 3
+
+    assert client.get(URL, headers={'If-None-Match': tags[-1]}).status_code == 304
+
+
+def test_rolled_back_writes_keep_the_etag(database):
+    client = app.test_client()
+    etag = client.get(URL).headers['ETag']
+    version = TableVersions.query.get('services').version
+
+    _rename('Never Saved')
+    db.session.flush()
+    db.session.rollback()
+
+    assert TableVersions.query.get('services').version == version
+    assert client.get(URL, headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_bookings_do_not_bump_any_counter(database):
+    before = {row.name: row.version for row in TableVersions.query}
+    start = datetime.combine(date.today() + timedelta(days=1), time(10, 0))
+    result = repo.quick_book(1, appointment_date=start.strftime('%Y-%m-%d %H:%M'))
+    assert 'error' not in result
+    assert {row.name: row.version for row in TableVersions.query} == before
+
+
+def test_vehicle_types_etag_follows_the_type_list(database):
+    ttl, app.config['REFERENCE_VERSION_TTL'] = app.config['REFERENCE_VERSION_TTL'], 0
+    try:
+        client = app.test_client()
+        etag = client.get('/api/vehicle/types').headers['ETag']
+
+        db.session.add(Vehicles(model='Unknown', type=Vehicles.query.first().type, customer_id=1))
+        db.session.commit()
+        assert client.get('/api/vehicle/types', headers={'If-None-Match': etag}).status_code == 304
+
+        db.session.add(Vehicles(model='Unknown', type='Hovercraft', customer_id=1))
+        db.session.commit()
+        response = client.get('/api/vehicle/types', headers={'If-None-Match': etag})
+        assert response.status_code == 200 and 'Hovercraft' in response.get_json()['data']
+    finally:
+        app.config['REFERENCE_VERSION_TTL'] = ttl
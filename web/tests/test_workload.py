@@ -0,0 +1,36 @@
+"""
+Workload counters follow status changes made through the form and JSON paths,
+which assign status_id as a string.
+"""
+from datetime import date, datetime, time, timedelta
+
+import data.repo as repo
+from data import db
+from data.models import Appointments, Staffs
+from data.services.reference import CANCELLED, PENDING, ReferenceRegistry
+from data.services.workload import Workload
+
+DAY = date.today() + timedelta(days=1)
+
+
+def _counts():
+    return {key: days.get(DAY, 0) for key, days in Workload.get_counts(DAY, DAY).items()}
+
+
+def test_string_status_id_releases_the_workload(database):
+    washer = Staffs.query.filter_by(is_front_desk=False).first()
+    start = datetime.combine(DAY, time(10, 0))
+    appointment = Appointments(start_time=start, end_time=start + timedelta(minutes=30), bay_id=1,
+                               customer_id=1, vehicle_id=1, service_id=3,
+                               status_id=ReferenceRegistry.current().status_id(PENDING))
+    appointment.staffs = [washer]
+    db.session.add(appointment)
+    db.session.commit()
+    assert _counts() == {('bay', 1): 1, ('staff', washer.id): 1}
+
+    cancelled = str(ReferenceRegistry.current().status_id(CANCELLED))
+    assert repo.update_appointment_status({'id': appointment.id, 'status_id': cancelled})
+    assert _counts() == {('bay', 1): 0, ('staff', washer.id): 0}
+
+    Workload.rebuild(DAY, DAY)
+    assert not any(_counts().values())